@@ -0,0 +1,276 @@
+"""Response cache for Gemini completions.
+
+Entries are keyed on a normalized prompt plus a fingerprint of the user
+profile that shaped it, expire after a TTL and are evicted LRU-first once
+the backend exceeds its byte budget. The backend is chosen from the
+environment:
+
+- ``AI_CACHE_BACKEND``: ``memory`` (default), ``file``, ``redis`` or ``off``
+- ``AI_CACHE_TTL_SECONDS``: entry lifetime (default 3600)
+- ``AI_CACHE_MAX_BYTES``: byte budget for memory/file backends (default 32 MB)
+- ``AI_CACHE_DIR``: directory for the file backend (shared by all workers)
+- ``REDIS_URL``: connection string for the redis backend
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so indentation changes don't split cache entries"""
+    return _WHITESPACE_RE.sub(' ', prompt or '').strip()
+
+
+def profile_fingerprint(profile) -> str:
+    """Stable short hash of a user profile (order-insensitive)"""
+    if not profile:
+        return '-'
+    raw = json.dumps(profile, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def make_cache_key(prompt: str, profile=None, namespace: str = 'ai') -> str:
+    """Cache key for a prompt/profile pair"""
+    digest = hashlib.sha256()
+    digest.update(normalize_prompt(prompt).encode('utf-8'))
+    digest.update(b'\x00')
+    digest.update(profile_fingerprint(profile).encode('utf-8'))
+    return f"{namespace}:{digest.hexdigest()}"
+
+
+class MemoryBackend:
+    """Per-process LRU with a byte budget"""
+
+    name = 'memory'
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.time() + ttl, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value.encode('utf-8'))
+
+    def info(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+class FileBackend:
+    """Directory-backed cache shared by every worker on the host.
+
+    One JSON file per key; file mtime doubles as the LRU clock so eviction
+    works across processes without a coordinator.
+    """
+
+    name = 'file'
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key.replace(':', '_') + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires_at', 0) <= time.time():
+            self._remove(path)
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry.get('value')
+
+    def set(self, key, value, ttl):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                json.dump({'expires_at': time.time() + ttl, 'value': value}, fh)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"AI cache write failed: {e}")
+            self._remove(tmp_path)
+            return
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if item.name.endswith('.json'):
+                        try:
+                            st = item.stat()
+                        except OSError:
+                            continue
+                        entries.append((st.st_mtime, st.st_size, item.path))
+        except OSError:
+            pass
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            self._remove(path)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def info(self):
+        entries = self._entries()
+        return {
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+
+class RedisBackend:
+    """Shared cache on Redis; eviction is left to the server's maxmemory policy"""
+
+    name = 'redis'
+
+    def __init__(self, url, prefix='satvic:'):
+        import redis  # optional dependency
+
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def get(self, key):
+        value = self._redis.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._redis.set(self.prefix + key, value.encode('utf-8'), ex=max(int(ttl), 1))
+
+    def info(self):
+        return {'url_configured': True}
+
+
+class ResponseCache:
+    """TTL cache in front of a backend, with hit/miss counters"""
+
+    def __init__(self, backend, ttl_seconds):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def get(self, key):
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"AI cache lookup failed: {e}")
+            self._count('errors')
+            value = None
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value):
+        if self.backend is None or not value:
+            return
+        try:
+            self.backend.set(key, value, self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"AI cache store failed: {e}")
+            self._count('errors')
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'backend': self.backend.name if self.backend is not None else 'off',
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+        if self.backend is not None:
+            try:
+                stats.update(self.backend.info())
+            except Exception:
+                pass
+        return stats
+
+
+def build_response_cache():
+    """Create the response cache configured by the environment"""
+    kind = os.getenv('AI_CACHE_BACKEND', 'memory').lower()
+    ttl = int(os.getenv('AI_CACHE_TTL_SECONDS', 3600))
+    max_bytes = int(os.getenv('AI_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+    backend = None
+    try:
+        if kind == 'redis':
+            backend = RedisBackend(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        elif kind == 'file':
+            backend = FileBackend(os.getenv('AI_CACHE_DIR', '/tmp/satvic-ai-cache'), max_bytes)
+        elif kind != 'off':
+            backend = MemoryBackend(max_bytes)
+    except Exception as e:
+        logger.warning(f"AI cache backend '{kind}' unavailable ({e}); using in-process cache")
+        backend = MemoryBackend(max_bytes)
+
+    return ResponseCache(backend, ttl)
@@ -0,0 +1,134 @@
+"""Lazily initialised, health-tracked Gemini client.
+
+Nothing touches the network (or even imports the Gemini SDK) at module
+import, so gunicorn workers boot in milliseconds. The SDK is configured
+on first use and an optional background probe reports readiness through
+/api/health without blocking request handling.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_KEYS = {'', 'your_gemini_api_key_here', 'your_actual_gemini_api_key_here'}
+
+
+class GeminiClient:
+    """Thin wrapper around ``genai.GenerativeModel`` that connects on first use"""
+
+    def __init__(self, api_key, model_name='gemini-1.5-flash'):
+        self.api_key = api_key or ''
+        self.model_name = model_name
+        self._model = None
+        self._json_mode = None
+        # observer(label, prompt, response, seconds, error, stream) is told about every call
+        self.observer = None
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        self.state = 'unconfigured' if not self.configured else 'idle'
+        self.last_error = None
+        self.last_success_at = None
+        self.probe_latency_ms = None
+
+    @property
+    def configured(self):
+        """True when an API key is present (the SDK may still be unreachable)"""
+        return self.api_key not in PLACEHOLDER_KEYS
+
+    def get_model(self):
+        """Return the underlying GenerativeModel, configuring the SDK on first call"""
+        if self._model is not None:
+            return self._model
+        if not self.configured:
+            raise RuntimeError('GEMINI_API_KEY not configured')
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=self.api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate_content(self, prompt, label=None, **kwargs):
+        """Proxy to ``GenerativeModel.generate_content`` while tracking health.
+
+        ``label`` names the calling endpoint for the observer.
+        """
+        started = time.perf_counter()
+        try:
+            response = self.get_model().generate_content(prompt, **kwargs)
+        except Exception as e:
+            self._record_failure(e)
+            self._observe(label, prompt, None, started, e, kwargs.get('stream', False))
+            raise
+        self._record_success()
+        self._observe(label, prompt, response, started, None, kwargs.get('stream', False))
+        return response
+
+    def _observe(self, label, prompt, response, started, error, stream):
+        if self.observer is None:
+            return
+        try:
+            self.observer(label, prompt, response, time.perf_counter() - started, error, stream)
+        except Exception as e:
+            logger.warning(f"Gemini observer failed: {e}")
+
+    def json_generation_config(self):
+        """``generation_config`` asking for a JSON reply, or None if the installed SDK predates JSON mode"""
+        if self._json_mode is None:
+            import dataclasses
+
+            import google.generativeai as genai
+
+            fields = {field.name for field in dataclasses.fields(genai.types.GenerationConfig)}
+            self._json_mode = 'response_mime_type' in fields
+        return {'response_mime_type': 'application/json'} if self._json_mode else None
+
+    @staticmethod
+    def cancel_stream(response):
+        """Best-effort cancel of a ``stream=True`` response so the upstream call stops early"""
+        iterator = getattr(response, '_iterator', None)
+        cancel = getattr(iterator, 'cancel', None)
+        if callable(cancel):
+            try:
+                cancel()
+            except Exception:
+                pass
+
+    def _record_success(self):
+        self.state = 'ready'
+        self.last_error = None
+        self.last_success_at = datetime.now(timezone.utc)
+
+    def _record_failure(self, error):
+        self.state = 'degraded' if self.last_success_at else 'error'
+        self.last_error = str(error)[:200]
+
+    def start_probe(self):
+        """Check connectivity on a daemon thread; returns immediately"""
+        if not self.configured or self._probe_thread is not None:
+            return
+        self.state = 'probing'
+        self._probe_thread = threading.Thread(target=self._probe, name='gemini-probe', daemon=True)
+        self._probe_thread.start()
+
+    def _probe(self):
+        started = time.perf_counter()
+        try:
+            self.generate_content('Hello', label='probe')
+            self.probe_latency_ms = round((time.perf_counter() - started) * 1000, 1)
+            logger.info(f"✅ Gemini AI reachable ({self.probe_latency_ms} ms)")
+        except Exception as e:
+            logger.error(f"❌ Gemini AI readiness probe failed: {e}")
+
+    def health(self):
+        return {
+            'state': self.state,
+            'model': self.model_name,
+            'configured': self.configured,
+            'last_error': self.last_error,
+            'last_success_at': self.last_success_at.isoformat() if self.last_success_at else None,
+            'probe_latency_ms': self.probe_latency_ms,
+        }
@@ -0,0 +1,289 @@
+"""Concurrency limit, deadlines, retries and a circuit breaker for Gemini calls.
+
+Every Gemini call goes through one AIGateway per worker:
+
+- a semaphore bounds how many calls are in flight, so a slow Gemini can
+  only tie up that many threads and the rest of the API keeps serving;
+  a call that can't get a slot within ``AI_QUEUE_TIMEOUT_SECONDS`` fails
+  fast with ``AIUnavailable('busy')``
+- each endpoint has a deadline covering all attempts; the SDK in use has
+  no per-request timeout, so calls run on the gateway's pool and the
+  caller stops waiting at the deadline (the abandoned call keeps its slot
+  until it really returns, so the bound holds)
+- retriable errors (429/5xx/connection errors) are retried with full-jitter
+  exponential backoff while the deadline allows
+- after ``AI_BREAKER_FAILURES`` consecutive timeouts/retriable errors the
+  breaker opens; calls then fail immediately with
+  ``AIUnavailable('circuit_open')`` so endpoints can serve their fallbacks,
+  and after ``AI_BREAKER_RESET_SECONDS`` one trial call is let through
+
+Configuration:
+
+- ``AI_MAX_CONCURRENT``: Gemini calls in flight per worker (default 4)
+- ``AI_QUEUE_TIMEOUT_SECONDS``: wait for a free slot (default 5)
+- ``AI_TIMEOUT_SECONDS``: default deadline (default 30)
+- ``AI_TIMEOUTS``: per-endpoint deadlines, e.g. ``chat=15,meal_plan=120``
+- ``AI_RETRIES``: extra attempts on retriable errors (default 2)
+- ``AI_BREAKER_FAILURES`` / ``AI_BREAKER_RESET_SECONDS``: defaults 5 / 30
+"""
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUTS = {
+    'onboarding': 30,
+    'chat': 30,
+    'recipe': 45,
+    'recipes': 45,
+    'shopping_list': 30,
+    'meal_plan': 90,
+}
+
+# google.api_core exception names worth another attempt (matched by name so
+# this module doesn't import the SDK)
+RETRIABLE_ERRORS = frozenset({
+    'TooManyRequests', 'ResourceExhausted', 'InternalServerError', 'BadGateway', 'ServiceUnavailable',
+    'GatewayTimeout', 'DeadlineExceeded', 'Aborted', 'Unknown',
+})
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class AIUnavailable(Exception):
+    """Gemini can't be used right now; ``reason`` is busy, timeout, circuit_open or upstream"""
+
+    def __init__(self, reason, message=None):
+        super().__init__(message or reason)
+        self.reason = reason
+
+
+def is_retriable(error):
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in RETRIABLE_ERRORS for cls in type(error).__mro__)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; half-opens after ``reset_seconds``"""
+
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def available(self):
+        """Would a call be attempted now? (doesn't claim the half-open trial)"""
+        if self.state != OPEN:
+            return True
+        return time.monotonic() - self.opened_at >= self.reset_seconds
+
+    def allow(self):
+        """Claim permission for one call"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def retry_after(self):
+        return max(int(self.opened_at + self.reset_seconds - time.monotonic()) + 1, 1)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("✅ Gemini circuit breaker closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                    logger.error(f"❌ Gemini circuit breaker open after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """A claimed call ended without telling us anything about Gemini's health"""
+        with self._lock:
+            self._trial_running = False
+
+
+class AIGateway:
+    def __init__(self, max_concurrent=4, queue_timeout=5, default_timeout=30, timeouts=None, retries=2,
+                 backoff_base=0.5, breaker=None):
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.default_timeout = default_timeout
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.counts = {'calls': 0, 'retries': 0, 'timeouts': 0, 'busy': 0, 'rejected_open': 0, 'errors': 0}
+
+    def _count(self, field, delta=1):
+        with self._lock:
+            self.counts[field] += delta
+
+    def _executor(self):
+        # Created per process: a pool inherited through fork has no threads
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='gemini')
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def timeout_for(self, endpoint):
+        return self.timeouts.get(endpoint, self.default_timeout)
+
+    def available(self):
+        """False while the breaker is open; endpoints use this to go straight to their fallback"""
+        return self.breaker.available()
+
+    def _acquire(self, timeout):
+        if not self._slots.acquire(timeout=max(timeout, 0)):
+            self._count('busy')
+            raise AIUnavailable('busy', 'Too many AI requests in progress')
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def call(self, endpoint, fn):
+        """``fn()`` under the endpoint's deadline, with retries; raises AIUnavailable or fn's own error"""
+        if not self.breaker.allow():
+            self._count('rejected_open')
+            raise AIUnavailable('circuit_open', 'AI service temporarily unavailable')
+        self._count('calls')
+        deadline = time.monotonic() + self.timeout_for(endpoint)
+        attempt = 0
+        try:
+            while True:
+                self._acquire(min(self.queue_timeout, deadline - time.monotonic()))
+                try:
+                    future = self._executor().submit(fn)
+                except Exception:
+                    self._release()
+                    raise
+                future.add_done_callback(self._release)
+                try:
+                    result = future.result(timeout=max(deadline - time.monotonic(), 0))
+                except FutureTimeout:
+                    self._count('timeouts')
+                    self.breaker.record_failure()
+                    logger.error(f"❌ Gemini call for {endpoint} timed out")
+                    raise AIUnavailable('timeout', f'AI call for {endpoint} timed out')
+                except Exception as e:
+                    if not is_retriable(e):
+                        self._count('errors')
+                        self.breaker.release()
+                        raise
+                    self.breaker.record_failure()
+                    # Full jitter: uniform over [0, base * 2^attempt]
+                    delay = random.uniform(0, self.backoff_base * 2 ** attempt)
+                    if attempt >= self.retries or not self.breaker.available() \
+                            or time.monotonic() + delay >= deadline:
+                        self._count('errors')
+                        raise AIUnavailable('upstream', f'AI service error: {e}') from e
+                    attempt += 1
+                    self._count('retries')
+                    logger.warning(f"Gemini call for {endpoint} failed ({e}); retry {attempt} in {delay:.2f}s")
+                    time.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                return result
+        except AIUnavailable as e:
+            if e.reason == 'busy':
+                self.breaker.release()
+            raise
+
+    @contextmanager
+    def slot(self, endpoint):
+        """Breaker check and a concurrency slot for a streaming call (no deadline: tokens keep arriving)"""
+        if not self.breaker.allow():
+            self._count('rejected_open')
+            raise AIUnavailable('circuit_open', 'AI service temporarily unavailable')
+        self._count('calls')
+        try:
+            self._acquire(self.queue_timeout)
+        except AIUnavailable:
+            self.breaker.release()
+            raise
+        try:
+            yield
+        except GeneratorExit:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if is_retriable(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._release()
+
+    def stats(self):
+        return dict(
+            self.counts,
+            in_flight=self.in_flight,
+            max_concurrent=self.max_concurrent,
+            breaker=self.breaker.state,
+            breaker_opened=self.breaker.times_opened,
+        )
+
+
+def _parse_timeouts(value):
+    timeouts = {}
+    for part in (value or '').split(','):
+        if '=' in part:
+            endpoint, seconds = part.split('=', 1)
+            timeouts[endpoint.strip()] = float(seconds)
+    return timeouts
+
+
+def build_ai_gateway():
+    """Gateway configured by the environment"""
+    return AIGateway(
+        max_concurrent=int(os.getenv('AI_MAX_CONCURRENT', 4)),
+        queue_timeout=float(os.getenv('AI_QUEUE_TIMEOUT_SECONDS', 5)),
+        default_timeout=float(os.getenv('AI_TIMEOUT_SECONDS', 30)),
+        timeouts=_parse_timeouts(os.getenv('AI_TIMEOUTS')),
+        retries=int(os.getenv('AI_RETRIES', 2)),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv('AI_BREAKER_FAILURES', 5)),
+            reset_seconds=float(os.getenv('AI_BREAKER_RESET_SECONDS', 30)),
+        ),
+    )
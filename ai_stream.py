@@ -0,0 +1,109 @@
+"""Helpers for streaming Gemini output to the browser as Server-Sent Events."""
+import json
+import re
+
+_OPENING_FENCE_RE = re.compile(r'^```[a-zA-Z0-9]*\s*')
+_TRAILING_HOLD_RE = re.compile(r'[`\s]+$')
+
+
+def looks_like_html(text):
+    """The one HTML-vs-text rule for streamed and buffered replies: the first
+    character after whitespace and an opening code fence is '<'.
+
+    Streaming has to decide before the rest of the reply exists, so buffered
+    replies use the same rule and render identically (prose that later emits
+    tags is wrapped in paragraphs either way).
+    """
+    return _OPENING_FENCE_RE.sub('', (text or '').lstrip()).lstrip().startswith('<')
+
+
+def sse_event(event, data):
+    """Format one SSE frame; data is JSON encoded so newlines survive transport"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class StreamingHtmlNormalizer:
+    """Incremental version of the _strip_code_fences + paragraph wrap post-processing.
+
+    The first meaningful characters decide the mode: output that looks like
+    HTML is passed through, plain text is emitted one ``<p>`` per completed
+    paragraph. Trailing backticks/whitespace are held back until more text
+    arrives so a closing code fence is never sent to the client.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._mode = None  # None until decided, then 'html' or 'text'
+        self._emitted = False
+
+    def feed(self, chunk):
+        """Consume a chunk of model output; return HTML that is safe to send now"""
+        if not chunk:
+            return ''
+        self._buffer += chunk
+        if self._mode is None and not self._decide_mode():
+            return ''
+        if self._mode == 'html':
+            return self._drain_html(final=False)
+        return self._drain_text(final=False)
+
+    def close(self):
+        """Flush whatever is left once the model stream has finished"""
+        if self._mode is None:
+            self._buffer = _OPENING_FENCE_RE.sub('', self._buffer.lstrip())
+            self._mode = 'html' if looks_like_html(self._buffer) else 'text'
+        if self._mode == 'html':
+            return self._drain_html(final=True)
+        out = self._drain_text(final=True)
+        if not self._emitted:
+            self._emitted = True
+            return '<p></p>'
+        return out
+
+    def _decide_mode(self):
+        stripped = self._buffer.lstrip()
+        if stripped.startswith('`'):
+            # Wait for the whole opening fence line (```html\n) before deciding
+            if '\n' not in stripped and len(stripped) < 16:
+                return False
+            stripped = _OPENING_FENCE_RE.sub('', stripped)
+        stripped = stripped.lstrip()
+        if not stripped:
+            self._buffer = ''
+            return False
+        self._buffer = stripped
+        self._mode = 'html' if looks_like_html(stripped) else 'text'
+        return True
+
+    def _drain_html(self, final):
+        if final:
+            out = re.sub(r'\s*```\s*$', '', self._buffer).rstrip()
+            self._buffer = ''
+        else:
+            hold = _TRAILING_HOLD_RE.search(self._buffer)
+            cut = hold.start() if hold else len(self._buffer)
+            out, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        if out:
+            self._emitted = True
+        return out
+
+    def _drain_text(self, final):
+        out = []
+        while '\n\n' in self._buffer:
+            paragraph, self._buffer = self._buffer.split('\n\n', 1)
+            out.append(self._paragraph(paragraph))
+        if final:
+            tail = re.sub(r'\s*```\s*$', '', self._buffer)
+            self._buffer = ''
+            out.append(self._paragraph(tail))
+        html = ''.join(out)
+        if html:
+            self._emitted = True
+        return html
+
+    @staticmethod
+    def _paragraph(text):
+        text = text.strip()
+        if not text:
+            return ''
+        return '<p>' + text.replace('\n', '<br>') + '</p>'
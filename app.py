@@ -1,17 +1,41 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, g, request, render_template, send_from_directory
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
-import bcrypt
-from pymongo import MongoClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson import ObjectId
-import google.generativeai as genai
 import os
 from datetime import datetime, timedelta, timezone
 import re
 import json
 import logging
+import threading
+import time
+from contextlib import closing
 from dotenv import load_dotenv
+from ai_cache import build_response_cache, make_cache_key
+from ai_client import GeminiClient
+from ai_gateway import AIUnavailable, build_ai_gateway
+from single_flight import build_single_flight
+from ai_stream import StreamingHtmlNormalizer, looks_like_html, sse_event
+from jobs import JobQueue, JobQueueFull
+from recipe_search import search_recipes
+from pagination import DESC, InvalidCursor, InvalidFields, paginate, parse_fields, parse_limit
+from db_indexes import ensure_indexes
+from mongo_client import MongoManager
+from json_encoder import dumps as dumps_json, to_jsonable
+from user_cache import USER_PROJECTION, UserCache
+from passwords import hash_password, verify_password
+import progress_rollups
+import progress_analytics
+import progress_import
+import shopping
+import ingredient_catalog
+import meal_plan_schema
+import metrics
+import profiling
+import http_cache
+from meal_plan_schema import PlanValidationError
 load_dotenv()
 
 # Configure logging
@@ -29,70 +53,151 @@ app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=7)
 jwt = JWTManager(app)
 CORS(app, origins=["*"])
 
-# MongoDB connection
-try:
-    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb_url'))
-    db = client.satvic_diet_planner
-    logger.info("✅ Connected to MongoDB successfully")
-except Exception as e:
-    logger.error(f"❌ MongoDB connection failed: {e}")
-    raise
-
-# Configure Gemini AI
-try:
-    api_key = os.getenv('GEMINI_API_KEY')
-    if not api_key or api_key == 'your_gemini_api_key_here':
-        logger.error("❌ GEMINI_API_KEY not properly configured")
-        model = None
-    else:
-        # Use the newer client-based approach
-        import google.generativeai as genai
-        
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Test the connection
-        test_response = model.generate_content("Hello")
-        logger.info("✅ Gemini AI configured and tested successfully")
-    
-except Exception as e:
-    logger.error(f"❌ Gemini AI configuration failed: {e}")
-    model = None
+# MongoDB connection: created lazily in each worker after fork (see mongo_client.py)
+mongo = MongoManager.from_env(event_listeners=[metrics.MongoCommandMetrics()], wait_observer=metrics.observe_pool_wait)
+db = mongo.database()
+
+# Provision indexes without delaying worker boot (see db_indexes.py)
+if os.getenv('DB_ENSURE_INDEXES', '1') == '1':
+    threading.Thread(target=ensure_indexes, args=(db,), name='db-indexes', daemon=True).start()
+
+# Configure Gemini AI (connects lazily on first use; see ai_client.py)
+ai_client = GeminiClient(os.getenv('GEMINI_API_KEY'), os.getenv('GEMINI_MODEL', 'gemini-1.5-flash'))
+ai_client.observer = metrics.observe_gemini
+if not ai_client.configured:
+    logger.error("❌ GEMINI_API_KEY not properly configured")
+elif os.getenv('AI_STARTUP_PROBE', '1') == '1':
+    ai_client.start_probe()
+
+# Concurrency limit, deadlines, retries and circuit breaker for Gemini calls (see ai_gateway.py)
+ai_gateway = build_ai_gateway()
+
+# Version stamps behind the ETags of recipe, meal plan and progress reads (see http_cache.py)
+resource_versions = http_cache.ResourceVersions(db.resource_versions)
+
+# Cache for repeated Gemini prompts (see ai_cache.py for configuration)
+ai_cache = build_response_cache()
+
+# Identical concurrent prompts share one Gemini call (see single_flight.py)
+ai_single_flight = build_single_flight()
+
+def _job_error_message(error):
+    """What /api/jobs/<id> tells the client about a failed job (details are only logged)"""
+    if isinstance(error, AIUnavailable):
+        return 'AI service is busy or temporarily unavailable. Please try again shortly.'
+    return 'Generation failed. Please try again.'
+
+# Background executor for slow AI jobs (status is persisted in db.ai_jobs)
+job_queue = JobQueue(
+    db.ai_jobs,
+    max_workers=int(os.getenv('AI_JOB_WORKERS', 4)),
+    max_pending=int(os.getenv('AI_JOB_MAX_PENDING', 32)),
+    describe_error=_job_error_message,
+)
+
+# Projected user documents shared by auth and AI endpoints
+user_cache = UserCache(ttl_seconds=int(os.getenv('USER_CACHE_TTL_SECONDS', 30)))
+
+# Ingredient names, units and prices for shopping lists (loaded on first use, hot-reloaded)
+ingredient_catalog_loader = ingredient_catalog.build_catalog_loader(db)
+
+# Point-in-time values for /metrics (see metrics.py)
+metrics.add_gauge('gemini_in_flight', 'Gemini calls currently running', (),
+                  lambda: {(): ai_gateway.in_flight})
+metrics.add_gauge('gemini_breaker_open', '1 while the Gemini circuit breaker is open', (),
+                  lambda: {(): int(ai_gateway.breaker.state == 'open')})
+metrics.add_gauge('mongodb_pool_connections', 'Pooled MongoDB connections', ('state',),
+                  lambda: {('in_use',): mongo.metrics.in_use, ('open',): mongo.metrics.open_connections})
 
 # Helper functions
 def serialize_doc(doc):
-    """Convert MongoDB document to JSON serializable format"""
-    if doc is None:
-        return None
-    if isinstance(doc, list):
-        return [serialize_doc(item) for item in doc]
-    if isinstance(doc, dict):
-        result = {}
-        for key, value in doc.items():
-            if key == '_id':
-                result['id'] = str(value)
-            elif isinstance(value, ObjectId):
-                result[key] = str(value)
-            elif isinstance(value, datetime):
-                result[key] = value.isoformat()
-            elif isinstance(value, dict):
-                result[key] = serialize_doc(value)
-            elif isinstance(value, list):
-                result[key] = serialize_doc(value)
-            else:
-                result[key] = value
-        return result
-    return doc
+    """Convert MongoDB document to JSON serializable format.
+
+    Only needed when Python code works with the converted document; response
+    payloads can carry raw documents because create_response encodes them.
+    """
+    return to_jsonable(doc)
 
 def get_user_by_id(user_id):
-    """Get user by ID from database"""
+    """Get user by ID (without password hashes), served from the per-worker user cache"""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
     try:
-        user = db.users.find_one({'_id': ObjectId(user_id)})
-        return serialize_doc(user)
+        user = serialize_doc(db.users.find_one({'_id': ObjectId(user_id)}, USER_PROJECTION))
+        user_cache.set(user_id, user)
+        return dict(user) if user else None
     except Exception as e:
         logger.error(f"Error getting user: {e}")
         return None
 
+def get_user_profile(user_id):
+    """The user's profile dict, or {} if the user can't be found"""
+    user = get_user_by_id(user_id)
+    return (user.get('profile') or {}) if user else {}
+
+def generate_ai_text(prompt, profile=None, use_cache=True, json_mode=False, endpoint='default'):
+    """Run a Gemini prompt, serving repeated prompt/profile pairs from the response cache.
+
+    Identical cacheable calls already in flight (double clicks, several users
+    with the same profile) wait for that call instead of making their own;
+    use_cache=False calls are never shared. The call
+    runs through ai_gateway under the endpoint's deadline and raises
+    AIUnavailable when Gemini is saturated, timing out or failing.
+    json_mode asks Gemini for a bare JSON reply where the SDK supports it.
+    """
+    key = make_cache_key(prompt, profile, namespace='ai-json' if json_mode else 'ai')
+    if use_cache:
+        cached = ai_cache.get(key)
+        if cached is not None:
+            return cached
+
+    def call():
+        if use_cache:
+            # A call that finished just before this one became the leader
+            cached = ai_cache.get(key)
+            if cached is not None:
+                return cached
+        kwargs = {}
+        if json_mode:
+            config = ai_client.json_generation_config()
+            if config:
+                kwargs['generation_config'] = config
+        response = ai_gateway.call(endpoint, lambda: ai_client.generate_content(prompt, label=endpoint, **kwargs))
+        text = response.text or ''
+        if use_cache and text:
+            ai_cache.set(key, text)
+        return text
+
+    if not use_cache:
+        return call()
+    return ai_single_flight.do(key, call, ai_gateway.timeout_for(endpoint))
+
+def stream_ai_text(prompt, profile=None, endpoint='default'):
+    """Yield Gemini output chunks as they arrive; a cached response comes back as one chunk"""
+    cache_key = make_cache_key(prompt, profile)
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    with ai_gateway.slot(endpoint):
+        response = ai_client.generate_content(prompt, label=endpoint, stream=True)
+        try:
+            for chunk in response:
+                text = getattr(chunk, 'text', '') or ''
+                if text:
+                    parts.append(text)
+                    yield text
+        except GeneratorExit:
+            # Client went away mid-stream: stop pulling tokens from Gemini
+            ai_client.cancel_stream(response)
+            raise
+    text = ''.join(parts)
+    metrics.observe_stream_text(endpoint, text)
+    ai_cache.set(cache_key, text)
+
 def create_response(data=None, message=None, error=None, status=200):
     """Create standardized API response"""
     response = {}
@@ -104,7 +209,36 @@ def create_response(data=None, message=None, error=None, status=200):
         response['error'] = error
         status = status if status >= 400 else 400
     
-    return jsonify(response), status
+    # Raw Mongo documents are encoded in one pass (see json_encoder.py)
+    return Response(dumps_json(response), status=status, mimetype='application/json'), status
+
+def ai_unavailable_response(error):
+    """503 for an AIUnavailable error, with Retry-After (the breaker's reset time when it is open)"""
+    logger.warning(f"AI unavailable ({error.reason}): {error}")
+    response, status = create_response(error='AI service is busy or temporarily unavailable. Please try again shortly.',
+                                       status=503)
+    response.headers['Retry-After'] = str(ai_gateway.breaker.retry_after() if error.reason == 'circuit_open' else 5)
+    return response, status
+
+# Request metrics
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.registry.start_flusher()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+    return response
+
+# Opt-in per-request profiling; installs nothing unless configured (see profiling.py)
+profiling.install(app)
+
+# Registered last so it runs first: request metrics include compression time
+app.after_request(http_cache.compress_response)
 
 # Routes
 
@@ -135,9 +269,24 @@ def health_check():
         'status': 'OK',
         'timestamp': datetime.now(timezone.utc).isoformat(),
         'service': 'Satvic Diet Planner Flask API',
-        'version': '2.0'
+        'version': '2.0',
+        'ai': ai_client.health(),
+        'ai_gateway': ai_gateway.stats(),
+        'ai_cache': ai_cache.stats(),
+        'ai_single_flight': ai_single_flight.stats(),
+        'user_cache': user_cache.stats(),
+        'mongo_pool': mongo.stats(),
+        'ingredient_catalog': ingredient_catalog_loader.stats()
     })
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint; requires `Authorization: Bearer <METRICS_TOKEN>` when that is set"""
+    token = os.getenv('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return create_response(error='Unauthorized', status=401)
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 # Authentication Routes
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -168,9 +317,8 @@ def register():
         user_data = {
             'name': data['name'].strip(),
             'email': email,
-            # Store both werkzeug and bcrypt hashes for compatibility with existing Node users
-            'password': generate_password_hash(password),
-            'password_hash': bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=12)).decode('utf-8'),
+            # bcrypt only (shared with the Node API); hashed off the request thread
+            'password_hash': hash_password(password),
             'created_at': datetime.now(timezone.utc),
             'onboarding_completed': False,
             'profile': {
@@ -221,35 +369,27 @@ def login():
         if not user:
             return create_response(error='Invalid email or password', status=401)
 
-        # Support both werkzeug and bcrypt password hashes
-        valid_password = False
-        try:
-            if 'password' in user and isinstance(user['password'], str):
-                valid_password = check_password_hash(user['password'], password)
-        except Exception:
-            valid_password = False
-
-        if not valid_password and 'password_hash' in user and isinstance(user['password_hash'], str):
-            try:
-                valid_password = bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8'))
-            except Exception:
-                valid_password = False
-
+        # bcrypt, or the legacy werkzeug hash for older accounts
+        valid_password, needs_rehash, drop_legacy = verify_password(user, password)
         if not valid_password:
             return create_response(error='Invalid email or password', status=401)
         
         # Create access token
         access_token = create_access_token(identity=str(user['_id']))
         
-        # Update last login
-        db.users.update_one(
-            {'_id': user['_id']},
-            {'$set': {'last_login': datetime.now(timezone.utc)}}
-        )
+        # Update last login, migrating legacy/outdated hashes in the same write
+        update = {'$set': {'last_login': datetime.now(timezone.utc)}}
+        if needs_rehash:
+            update['$set']['password_hash'] = hash_password(password)
+        if drop_legacy:
+            update['$unset'] = {'password': ''}
+        db.users.update_one({'_id': user['_id']}, update)
+        user_cache.invalidate(str(user['_id']))
         
-        # Get user data without password
+        # Get user data without password hashes
         user_data = serialize_doc(user)
         user_data.pop('password', None)
+        user_data.pop('password_hash', None)
         
         logger.info(f"✅ User logged in: {email}")
         return create_response(data={
@@ -320,6 +460,7 @@ def update_profile():
             {'_id': ObjectId(user_id)},
             {'$set': update_data}
         )
+        user_cache.invalidate(user_id)
         
         if result.modified_count == 0:
             return create_response(error='No changes made to profile', status=400)
@@ -343,25 +484,64 @@ def _strip_code_fences(text: str) -> str:
         s = re.sub(r'\s*```$', '', s)
     return s.strip()
 
+def _paragraphs_to_html(text: str) -> str:
+    """Wrap plain-text paragraphs in <p> tags, keeping single line breaks"""
+    parts = [p.strip() for p in text.split('\n\n') if p.strip()]
+    return ''.join('<p>' + p.replace('\n', '<br>') + '</p>' for p in parts) or '<p></p>'
+
+def _wants_event_stream():
+    """SSE is opt-in: ?stream=1 or an Accept: text/event-stream header"""
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == 'text/event-stream'
+
+def _sse_ai_response(prompt, profile=None, done=None, endpoint='default'):
+    """Stream a Gemini completion as Server-Sent Events with incremental HTML normalization"""
+    def events():
+        # Comment frame so the client (and any proxy) sees the first byte immediately
+        yield ': stream-open\n\n'
+        normalizer = StreamingHtmlNormalizer()
+        try:
+            with closing(stream_ai_text(prompt, profile, endpoint)) as chunks:
+                for chunk in chunks:
+                    html = normalizer.feed(chunk)
+                    if html:
+                        yield sse_event('chunk', {'html': html})
+            tail = normalizer.close()
+            if tail:
+                yield sse_event('chunk', {'html': tail})
+            yield sse_event('done', done or {})
+        except Exception as e:
+            logger.error(f"❌ AI stream error: {e}")
+            yield sse_event('error', {'error': 'AI processing failed. Please try again.'})
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+def _onboarding_fallback():
+    """Basic plan served when Gemini isn't configured or is unavailable"""
+    fallback = {
+        'period': 'week',
+        'days': [
+            {
+                'date': datetime.now(timezone.utc).date().isoformat(),
+                'breakfast': {'name': 'Satvic Porridge', 'description': 'Warm oats with fruits and nuts'},
+                'lunch': {'name': 'Khichdi Bowl', 'description': 'Rice-lentil khichdi with veggies'},
+                'dinner': {'name': 'Moong Dal Soup', 'description': 'Light dal soup with salad'},
+            }
+        ]
+    }
+    return create_response(data={'mealPlan': fallback}, message='Meal plan generated (fallback)')
+
 @app.route('/api/ai/onboarding', methods=['POST'])
 @jwt_required()
 def ai_onboarding():
     """Handle AI onboarding conversation"""
     try:
-        if model is None:
-            # Fallback basic plan
-            fallback = {
-                'period': 'week',
-                'days': [
-                    {
-                        'date': datetime.now(timezone.utc).date().isoformat(),
-                        'breakfast': {'name': 'Satvic Porridge', 'description': 'Warm oats with fruits and nuts'},
-                        'lunch': {'name': 'Khichdi Bowl', 'description': 'Rice-lentil khichdi with veggies'},
-                        'dinner': {'name': 'Moong Dal Soup', 'description': 'Light dal soup with salad'},
-                    }
-                ]
-            }
-            return create_response(data={'mealPlan': fallback}, message='Meal plan generated (fallback)')
+        if not ai_client.configured or not ai_gateway.available():
+            return _onboarding_fallback()
             
         user_id = get_jwt_identity()
         data = request.get_json()
@@ -387,16 +567,18 @@ def ai_onboarding():
         Provide warm, encouraging guidance and ask the next appropriate single question.
         """
         
-        # Get AI response
-        response = model.generate_content(context)
-        ai_response = _strip_code_fences(response.text or '')
-        if '<' not in ai_response and '>' not in ai_response:
-            parts = [p.strip() for p in ai_response.split('\n\n') if p.strip()]
-            ai_response = ''.join(f'<p>{p.replace("\n", "<br>")}</p>' for p in parts) or '<p></p>'
-        
         # Determine next step
         next_step = min(step + 1, 6)
         
+        if _wants_event_stream():
+            logger.info(f"✅ AI onboarding step {step} streaming for user: {user_id}")
+            return _sse_ai_response(context, done={'step': next_step, 'completed': next_step > 5}, endpoint='onboarding')
+        
+        # Get AI response
+        ai_response = _strip_code_fences(generate_ai_text(context, endpoint='onboarding'))
+        if not looks_like_html(ai_response):
+            ai_response = _paragraphs_to_html(ai_response)
+        
         logger.info(f"✅ AI onboarding step {step} completed for user: {user_id}")
         return create_response(data={
             'response': ai_response,
@@ -404,30 +586,16 @@ def ai_onboarding():
             'completed': next_step > 5
         })
         
+    except AIUnavailable as e:
+        logger.warning(f"AI onboarding falling back ({e.reason})")
+        return _onboarding_fallback()
     except Exception as e:
         logger.error(f"❌ AI onboarding error: {e}")
         return create_response(error='AI processing failed. Please try again.', status=500)
 
-@app.route('/api/ai/generate-meal-plan', methods=['POST'])
-@jwt_required()
-def generate_meal_plan():
-    """Generate automated meal plan using Gemini AI"""
-    try:
-        if model is None:
-            return create_response(error='AI service is currently unavailable. Please check your API key configuration.', status=503)
-            
-        user_id = get_jwt_identity()
-        data = request.get_json()
-        
-        period = data.get('period', 'week')
-        focus = data.get('focus', 'balanced')
-        
-        # Get user profile for personalization
-        user = get_user_by_id(user_id)
-        profile = user.get('profile', {}) if user else {}
-        
-        # Create context for meal plan generation
-        context = f"""
+def _meal_plan_prompt(period, focus, profile, structured=True):
+    """Build the Gemini prompt for a personalised meal plan (JSON, or free text when not structured)"""
+    prompt = f"""
         Generate a detailed {period} meal plan focused on {focus} nutrition.
         
         User Profile:
@@ -446,43 +614,153 @@ def generate_meal_plan():
         - Make it practical and easy to follow
         - Include variety and seasonal ingredients
         
-        Format the response as a structured meal plan with clear days and meal times.
         """
+    if not structured:
+        return prompt + "Format the response as a structured meal plan with clear days and meal times.\n"
+    return prompt + meal_plan_schema.prompt_schema(period)
+
+def _generate_structured_plan(prompt, period, focus):
+    """Ask Gemini for a JSON plan and normalize it; one repair attempt on invalid output.
+
+    Periods longer than a week come back as a weekly rotation and are repeated
+    to full length. Returns (plan, raw_text); plan is None when both replies
+    were unusable.
+    """
+    text = generate_ai_text(prompt, use_cache=False, json_mode=True, endpoint='meal_plan')
+    try:
+        plan = meal_plan_schema.parse_plan(text, period, focus)
+    except PlanValidationError as e:
+        logger.warning(f"Meal plan JSON rejected ({e}); asking Gemini to correct it")
+        repair = f"{prompt}\n\nYour previous reply was rejected: {e}. Reply again with corrected JSON only."
+        text = generate_ai_text(repair, use_cache=False, json_mode=True, endpoint='meal_plan')
+        try:
+            plan = meal_plan_schema.parse_plan(text, period, focus)
+        except PlanValidationError as e:
+            logger.error(f"❌ Meal plan JSON rejected twice: {e}")
+            return None, text
+    return meal_plan_schema.repeat_days(plan, meal_plan_schema.period_days(period)), text
+
+def _store_meal_plan(user_id, period, focus, plan, raw_text=None):
+    """Insert a generated plan; returns the inserted id.
+
+    Structured plans are stored normalized under `plan` (with the distinct
+    ingredient names alongside for querying) and rendered once to `content`.
+    """
+    meal_plan_data = {
+        'user_id': ObjectId(user_id),
+        'period': period,
+        'focus': focus,
+        'generated_at': datetime.now(timezone.utc),
+        'status': 'active'
+    }
+    if plan is not None:
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        meal_plan_schema.assign_dates(plan, today)
+        meal_plan_schema.link_recipes(plan, db.recipes)
+        meal_plan_data['plan'] = plan
+        meal_plan_data['ingredients'] = meal_plan_schema.ingredient_names(plan)
+        meal_plan_data['content'] = meal_plan_schema.render_html(plan)
+    else:
+        meal_plan_data['plan'] = None
+        meal_plan_data['content'] = raw_text or ''
+    plan_id = db.meal_plans.insert_one(meal_plan_data).inserted_id
+    resource_versions.bump('meal_plans', user_id)
+    return plan_id
+
+def _generate_and_store_meal_plan(user_id, period, focus, profile):
+    """Generate a meal plan with Gemini and save it to db.meal_plans"""
+    # Plans are meant to vary between requests, so they bypass the response cache
+    plan, text = _generate_structured_plan(_meal_plan_prompt(period, focus, profile), period, focus)
+    if plan is None:
+        # Don't store unusable JSON; a free-text plan is still useful to the user
+        text = _strip_code_fences(generate_ai_text(_meal_plan_prompt(period, focus, profile, structured=False),
+                                                   use_cache=False, endpoint='meal_plan'))
+        if not looks_like_html(text):
+            text = _paragraphs_to_html(text)
+    plan_id = _store_meal_plan(user_id, period, focus, plan, text)
+    
+    logger.info(f"✅ Meal plan generated for user: {user_id}")
+    return {
+        'meal_plan': meal_plan_schema.render_html(plan) if plan else text,
+        'plan': plan,
+        'id': str(plan_id),
+        'period': period,
+        'focus': focus
+    }
+
+@app.route('/api/ai/generate-meal-plan', methods=['POST'])
+@jwt_required()
+def generate_meal_plan():
+    """Generate automated meal plan using Gemini AI.
+
+    With ?async=1 (or "async": true in the body) the plan is generated in the
+    background and the response is 202 with a job id to poll at /api/jobs/<id>.
+    """
+    try:
+        if not ai_client.configured:
+            return create_response(error='AI service is currently unavailable. Please check your API key configuration.', status=503)
+        if not ai_gateway.available():
+            # Don't queue a job that can only fail
+            return ai_unavailable_response(AIUnavailable('circuit_open'))
+            
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
         
-        # Generate meal plan
-        response = model.generate_content(context)
-        meal_plan = response.text
-        
-        # Save meal plan to database
-        meal_plan_data = {
-            'user_id': ObjectId(user_id),
-            'period': period,
-            'focus': focus,
-            'content': meal_plan,
-            'generated_at': datetime.now(timezone.utc),
-            'status': 'active'
-        }
-        
-        result = db.meal_plans.insert_one(meal_plan_data)
+        period = data.get('period', 'week')
+        focus = data.get('focus', 'balanced')
         
-        logger.info(f"✅ Meal plan generated for user: {user_id}")
-        return create_response(data={
-            'meal_plan': meal_plan,
-            'id': str(result.inserted_id),
-            'period': period,
-            'focus': focus
-        }, message='Meal plan generated successfully')
+        # Get user profile for personalization
+        profile = get_user_profile(user_id)
         
+        if data.get('async') is True or request.args.get('async', '').lower() in ('1', 'true'):
+            try:
+                job_id = job_queue.submit('meal_plan', user_id, _generate_and_store_meal_plan,
+                                          user_id, period, focus, profile)
+            except JobQueueFull:
+                return create_response(error='Too many meal plans are being generated. Please try again shortly.', status=503)
+            
+            response, status = create_response(data={
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/api/jobs/{job_id}'
+            }, message='Meal plan generation started', status=202)
+            response.headers['Location'] = f'/api/jobs/{job_id}'
+            return response, status
+        
+        result = _generate_and_store_meal_plan(user_id, period, focus, profile)
+        return create_response(data=result, message='Meal plan generated successfully')
+        
+    except AIUnavailable as e:
+        return ai_unavailable_response(e)
     except Exception as e:
         logger.error(f"❌ Meal plan generation error: {e}")
         return create_response(error='Meal plan generation failed. Please try again.', status=500)
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Poll the status of a background job"""
+    try:
+        user_id = get_jwt_identity()
+        job = job_queue.get(job_id, user_id)
+        
+        if not job:
+            return create_response(error='Job not found', status=404)
+        
+        job = serialize_doc(job)
+        job.pop('user_id', None)
+        return create_response(data={'job': job})
+        
+    except Exception as e:
+        logger.error(f"❌ Job retrieval error: {e}")
+        return create_response(error='Failed to retrieve job', status=500)
+
 # Legacy-compatible endpoint expected by the frontend
 @app.route('/api/meal-plans/generate', methods=['POST'])
 @jwt_required()
 def generate_meal_plan_legacy():
     try:
-        if model is None:
+        if not ai_client.configured:
             return create_response(error='AI service is currently unavailable. Please check your API key configuration.', status=503)
 
         user_id = get_jwt_identity()
@@ -491,36 +769,26 @@ def generate_meal_plan_legacy():
         focus = data.get('focus', 'balance')
 
         # Fetch minimal user context (optional)
-        user = get_user_by_id(user_id)
-        profile = user.get('profile', {}) if user else {}
+        profile = get_user_profile(user_id)
 
         prompt = (
             f"Create a {period} Satvic meal plan focused on {focus}.\n"
-            f"User Profile: {json.dumps(profile)}\n\n"
-            "Return ONLY valid JSON using this exact schema:\n"
-            "{\n"
-            '  "period": "daily|weekly|monthly",\n'
-            '  "days": [\n'
-            "    {\n"
-            '      "date": "YYYY-MM-DD",\n'
-            '      "breakfast": {"name": "...", "description": "..."},\n'
-            '      "lunch": {"name": "...", "description": "..."},\n'
-            '      "dinner": {"name": "...", "description": "..."}\n'
-            "    }\n"
-            "  ]\n"
-            "}\n"
+            f"User Profile: {json.dumps(profile, default=str)}\n\n"
+            + meal_plan_schema.prompt_schema(period)
         )
 
-        gen_response = model.generate_content(prompt)
-        text = gen_response.text or ''
-
-        # Strip code fences
-        text = _strip_code_fences(text)
-
-        try:
-            parsed = json.loads(text)
-        except Exception:
-            # Fallback minimal daily plan if parsing fails
+        plan = None
+        if ai_gateway.available():
+            try:
+                plan, text = _generate_structured_plan(prompt, period, focus)
+            except AIUnavailable as e:
+                logger.warning(f"Legacy meal plan falling back ({e.reason})")
+        if plan is not None:
+            plan_id = _store_meal_plan(user_id, period, focus, plan)
+            parsed = meal_plan_schema.to_legacy(plan)
+            parsed['id'] = str(plan_id)
+        else:
+            # Fallback minimal daily plan if parsing fails or Gemini is unavailable
             parsed = {
                 'period': period,
                 'days': [
@@ -543,7 +811,7 @@ def generate_meal_plan_legacy():
 def generate_recipe():
     """Generate a custom recipe using Gemini AI"""
     try:
-        if model is None:
+        if not ai_client.configured:
             return create_response(error='AI service is currently unavailable. Please check your API key configuration.', status=503)
             
         user_id = get_jwt_identity()
@@ -555,8 +823,7 @@ def generate_recipe():
         cooking_time = data.get('cooking_time', 30)
         
         # Get user profile for personalization
-        user = get_user_by_id(user_id)
-        profile = user.get('profile', {}) if user else {}
+        profile = get_user_profile(user_id)
         
         # Create context for recipe generation
         context = f"""
@@ -582,8 +849,7 @@ def generate_recipe():
         """
         
         # Generate recipe
-        response = model.generate_content(context)
-        recipe_content = _strip_code_fences(response.text or '')
+        recipe_content = _strip_code_fences(generate_ai_text(context, profile, endpoint='recipe'))
         
         # Save recipe to database
         recipe_data = {
@@ -599,6 +865,7 @@ def generate_recipe():
         }
         
         result = db.recipes.insert_one(recipe_data)
+        resource_versions.bump('recipes')
         
         logger.info(f"✅ Custom recipe generated for user: {user_id}")
         return create_response(data={
@@ -607,6 +874,8 @@ def generate_recipe():
             'meal_type': meal_type
         }, message='Recipe generated successfully')
         
+    except AIUnavailable as e:
+        return ai_unavailable_response(e)
     except Exception as e:
         logger.error(f"❌ Recipe generation error: {e}")
         return create_response(error='Recipe generation failed. Please try again.', status=500)
@@ -614,18 +883,27 @@ def generate_recipe():
 @app.route('/api/shopping/generate', methods=['POST'])
 @jwt_required()
 def generate_shopping_list():
-    """Generate a shopping list from budget (₹) and cooking goal/plan."""
+    """Generate a shopping list from budget (₹) and cooking goal/plan.
+
+    With meal_plan_ids or a from/to date range the list is built from the
+    user's saved plans without calling Gemini (budget_inr is optional there).
+    """
     try:
         data = request.get_json() or {}
+        if any(key in data for key in ('meal_plan_ids', 'from', 'to')):
+            return _shopping_list_from_plans(get_jwt_identity(), data)
         budget_inr = data.get('budget_inr')
         goal = (data.get('goal') or '').strip()
-        if budget_inr is None or not isinstance(budget_inr, (int, float)) or budget_inr <= 0:
+        if not _is_number(budget_inr) or budget_inr <= 0:
             return create_response(error='budget_inr must be a positive number', status=400)
         if not goal:
             return create_response(error='goal is required', status=400)
+        region = (data.get('region') or '').strip().lower() or ingredient_catalog.REGION
         items = []
+        skipped = []
         summary = {'budget_inr': int(budget_inr), 'estimated_cost_inr': None, 'under_budget': None, 'note': ''}
-        if model is not None:
+        # An open breaker goes straight to the catalog staples below
+        if ai_client.configured and ai_gateway.available():
             schema = ('{"summary": {"budget_inr": number, "estimated_cost_inr": number, "under_budget": boolean, "note": string}, '
                       '"items": [{"name": string, "quantity": number, "unit": string, "approx_price_inr": number, "category": string, "priority": string}]}')
             prompt = ("You are a helpful Indian grocery shopping planner.\n"
@@ -640,8 +918,7 @@ def generate_shopping_list():
                       "- Category examples: produce, grains, dairy, spices, pantry, protein, other.\n"
                       "- priority must be one of: high, medium, low.\n")
             try:
-                gen = model.generate_content(prompt)
-                text = (gen.text or '').strip()
+                text = generate_ai_text(prompt, endpoint='shopping_list').strip()
                 if text.startswith('```'):
                     text = text.strip('`')
                     if text.startswith('json'):
@@ -660,34 +937,9 @@ def generate_shopping_list():
             except Exception as e:
                 logger.error(f"AI shopping generation failed: {e}")
         if not items:
-            base_items = [
-                { 'name': 'Atta (whole wheat flour)', 'quantity': 2, 'unit': 'kg', 'approx_price_inr': 120, 'category': 'grains', 'priority': 'high' },
-                { 'name': 'Rice', 'quantity': 2, 'unit': 'kg', 'approx_price_inr': 180, 'category': 'grains', 'priority': 'high' },
-                { 'name': 'Onion', 'quantity': 1, 'unit': 'kg', 'approx_price_inr': 40, 'category': 'produce', 'priority': 'high' },
-                { 'name': 'Tomato', 'quantity': 1, 'unit': 'kg', 'approx_price_inr': 50, 'category': 'produce', 'priority': 'high' },
-                { 'name': 'Potato', 'quantity': 1, 'unit': 'kg', 'approx_price_inr': 35, 'category': 'produce', 'priority': 'high' },
-                { 'name': 'Milk/Curd', 'quantity': 2, 'unit': 'L', 'approx_price_inr': 120, 'category': 'dairy', 'priority': 'medium' },
-                { 'name': 'Cooking Oil', 'quantity': 1, 'unit': 'L', 'approx_price_inr': 160, 'category': 'pantry', 'priority': 'high' },
-                { 'name': 'Dal (moong/toor)', 'quantity': 1, 'unit': 'kg', 'approx_price_inr': 140, 'category': 'protein', 'priority': 'high' },
-                { 'name': 'Masala basics', 'quantity': 1, 'unit': 'pack', 'approx_price_inr': 100, 'category': 'spices', 'priority': 'high' },
-                { 'name': 'Leafy greens', 'quantity': 500, 'unit': 'g', 'approx_price_inr': 40, 'category': 'produce', 'priority': 'medium' },
-            ]
-            goal_l = goal.lower()
-            if 'paneer' in goal_l:
-                base_items.append({ 'name': 'Paneer', 'quantity': 500, 'unit': 'g', 'approx_price_inr': 200, 'category': 'dairy', 'priority': 'high' })
-            if 'roti' in goal_l or 'chapati' in goal_l:
-                base_items.append({ 'name': 'Ghee (optional)', 'quantity': 200, 'unit': 'g', 'approx_price_inr': 150, 'category': 'pantry', 'priority': 'low' })
-            if any(x in goal_l for x in ['tikka', 'grill', 'marinate']):
-                base_items.append({ 'name': 'Yogurt/Curd (for marinade)', 'quantity': 500, 'unit': 'g', 'approx_price_inr': 60, 'category': 'dairy', 'priority': 'medium' })
-                base_items.append({ 'name': 'Spice mix (tikka masala)', 'quantity': 1, 'unit': 'pack', 'approx_price_inr': 80, 'category': 'spices', 'priority': 'medium' })
-            total = 0
-            items = []
-            for it in base_items:
-                if total + it['approx_price_inr'] <= budget_inr or it['priority'] in ('high', 'medium'):
-                    items.append(it)
-                    total += it['approx_price_inr']
-                if total >= budget_inr * 1.15:
-                    break
+            base_items = shopping.staple_items(ingredient_catalog_loader.get(), goal, region)
+            items, skipped = shopping.knapsack(base_items, budget_inr)
+            total = sum(it['approx_price_inr'] for it in items)
             summary['estimated_cost_inr'] = int(total)
             summary['under_budget'] = total <= budget_inr
             if not summary['note']:
@@ -701,17 +953,71 @@ def generate_shopping_list():
                     pass
             summary['estimated_cost_inr'] = int(est)
             summary['under_budget'] = est <= budget_inr
-        return create_response(data={'summary': summary, 'items': items})
+        return create_response(data={'summary': summary, 'items': items, 'skipped': skipped})
     except Exception as e:
         logger.error(f"❌ Shopping list generation error: {e}")
         return create_response(error='Failed to generate shopping list', status=500)
 
+def _is_number(value):
+    """int or float from a JSON body; true/false are not numbers here"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _shopping_list_from_plans(user_id, data):
+    """Deterministic shopping list from stored meal plans"""
+    budget_inr = data.get('budget_inr')
+    servings = data.get('servings', 1)
+    if budget_inr is not None and (not _is_number(budget_inr) or budget_inr <= 0):
+        return create_response(error='budget_inr must be a positive number', status=400)
+    if not _is_number(servings) or not 1 <= servings <= 20:
+        return create_response(error='servings must be a number between 1 and 20', status=400)
+    try:
+        plan_ids = shopping.parse_plan_ids(data['meal_plan_ids']) if 'meal_plan_ids' in data else None
+        start = shopping.parse_day(data.get('from'), 'from')
+        end = shopping.parse_day(data.get('to'), 'to')
+    except ValueError as e:
+        return create_response(error=str(e), status=400)
+    if plan_ids is None and start is None and end is None:
+        # {"from": null} or {"from": ""} would otherwise fall through to every saved plan
+        return create_response(error='Give meal_plan_ids or a from/to date', status=400)
+    
+    region = (data.get('region') or '').strip().lower() or ingredient_catalog.REGION
+    result = shopping.from_meal_plans(db, ingredient_catalog_loader.get(), ObjectId(user_id), plan_ids, start, end,
+                                      servings, budget_inr, region)
+    if not result['summary']['meal_plan_ids']:
+        return create_response(error='No saved meal plans match', status=404)
+    return create_response(data=result)
+
+@app.route('/api/ingredients', methods=['GET'])
+@jwt_required()
+def lookup_ingredients():
+    """Ingredient autocomplete from the catalog: prefix matches, else the closest spelling"""
+    try:
+        query = request.args.get('q', '').strip()
+        region = request.args.get('region', '').strip().lower() or ingredient_catalog.REGION
+        limit = parse_limit(request.args, 10, 25)
+        catalog = ingredient_catalog_loader.get()
+        
+        matches = catalog.prefix(query, limit) if query else []
+        if not matches and query:
+            closest = catalog.match(query)
+            matches = [closest] if closest else []
+        
+        return create_response(data={
+            'ingredients': [ingredient.to_dict(region) for ingredient in matches],
+            'count': len(matches)
+        })
+    except ValueError:
+        return create_response(error='limit must be an integer', status=400)
+    except Exception as e:
+        logger.error(f"❌ Ingredient lookup error: {e}")
+        return create_response(error='Ingredient lookup failed', status=500)
+
 @app.route('/api/ai/chat', methods=['POST'])
 @jwt_required()
 def ai_chat():
     """Handle general AI chat"""
     try:
-        if model is None:
+        if not ai_client.configured:
             return create_response(error='AI service is currently unavailable. Please check your API key configuration.', status=503)
             
         user_id = get_jwt_identity()
@@ -722,12 +1028,12 @@ def ai_chat():
             return create_response(error='Message cannot be empty', status=400)
         
         # Get user context
-        user = get_user_by_id(user_id)
+        profile = get_user_profile(user_id)
         
         context = f"""
         You are a nutrition and wellness expert assistant.
         
-        User's profile: {user.get('profile', {})}
+        User's profile: {profile}
         User's question: {message}
         
         RESPONSE FORMAT (IMPORTANT):
@@ -737,16 +1043,20 @@ def ai_chat():
         - Keep responses practical, encouraging, and under 180 words
         """
         
+        if _wants_event_stream():
+            logger.info(f"✅ AI chat response streaming for user: {user_id}")
+            return _sse_ai_response(context, profile, endpoint='chat')
+        
         # Get AI response
-        response = model.generate_content(context)
-        ai_response = _strip_code_fences(response.text or '')
-        if '<' not in ai_response and '>' not in ai_response:
-            parts = [p.strip() for p in ai_response.split('\n\n') if p.strip()]
-            ai_response = ''.join(f'<p>{p.replace("\n", "<br>")}</p>' for p in parts) or '<p></p>'
+        ai_response = _strip_code_fences(generate_ai_text(context, profile, endpoint='chat'))
+        if not looks_like_html(ai_response):
+            ai_response = _paragraphs_to_html(ai_response)
         
         logger.info(f"✅ AI chat response generated for user: {user_id}")
         return create_response(data={'response': ai_response})
         
+    except AIUnavailable as e:
+        return ai_unavailable_response(e)
     except Exception as e:
         logger.error(f"❌ AI chat error: {e}")
         return create_response(error='AI processing failed. Please try again.', status=500)
@@ -756,7 +1066,7 @@ def ai_chat():
 def get_ai_recipes():
     """Get AI-generated recipe suggestions based on query and user profile"""
     try:
-        if model is None:
+        if not ai_client.configured:
             return create_response(error='AI service is currently unavailable. Please check your API key configuration.', status=503)
 
         user_id = get_jwt_identity()
@@ -764,8 +1074,7 @@ def get_ai_recipes():
         meal_type = request.args.get('meal_type', '').strip() or 'any'
         cooking_time = request.args.get('cooking_time', '').strip()
 
-        user = get_user_by_id(user_id)
-        profile = user.get('profile', {}) if user else {}
+        profile = get_user_profile(user_id)
 
         context = f"""
         Generate 6 healthy recipe suggestions.
@@ -785,8 +1094,7 @@ def get_ai_recipes():
         - instructions (array of short step strings)
         """
         
-        ai_result = model.generate_content(context)
-        text = ai_result.text or ''
+        text = generate_ai_text(context, profile, endpoint='recipes')
 
         # Strip potential code fences
         text = text.strip()
@@ -830,30 +1138,88 @@ def get_ai_recipes():
             'count': len(recipes),
             'source': 'ai_generated'
         })
+    except AIUnavailable as e:
+        return ai_unavailable_response(e)
     except Exception as e:
         logger.error(f"❌ AI recipe generation error: {e}")
         return create_response(error='Recipe generation failed. Please try again.', status=500)
 
+# Keyset pagination orders; each ends in _id so the order is total
+MEAL_PLAN_SORT = [('generated_at', DESC), ('_id', DESC)]
+PROGRESS_SORT = [('date', DESC), ('_id', DESC)]
+NOTIFICATION_SORT = [('created_at', DESC), ('_id', DESC)]
+
+# Fields selectable with ?fields= on the list endpoints. The meal plan list
+# returns a summary by default; the generated `content` is only served by
+# GET /api/meal-plans/<plan_id>.
+MEAL_PLAN_SUMMARY_FIELDS = ('period', 'focus', 'focus_area', 'date', 'generated_at', 'created_at', 'status')
+MEAL_PLAN_LIST_FIELDS = MEAL_PLAN_SUMMARY_FIELDS + ('breakfast', 'lunch', 'dinner', 'snacks', 'updated_at',
+                                                  'ingredients')
+PROGRESS_FIELDS = ('date', 'weight', 'energy_level', 'mood', 'sleep_quality', 'water_intake',
+                   'exercise_minutes', 'notes', 'created_at')
+NOTIFICATION_FIELDS = ('title', 'message', 'type', 'scheduled_for', 'read', 'created_at')
+RECIPE_FIELDS = ('name', 'description', 'ingredients', 'instructions', 'dosha_benefits', 'meal_type',
+                 'cooking_time', 'difficulty_level', 'nutritional_info', 'seasonal_tags', 'image_url',
+                 'created_at')
+
 @app.route('/api/meal-plans', methods=['GET'])
 @jwt_required()
+@resource_versions.conditional('meal_plans')
 def get_meal_plans():
-    """Get user's meal plans"""
+    """Get summaries of the user's meal plans, newest first (?limit, ?cursor, ?fields)"""
     try:
         user_id = get_jwt_identity()
+        limit = parse_limit(request.args, 10, 50)
+        projection = parse_fields(request.args, MEAL_PLAN_LIST_FIELDS, MEAL_PLAN_SUMMARY_FIELDS, MEAL_PLAN_SORT)
         
-        meal_plans = list(db.meal_plans.find(
-            {'user_id': ObjectId(user_id)}
-        ).sort('generated_at', -1).limit(10))
+        meal_plans, next_cursor = paginate(
+            db.meal_plans, {'user_id': ObjectId(user_id)}, MEAL_PLAN_SORT, limit, request.args.get('cursor'),
+            projection
+        )
         
         return create_response(data={
-            'meal_plans': serialize_doc(meal_plans),
-            'count': len(meal_plans)
+            'meal_plans': meal_plans,
+            'count': len(meal_plans),
+            'next_cursor': next_cursor
         })
         
+    except (InvalidCursor, InvalidFields) as e:
+        return create_response(error=str(e), status=400)
+    except ValueError:
+        return create_response(error='limit must be an integer', status=400)
     except Exception as e:
         logger.error(f"❌ Meal plans retrieval error: {e}")
         return create_response(error='Failed to retrieve meal plans', status=500)
 
+MAX_BULK_MEAL_PLAN_DAYS = 31
+
+def _meal_plan_day_upsert(user_id, data):
+    """Build the (filter, update) pair that upserts one day of a user's meal plan.
+
+    Raises ValueError with a client-facing message when the date is missing or invalid.
+    """
+    date_str = data.get('date')
+    if not date_str or not isinstance(date_str, str):
+        raise ValueError('date is required (ISO string)')
+    try:
+        plan_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('Invalid date format')
+
+    now = datetime.now(timezone.utc)
+    update_fields = {
+        'breakfast': data.get('breakfast'),
+        'lunch': data.get('lunch'),
+        'dinner': data.get('dinner'),
+        'snacks': data.get('snacks'),
+        'focus_area': data.get('focus_area'),
+        'updated_at': now,
+    }
+    return (
+        {'user_id': ObjectId(user_id), 'date': plan_date},
+        {'$set': update_fields, '$setOnInsert': {'created_at': now}},
+    )
+
 @app.route('/api/meal-plans', methods=['POST'])
 @jwt_required()
 def create_or_update_meal_plan():
@@ -862,52 +1228,81 @@ def create_or_update_meal_plan():
         user_id = get_jwt_identity()
         data = request.get_json() or {}
 
-        date_str = data.get('date')
-        if not date_str:
-            return create_response(error='date is required (ISO string)', status=400)
-
         try:
-            plan_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-        except Exception:
-            return create_response(error='Invalid date format', status=400)
-
-        update_fields = {
-            'breakfast': data.get('breakfast'),
-            'lunch': data.get('lunch'),
-            'dinner': data.get('dinner'),
-            'snacks': data.get('snacks'),
-            'focus_area': data.get('focus_area'),
-            'updated_at': datetime.now(timezone.utc),
-        }
+            plan_filter, update = _meal_plan_day_upsert(user_id, data)
+        except ValueError as e:
+            return create_response(error=str(e), status=400)
 
-        # Upsert by user + date
-        existing = db.meal_plans.find_one({'user_id': ObjectId(user_id), 'date': plan_date})
-        if existing:
-            db.meal_plans.update_one(
-                {'_id': existing['_id']},
-                {'$set': update_fields}
+        # Single round trip; the unique (user_id, date) index turns a concurrent
+        # insert of the same day into a DuplicateKeyError, after which the retry
+        # simply updates the document the other request created.
+        try:
+            saved = db.meal_plans.find_one_and_update(
+                plan_filter, update, upsert=True, return_document=ReturnDocument.AFTER
             )
-            saved = db.meal_plans.find_one({'_id': existing['_id']})
-        else:
-            new_plan = {
-                'user_id': ObjectId(user_id),
-                'date': plan_date,
-                'breakfast': data.get('breakfast'),
-                'lunch': data.get('lunch'),
-                'dinner': data.get('dinner'),
-                'snacks': data.get('snacks'),
-                'focus_area': data.get('focus_area'),
-                'created_at': datetime.now(timezone.utc),
-                'updated_at': datetime.now(timezone.utc),
-            }
-            result = db.meal_plans.insert_one(new_plan)
-            saved = db.meal_plans.find_one({'_id': result.inserted_id})
+        except DuplicateKeyError:
+            saved = db.meal_plans.find_one_and_update(
+                plan_filter, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        resource_versions.bump('meal_plans', user_id)
 
-        return create_response(data={'mealPlan': serialize_doc(saved)})
+        return create_response(data={'mealPlan': saved})
     except Exception as e:
         logger.error(f"❌ Create/update meal plan error: {e}")
         return create_response(error='Error saving meal plan', status=500)
 
+@app.route('/api/meal-plans/bulk', methods=['POST'])
+@jwt_required()
+def bulk_upsert_meal_plans():
+    """Create or update several days of a user's meal plan in one bulk write"""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        days = data.get('days')
+
+        if not isinstance(days, list) or not days:
+            return create_response(error='days must be a non-empty array', status=400)
+        if len(days) > MAX_BULK_MEAL_PLAN_DAYS:
+            return create_response(error=f'At most {MAX_BULK_MEAL_PLAN_DAYS} days per request', status=400)
+
+        operations = {}
+        errors = []
+        for index, day in enumerate(days):
+            try:
+                if not isinstance(day, dict):
+                    raise ValueError('each day must be an object')
+                plan_filter, update = _meal_plan_day_upsert(user_id, day)
+            except ValueError as e:
+                errors.append({'index': index, 'error': str(e)})
+                continue
+            # Last entry wins when the same date appears twice
+            operations[plan_filter['date']] = UpdateOne(plan_filter, update, upsert=True)
+
+        writes = list(operations.values())
+        if writes:
+            try:
+                db.meal_plans.bulk_write(writes, ordered=False)
+            except BulkWriteError as e:
+                # Concurrent saves of the same day lose the insert race; apply them as updates
+                write_errors = e.details.get('writeErrors', [])
+                if any(err.get('code') != 11000 for err in write_errors):
+                    raise
+                db.meal_plans.bulk_write([writes[err['index']] for err in write_errors], ordered=False)
+            resource_versions.bump('meal_plans', user_id)
+
+        saved = list(db.meal_plans.find(
+            {'user_id': ObjectId(user_id), 'date': {'$in': list(operations)}}
+        ).sort('date', 1))
+
+        return create_response(data={
+            'mealPlans': saved,
+            'count': len(saved),
+            'errors': errors
+        }, status=200 if not errors else 207)
+    except Exception as e:
+        logger.error(f"❌ Bulk meal plan save error: {e}")
+        return create_response(error='Error saving meal plans', status=500)
+
 @app.route('/api/meal-plans/<plan_id>', methods=['DELETE'])
 @jwt_required()
 def delete_meal_plan(plan_id):
@@ -917,6 +1312,7 @@ def delete_meal_plan(plan_id):
         deleted = db.meal_plans.delete_one({'_id': ObjectId(plan_id), 'user_id': ObjectId(user_id)})
         if deleted.deleted_count == 0:
             return create_response(error='Meal plan not found', status=404)
+        resource_versions.bump('meal_plans', user_id)
         return create_response(message='Meal plan deleted successfully')
     except Exception as e:
         logger.error(f"❌ Delete meal plan error: {e}")
@@ -924,6 +1320,7 @@ def delete_meal_plan(plan_id):
 
 @app.route('/api/meal-plans/<plan_id>', methods=['GET'])
 @jwt_required()
+@resource_versions.conditional('meal_plans')
 def get_meal_plan(plan_id):
     """Get specific meal plan"""
     try:
@@ -937,7 +1334,7 @@ def get_meal_plan(plan_id):
         if not meal_plan:
             return create_response(error='Meal plan not found', status=404)
         
-        return create_response(data={'meal_plan': serialize_doc(meal_plan)})
+        return create_response(data={'meal_plan': meal_plan})
         
     except Exception as e:
         logger.error(f"❌ Meal plan retrieval error: {e}")
@@ -946,25 +1343,21 @@ def get_meal_plan(plan_id):
 # Recipe Routes
 @app.route('/api/recipes', methods=['GET'])
 @jwt_required()
+@resource_versions.conditional('recipes', per_user=False)
 def get_recipes():
-    """Get recipes with filters"""
+    """Get recipes with filters; searches are relevance-ranked and paginated"""
     try:
         # Get query parameters
         search = request.args.get('search', '').strip()
         meal_type = request.args.get('meal_type', '').strip()
         cooking_time = request.args.get('cooking_time', '').strip()
-        limit = min(int(request.args.get('limit', 20)), 50)  # Max 50 recipes
+        limit = parse_limit(request.args, 20, 50)  # Max 50 recipes
+        cursor = request.args.get('cursor')
+        projection = parse_fields(request.args, RECIPE_FIELDS)
         
-        # Build query
+        # Build filters
         query = {}
         
-        if search:
-            query['$or'] = [
-                {'name': {'$regex': search, '$options': 'i'}},
-                {'description': {'$regex': search, '$options': 'i'}},
-                {'ingredients': {'$regex': search, '$options': 'i'}}
-            ]
-        
         if meal_type:
             query['meal_type'] = meal_type
         
@@ -977,13 +1370,16 @@ def get_recipes():
             if cooking_time in time_ranges:
                 query['cooking_time'] = time_ranges[cooking_time]
         
-        # Get recipes from database
-        recipes = list(db.recipes.find(query).limit(limit))
+        # Get recipes from database (text index search when a query is given)
+        recipes, next_cursor = search_recipes(db.recipes, search, query, limit=limit, cursor=cursor,
+                                             projection=projection)
         
         logger.info(f"✅ Found {len(recipes)} recipes with filters")
         return create_response(data={
-            'recipes': serialize_doc(recipes),
+            'recipes': recipes,
             'count': len(recipes),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
             'filters_applied': {
                 'search': search,
                 'meal_type': meal_type,
@@ -991,19 +1387,24 @@ def get_recipes():
             }
         })
         
+    except (InvalidCursor, InvalidFields) as e:
+        return create_response(error=str(e), status=400)
+    except ValueError:
+        return create_response(error='limit must be an integer', status=400)
     except Exception as e:
         logger.error(f"❌ Recipe search error: {e}")
         return create_response(error='Recipe search failed', status=500)
 
 @app.route('/api/recipes/<recipe_id>', methods=['GET'])
 @jwt_required()
+@resource_versions.conditional('recipes', per_user=False)
 def get_recipe_by_id(recipe_id):
     """Get a single recipe by ID"""
     try:
         recipe = db.recipes.find_one({'_id': ObjectId(recipe_id)})
         if not recipe:
             return create_response(error='Recipe not found', status=404)
-        return create_response(data={'recipe': serialize_doc(recipe)})
+        return create_response(data={'recipe': recipe})
     except Exception as e:
         logger.error(f"❌ Get recipe error: {e}")
         return create_response(error='Error fetching recipe', status=500)
@@ -1033,8 +1434,9 @@ def create_recipe():
             'created_at': datetime.now(timezone.utc),
         }
         result = db.recipes.insert_one(doc)
+        resource_versions.bump('recipes')
         saved = db.recipes.find_one({'_id': result.inserted_id})
-        return create_response(data={'recipe': serialize_doc(saved)}, status=201)
+        return create_response(data={'recipe': saved}, status=201)
     except Exception as e:
         logger.error(f"❌ Create recipe error: {e}")
         return create_response(error='Error creating recipe', status=500)
@@ -1042,22 +1444,30 @@ def create_recipe():
 # Progress Routes
 @app.route('/api/progress', methods=['GET'])
 @jwt_required()
+@resource_versions.conditional('progress')
 def get_progress():
-    """Get user progress data"""
+    """Get user progress data, newest first (?limit, ?cursor, ?fields)"""
     try:
         user_id = get_jwt_identity()
-        limit = min(int(request.args.get('limit', 30)), 90)  # Max 90 entries
+        limit = parse_limit(request.args, 30, 90)  # Max 90 entries per page
+        projection = parse_fields(request.args, PROGRESS_FIELDS, sort=PROGRESS_SORT)
         
         # Get progress entries
-        progress = list(db.progress.find(
-            {'user_id': ObjectId(user_id)}
-        ).sort('date', -1).limit(limit))
+        progress, next_cursor = paginate(
+            db.progress, {'user_id': ObjectId(user_id)}, PROGRESS_SORT, limit, request.args.get('cursor'),
+            projection
+        )
         
         return create_response(data={
-            'progress': serialize_doc(progress),
-            'count': len(progress)
+            'progress': progress,
+            'count': len(progress),
+            'next_cursor': next_cursor
         })
         
+    except (InvalidCursor, InvalidFields) as e:
+        return create_response(error=str(e), status=400)
+    except ValueError:
+        return create_response(error='limit must be an integer', status=400)
     except Exception as e:
         logger.error(f"❌ Progress retrieval error: {e}")
         return create_response(error='Progress retrieval failed', status=500)
@@ -1065,31 +1475,27 @@ def get_progress():
 @app.route('/api/progress', methods=['POST'])
 @jwt_required()
 def add_progress():
-    """Add progress entry"""
+    """Add progress entry; 409 if the user already has one with the same date"""
     try:
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        # Validate required fields
-        required_fields = ['date', 'weight', 'energy_level', 'mood', 'sleep_quality']
-        if not all(field in data for field in required_fields):
-            return create_response(error='Missing required progress fields', status=400)
-        
-        # Create progress entry
-        progress_data = {
-            'user_id': ObjectId(user_id),
-            'date': datetime.fromisoformat(data['date'].replace('Z', '+00:00')),
-            'weight': data['weight'],
-            'energy_level': data['energy_level'],
-            'mood': data['mood'],
-            'sleep_quality': data['sleep_quality'],
-            'water_intake': data.get('water_intake', 0),
-            'exercise_minutes': data.get('exercise_minutes', 0),
-            'notes': data.get('notes', ''),
-            'created_at': datetime.now(timezone.utc)
-        }
+        # Validate and build the entry (shared with the bulk import)
+        try:
+            progress_data = progress_import.build_entry(ObjectId(user_id), data or {})
+        except ValueError as e:
+            return create_response(error=str(e), status=400)
         
-        result = db.progress.insert_one(progress_data)
+        try:
+            result = db.progress.insert_one(progress_data)
+        except DuplicateKeyError:
+            return create_response(error='Entry for this date already exists', status=409)
+        resource_versions.bump('progress', user_id)
+        try:
+            progress_rollups.record_entries(db.progress_rollups, ObjectId(user_id), [progress_data])
+        except Exception as e:
+            # The entry is saved and the user is marked stale; the next analytics read rebuilds
+            logger.error(f"❌ Progress rollup update failed for user {user_id}: {e}")
         
         logger.info(f"✅ Progress entry added for user: {user_id}")
         return create_response(data={
@@ -1100,66 +1506,114 @@ def add_progress():
         logger.error(f"❌ Progress addition error: {e}")
         return create_response(error='Failed to record progress', status=500)
 
+@app.route('/api/progress/bulk', methods=['POST'])
+@jwt_required()
+def bulk_add_progress():
+    """Import many progress entries from a JSON array or NDJSON body"""
+    try:
+        user_id = ObjectId(get_jwt_identity())
+        if request.mimetype in progress_import.NDJSON_TYPES:
+            rows = progress_import.iter_ndjson(request.stream)
+        else:
+            rows = progress_import.iter_json_array(request.stream)
+        
+        summary = progress_import.ingest(db, user_id, rows)
+        if summary['inserted']:
+            resource_versions.bump('progress', user_id)
+        if not summary['received'] and summary['errors']:
+            return create_response(error=summary['errors'][0]['error'], status=400)
+        
+        logger.info(f"✅ Imported {summary['inserted']}/{summary['received']} progress entries for user: {user_id}")
+        return create_response(data=summary, message='Progress imported',
+                               status=200 if not summary['errors'] else 207)
+        
+    except Exception as e:
+        logger.error(f"❌ Bulk progress import error: {e}")
+        return create_response(error='Failed to import progress', status=500)
+
 @app.route('/api/progress/analytics', methods=['GET'])
 @jwt_required()
 def get_analytics():
-    """Get user analytics"""
+    """Get user analytics from pre-aggregated daily/weekly rollups.
+
+    ?trend=1 adds per-metric daily series with a 7-day rolling average and slope.
+    """
     try:
-        user_id = get_jwt_identity()
+        user_id = ObjectId(get_jwt_identity())
         days = min(int(request.args.get('days', 30)), 90)  # Max 90 days
+        include_trend = request.args.get('trend', '').lower() in ('1', 'true')
         
-        # Calculate analytics from progress data
-        pipeline = [
-            {
-                '$match': {
-                    'user_id': ObjectId(user_id),
-                    'date': {'$gte': datetime.now(timezone.utc) - timedelta(days=days)}
-                }
-            },
-            {
-                '$group': {
-                    '_id': None,
-                    'avg_weight': {'$avg': '$weight'},
-                    'avg_energy': {'$avg': '$energy_level'},
-                    'avg_mood': {'$avg': '$mood'},
-                    'avg_sleep': {'$avg': '$sleep_quality'},
-                    'avg_water': {'$avg': '$water_intake'},
-                    'avg_exercise': {'$avg': '$exercise_minutes'},
-                    'total_entries': {'$sum': 1}
-                }
-            }
-        ]
+        # Rebuilds from db.progress first if the user's rollups are missing or stale
+        gen = progress_rollups.current_generation(db, user_id)
+        buckets = progress_rollups.window_buckets(db.progress_rollups, user_id, gen, days)
         
-        result = list(db.progress.aggregate(pipeline))
-        analytics = result[0] if result else {}
+        data = {
+            'analytics': progress_rollups.summarize(buckets),
+            'period_days': days
+        }
+        if include_trend:
+            data['trends'] = progress_rollups.daily_trends(db.progress_rollups, user_id, gen, days)
+        
+        return create_response(data=data)
+        
+    except Exception as e:
+        logger.error(f"❌ Analytics error: {e}")
+        return create_response(error='Analytics retrieval failed', status=500)
+
+@app.route('/api/progress/insights', methods=['GET'])
+@jwt_required()
+def get_progress_insights():
+    """Rolling means, EWMA, weight slope and metric correlations for the user's progress"""
+    try:
+        user_id = ObjectId(get_jwt_identity())
+        days = min(int(request.args.get('days', 90)), progress_analytics.MAX_DAYS)
+        window = min(max(int(request.args.get('window', 7)), 1), 90)
+        alpha = float(request.args.get('alpha', 0.3))
+        if not 0 < alpha < 1:
+            return create_response(error='alpha must be between 0 and 1', status=400)
+        include_series = request.args.get('series', '1').lower() not in ('0', 'false')
+        
+        report = progress_analytics.user_report(
+            db.progress, user_id, days=days, window=window, alpha=alpha, include_series=include_series
+        )
         
         return create_response(data={
-            'analytics': serialize_doc(analytics),
+            'insights': report,
             'period_days': days
         })
         
+    except ValueError:
+        return create_response(error='days, window and alpha must be numbers', status=400)
     except Exception as e:
-        logger.error(f"❌ Analytics error: {e}")
-        return create_response(error='Analytics retrieval failed', status=500)
+        logger.error(f"❌ Progress insights error: {e}")
+        return create_response(error='Insights retrieval failed', status=500)
 
 # Notification Routes
 @app.route('/api/notifications', methods=['GET'])
 @jwt_required()
 def get_notifications():
-    """Get user notifications"""
+    """Get user notifications, newest first (?limit, ?cursor, ?fields)"""
     try:
         user_id = get_jwt_identity()
+        limit = parse_limit(request.args, 20, 100)
+        projection = parse_fields(request.args, NOTIFICATION_FIELDS, sort=NOTIFICATION_SORT)
         
         # Get notifications from database
-        notifications = list(db.notifications.find(
-            {'user_id': ObjectId(user_id)}
-        ).sort('created_at', -1).limit(20))
+        notifications, next_cursor = paginate(
+            db.notifications, {'user_id': ObjectId(user_id)}, NOTIFICATION_SORT, limit, request.args.get('cursor'),
+            projection
+        )
         
         return create_response(data={
-            'notifications': serialize_doc(notifications),
-            'count': len(notifications)
+            'notifications': notifications,
+            'count': len(notifications),
+            'next_cursor': next_cursor
         })
         
+    except (InvalidCursor, InvalidFields) as e:
+        return create_response(error=str(e), status=400)
+    except ValueError:
+        return create_response(error='limit must be an integer', status=400)
     except Exception as e:
         logger.error(f"❌ Notifications error: {e}")
         return create_response(error='Failed to get notifications', status=500)
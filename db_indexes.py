@@ -0,0 +1,234 @@
+"""Index provisioning for the MongoDB collections used by app.py.
+
+Every index matches a query shape that app.py actually runs; creating them
+is idempotent, so this runs in the background whenever a worker boots and
+can also be run by hand:
+
+    python db_indexes.py                    # create missing indexes
+    python db_indexes.py --check            # also exit 1 if a declared index is missing, or a hot
+                                            # query uses COLLSCAN or misses its index
+    python db_indexes.py --dedupe-progress  # one-off: keep the newest of duplicate (user_id, date)
+                                            # progress entries so progress_user_date_unique can build
+"""
+import logging
+import os
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from recipe_search import TEXT_INDEX_KEYS, TEXT_INDEX_NAME, TEXT_INDEX_WEIGHTS
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    'users': [
+        # login / register: find_one({'email'})
+        IndexModel([('email', ASCENDING)], name='users_email_unique', unique=True),
+    ],
+    'meal_plans': [
+        # get_meal_plans: find({'user_id'}) in (generated_at, _id) keyset order
+        IndexModel([('user_id', ASCENDING), ('generated_at', DESCENDING), ('_id', DESCENDING)],
+                   name='meal_plans_user_generated_id'),
+        # create_or_update_meal_plan: one saved plan per user and day. AI-generated
+        # plans carry no date, so they are left out of the uniqueness constraint.
+        IndexModel([('user_id', ASCENDING), ('date', ASCENDING)], name='meal_plans_user_date_unique',
+                   unique=True, partialFilterExpression={'date': {'$type': 'date'}}),
+    ],
+    'progress': [
+        # get_progress: (date, _id) keyset pages; analytics and imports: user_id + date range
+        IndexModel([('user_id', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)], name='progress_user_date_id'),
+        # add_progress / bulk import: one entry per user and timestamp (as the Node API upserts)
+        IndexModel([('user_id', ASCENDING), ('date', ASCENDING)], name='progress_user_date_unique', unique=True),
+    ],
+    'progress_rollups': [
+        # get_analytics: day/week buckets of the user's current generation over a date range;
+        # a rebuild writes the next generation next to the current one
+        IndexModel([('user_id', ASCENDING), ('gen', ASCENDING), ('granularity', ASCENDING),
+                    ('bucket_start', ASCENDING)], name='progress_rollups_gen_bucket_unique', unique=True),
+    ],
+    'progress_reports': [
+        # nightly progress_analytics batch: one report per user
+        IndexModel([('user_id', ASCENDING)], name='progress_reports_user_unique', unique=True),
+    ],
+    'notifications': [
+        # get_notifications: find({'user_id'}) in (created_at, _id) keyset order
+        IndexModel([('user_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='notifications_user_created_id'),
+    ],
+    'recipes': [
+        # get_recipes: ranked search
+        IndexModel(TEXT_INDEX_KEYS, name=TEXT_INDEX_NAME, weights=TEXT_INDEX_WEIGHTS, default_language='english'),
+        # get_recipes: meal_type / cooking_time filters
+        IndexModel([('meal_type', ASCENDING), ('cooking_time', ASCENDING)], name='recipes_meal_type_time'),
+    ],
+    'ai_jobs': [
+        # Finished and abandoned jobs are only interesting for a week
+        IndexModel([('created_at', ASCENDING)], name='ai_jobs_ttl', expireAfterSeconds=7 * 24 * 3600),
+    ],
+}
+
+
+# Superseded indexes that would conflict with the ones above
+RETIRED_INDEXES = {
+    # unique without gen: blocks a rebuild from writing the next rollup generation
+    'progress_rollups': ['progress_rollups_bucket_unique'],
+}
+
+
+def drop_retired_indexes(db):
+    for collection_name, names in RETIRED_INDEXES.items():
+        collection = db[collection_name]
+        existing = set(collection.index_information())
+        for name in names:
+            if name in existing:
+                collection.drop_index(name)
+                logger.info(f"✅ Dropped retired index {collection_name}.{name}")
+
+
+def ensure_indexes(db):
+    """Create every declared index; returns {collection: [error, ...]} for failures"""
+    failures = {}
+    try:
+        drop_retired_indexes(db)
+    except Exception as e:
+        logger.error(f"❌ Retired indexes could not be dropped: {e}")
+        failures.setdefault('retired', []).append(str(e))
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        for model in models:
+            try:
+                collection.create_indexes([model])
+            except Exception as e:
+                name = model.document.get('name')
+                logger.error(f"❌ Index {collection_name}.{name} could not be created: {e}")
+                failures.setdefault(collection_name, []).append(f"{name}: {e}")
+    if not failures:
+        logger.info("✅ MongoDB indexes provisioned")
+    return failures
+
+
+def missing_indexes(db):
+    """{collection: [index name, ...]} for declared indexes the database does not have"""
+    missing = {}
+    for collection_name, models in INDEXES.items():
+        existing = set(db[collection_name].index_information())
+        names = [model.document['name'] for model in models if model.document['name'] not in existing]
+        if names:
+            missing[collection_name] = names
+    return missing
+
+
+def dedupe_progress(db):
+    """Delete all but the newest entry per (user_id, date); returns the number removed.
+
+    Entries written before ``progress_user_date_unique`` existed may repeat a
+    timestamp, which stops the index from being built. The newest ``_id``
+    wins, as it would have with the Node API's upsert. Affected users get
+    their rollups rebuilt and their progress ETags invalidated.
+    """
+    import http_cache
+    import progress_rollups
+
+    versions = http_cache.ResourceVersions(db.resource_versions)
+    removed = 0
+    groups = db.progress.aggregate([
+        {'$sort': {'_id': -1}},
+        {'$group': {'_id': {'user_id': '$user_id', 'date': '$date'}, 'ids': {'$push': '$_id'}, 'n': {'$sum': 1}}},
+        {'$match': {'n': {'$gt': 1}}},
+    ], allowDiskUse=True)
+    users = set()
+    for group in groups:
+        removed += db.progress.delete_many({'_id': {'$in': group['ids'][1:]}}).deleted_count
+        users.add(group['_id']['user_id'])
+    for user_id in users:
+        progress_rollups.mark_stale(db.progress_rollups, user_id)
+        versions.bump('progress', str(user_id))
+    logger.info(f"✅ Removed {removed} duplicate progress entries for {len(users)} users")
+    return removed
+
+
+def hot_queries(db):
+    """(label, cursor, expected index name or None) mirroring the hottest queries in app.py"""
+    user_id = ObjectId()
+    return [
+        ('users by email', db.users.find({'email': 'probe@example.com'}).limit(1), 'users_email_unique'),
+        ('meal_plans by user', db.meal_plans.find({'user_id': user_id})
+            .sort([('generated_at', -1), ('_id', -1)]).limit(11), 'meal_plans_user_generated_id'),
+        # Same equality shape as the create_or_update_meal_plan upsert; a concrete datetime
+        # satisfies the partial filter, so the unique (user_id, date) index must win
+        ('meal_plans by user+date', db.meal_plans.find({'user_id': user_id, 'date': datetime(2024, 1, 1)})
+            .limit(1), 'meal_plans_user_date_unique'),
+        ('progress by user', db.progress.find({'user_id': user_id})
+            .sort([('date', -1), ('_id', -1)]).limit(91), 'progress_user_date_id'),
+        # progress_analytics batch: every user's recent entries
+        ('progress window, all users', db.progress.find({'date': {'$gte': datetime(2024, 1, 1)}})
+            .sort([('user_id', 1), ('date', -1)]), 'progress_user_date_id'),
+        ('progress_rollups by user', db.progress_rollups
+            .find({'user_id': user_id, 'gen': ObjectId(), 'granularity': 'day'})
+            .sort('bucket_start', 1).limit(90), 'progress_rollups_gen_bucket_unique'),
+        ('notifications by user', db.notifications.find({'user_id': user_id})
+            .sort([('created_at', -1), ('_id', -1)]).limit(21), 'notifications_user_created_id'),
+        ('recipes text search', db.recipes.find({'$text': {'$search': 'dal'}}).limit(20), TEXT_INDEX_NAME),
+    ]
+
+
+def _plan_values(plan, key):
+    """Collect every value of ``key`` ('stage', 'indexName') in an explain plan tree"""
+    values = []
+    if isinstance(plan, dict):
+        if key in plan:
+            values.append(plan[key])
+        for value in plan.values():
+            values.extend(_plan_values(value, key))
+    elif isinstance(plan, list):
+        for item in plan:
+            values.extend(_plan_values(item, key))
+    return values
+
+
+def check_query_plans(db):
+    """Explain each hot query; returns {label: problems} for plans that use COLLSCAN or miss their index"""
+    offenders = {}
+    for label, cursor, index in hot_queries(db):
+        try:
+            plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        except Exception as e:
+            offenders[label] = [f'explain failed: {e}']
+            continue
+        stages = _plan_values(plan, 'stage')
+        if 'COLLSCAN' in stages:
+            offenders[label] = stages
+        elif index and index not in _plan_values(plan, 'indexName'):
+            offenders[label] = stages + [f'expected index {index}']
+    return offenders
+
+
+def main(argv):
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    db = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017')).satvic_diet_planner
+
+    if '--dedupe-progress' in argv:
+        dedupe_progress(db)
+    failed = bool(ensure_indexes(db))
+    if '--check' in argv:
+        for collection_name, names in missing_indexes(db).items():
+            logger.error(f"❌ Missing indexes on {collection_name}: {', '.join(names)}")
+            failed = True
+        offenders = check_query_plans(db)
+        for label, stages in offenders.items():
+            logger.error(f"❌ {label}: {' -> '.join(stages)}")
+        if offenders:
+            failed = True
+        else:
+            logger.info("✅ All hot queries use an index")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
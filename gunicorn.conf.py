@@ -0,0 +1,24 @@
+"""Gunicorn settings. GUNICORN_THREADS also sizes each worker's MongoDB pool (see mongo_client.py)."""
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3000')}"
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Workers share metric snapshots here so /metrics covers all of them (see metrics.py)
+os.environ.setdefault('METRICS_DIR', '/tmp/satvic-metrics')
+
+
+def on_starting(server):
+    # Snapshots from a previous run would be summed into this one's
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def child_exit(server, worker):
+    # Otherwise a replaced worker's last snapshot is merged into every scrape forever
+    try:
+        os.remove(os.path.join(os.environ['METRICS_DIR'], f'{worker.pid}.json'))
+    except OSError:
+        pass
@@ -0,0 +1,178 @@
+"""Conditional GET and compressed JSON responses for the read-heavy API.
+
+Clients poll the recipe, meal plan and progress endpoints and used to get
+the full document list re-queried and re-sent every time. Now:
+
+- Every write to a collection bumps a version stamp in the
+  ``resource_versions`` collection, per user for ``meal_plans`` and
+  ``progress`` and globally for ``recipes``
+  (``{_id: 'meal_plans:<user_id>', v, updated_at}``). A GET under
+  ``@conditional(...)`` reads that one small document, derives a strong
+  ETag from it, the user and the full request path, and answers
+  ``If-None-Match`` with a ``304`` before running the view's query.
+  The stamp is read before the view's own query and bumped after each
+  write, so a race can only cost an extra ``200``, never a stale ``304``.
+- JSON responses of at least ``COMPRESS_MIN_BYTES`` are compressed with
+  brotli (when the ``brotli`` package is installed) or gzip, whichever the
+  client's ``Accept-Encoding`` prefers. They carry
+  ``Vary: Accept-Encoding`` and the encoding is appended to the ETag
+  (``"<tag>-gzip"``), so each representation has its own strong validator.
+
+Writes that bypass the API (imports, shell edits) should bump the stamp
+with ``ResourceVersions.bump`` or delete the ``resource_versions`` document.
+
+Configuration:
+
+- ``HTTP_ETAGS``: ``0`` disables conditional GET (default ``1``)
+- ``COMPRESS_MIN_BYTES``: smallest JSON body worth compressing (default
+  1024; ``0`` disables compression)
+- ``COMPRESS_LEVEL``: gzip level 1-9 (default 6); brotli uses quality 4
+"""
+import functools
+import gzip
+import hashlib
+import logging
+import os
+from datetime import datetime, timezone
+
+from flask import Response, request
+from flask_jwt_extended import get_jwt_identity
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when the JSON shape of a cached endpoint changes, so old ETags stop matching
+FORMAT_VERSION = '1'
+CACHE_CONTROL = 'private, no-cache'
+BROTLI_QUALITY = 4
+
+ETAGS_ENABLED = os.getenv('HTTP_ETAGS', '1') == '1'
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+
+
+class ResourceVersions:
+    """Version stamps for collections whose GET responses are validated by ETag"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def key(resource, user_id=None):
+        return f'{resource}:{user_id}' if user_id is not None else resource
+
+    def bump(self, resource, user_id=None):
+        """Record that ``resource`` (for ``user_id``) changed; never raises"""
+        try:
+            self.collection.update_one(
+                {'_id': self.key(resource, user_id)},
+                {'$inc': {'v': 1}, '$set': {'updated_at': datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+        except Exception as e:
+            # Clients keep a stale copy until the next bump; log it rather than fail the write
+            logger.error(f"❌ Version bump failed for {self.key(resource, user_id)}: {e}")
+
+    def current(self, resource, user_id=None):
+        """(version, updated_at) of ``resource``; (0, None) before its first write"""
+        doc = self.collection.find_one({'_id': self.key(resource, user_id)}, {'v': 1, 'updated_at': 1})
+        if not doc:
+            return 0, None
+        return doc.get('v', 0), doc.get('updated_at')
+
+    def conditional(self, resource, per_user=True):
+        """Decorator for a GET view (under @jwt_required) that honours If-None-Match"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not ETAGS_ENABLED:
+                    return view(*args, **kwargs)
+                user_id = get_jwt_identity() if per_user else None
+                try:
+                    version, updated_at = self.current(resource, user_id)
+                except Exception as e:
+                    logger.warning(f"Version lookup for {resource} failed, serving without ETag: {e}")
+                    return view(*args, **kwargs)
+
+                etag = make_etag(resource, version, updated_at, user_id, request.full_path)
+                matched = request_etags().get(etag)
+                if matched is not None:
+                    # Echo the client's tag so a compressed representation keeps its -gzip/-br suffix
+                    response = Response(status=304, mimetype='application/json')
+                    _set_validators(response, etag)
+                    response.headers['ETag'] = matched
+                    return response
+
+                result = view(*args, **kwargs)
+                response, status = result if isinstance(result, tuple) else (result, None)
+                if (status or response.status_code) == 200:
+                    _set_validators(response, etag)
+                return result
+            return wrapper
+        return decorator
+
+
+def make_etag(resource, version, updated_at, user_id, path):
+    """Opaque tag for one representation; ``updated_at`` tells a recreated stamp from the original"""
+    stamp = updated_at.isoformat() if updated_at is not None else '-'
+    raw = '\0'.join((FORMAT_VERSION, resource, str(version), stamp, str(user_id), path))
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def request_etags():
+    """{tag with W/ and our encoding suffix stripped: tag as sent} for If-None-Match"""
+    header = request.headers.get('If-None-Match', '')
+    tags = {}
+    for sent in header.split(','):
+        sent = sent.strip()
+        tag = sent[2:] if sent.startswith('W/') else sent
+        tag = tag.strip('"')
+        for suffix in ('-gzip', '-br'):
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)]
+        if tag:
+            tags[tag] = sent
+    return tags
+
+
+def _set_validators(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    # Representations differ per user
+    response.vary.add('Authorization')
+
+
+def _encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress_response(response):
+    """after_request hook: brotli/gzip for large JSON bodies"""
+    if (COMPRESS_MIN_BYTES <= 0 or response.mimetype != 'application/json'
+            or response.direct_passthrough or response.is_streamed):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+
+    encoding = request.accept_encodings.best_match(_encodings())
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak=weak)
+    return response
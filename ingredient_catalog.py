@@ -0,0 +1,295 @@
+"""Ingredient catalog: names, synonyms, units, categories and regional prices.
+
+The catalog is loaded once per worker from ``data/ingredients.csv`` (or a
+JSON file, or the ``ingredient_catalog`` MongoDB collection) into an
+immutable, indexed snapshot:
+
+- a dict from every normalized name and synonym to its entry (exact lookup)
+- the same keys sorted, for prefix lookup with ``bisect``
+- a trigram index that narrows fuzzy matching to a handful of candidates
+
+The source is checked for changes at most every ``reload_seconds``; a
+changed file (mtime/size) or collection (count/latest ``updated_at``) is
+reloaded by the next lookup and swapped in atomically while concurrent
+lookups keep using the previous snapshot. A source that fails to load also
+leaves the previous snapshot in place.
+
+Configuration:
+
+- ``INGREDIENT_CATALOG``: path to a .csv/.json file, or ``mongodb``
+  (default ``data/ingredients.csv`` next to this module)
+- ``INGREDIENT_REGION``: price column to use (``delhi``, ``mumbai``...;
+  default is the national ``price_inr``)
+- ``INGREDIENT_CATALOG_RELOAD_SECONDS``: change check interval (default 30)
+"""
+import bisect
+import csv
+import difflib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ingredients.csv')
+DIMENSIONS = {'g': 'mass', 'ml': 'volume', 'pcs': 'count'}
+DEFAULT_REGION = 'default'
+
+_WORD = re.compile(r'[a-z]+')
+
+
+def normalize(name):
+    """Lowercase words only: "Green Chillies (chopped)" -> "green chillies chopped" """
+    return ' '.join(_WORD.findall((name or '').lower()))
+
+
+def _singular(name):
+    if name.endswith('ies'):
+        yield name[:-3] + 'y'
+    if name.endswith('es'):
+        yield name[:-2]
+    if name.endswith('s'):
+        yield name[:-1]
+
+
+def _trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Ingredient:
+    """One catalog entry; prices are INR per pack of ``pack_size`` base units"""
+
+    __slots__ = ('name', 'synonyms', 'category', 'dimension', 'unit', 'pack_size', 'priority',
+                 'piece_weight_g', 'staple', 'prices')
+
+    def __init__(self, name, synonyms, category, unit, pack_size, priority, piece_weight_g, staple, prices):
+        if unit not in DIMENSIONS:
+            raise ValueError(f'{name}: unit must be one of {", ".join(DIMENSIONS)}')
+        if not prices.get(DEFAULT_REGION):
+            raise ValueError(f'{name}: price_inr is required')
+        self.name = name
+        self.synonyms = synonyms
+        self.category = category or 'other'
+        self.unit = unit
+        self.dimension = DIMENSIONS[unit]
+        self.pack_size = float(pack_size)
+        self.priority = priority or 'medium'
+        self.piece_weight_g = piece_weight_g
+        self.staple = staple
+        self.prices = prices
+
+    def price(self, region=None):
+        """Pack price for ``region``, falling back to the national price"""
+        return self.prices.get(region) or self.prices[DEFAULT_REGION]
+
+    def to_dict(self, region=None):
+        return {
+            'name': self.name,
+            'category': self.category,
+            'unit': self.unit,
+            'pack_size': self.pack_size,
+            'price_inr': self.price(region),
+            'priority': self.priority,
+        }
+
+
+def _number(value):
+    if value in (None, ''):
+        return None
+    return float(value)
+
+
+def _flag(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes')
+
+
+def _from_row(row):
+    """Ingredient from a CSV row / JSON object / Mongo document"""
+    synonyms = row.get('synonyms') or []
+    if isinstance(synonyms, str):
+        synonyms = [s for s in synonyms.split('|') if s.strip()]
+    prices = dict(row.get('prices') or {})
+    for key, value in row.items():
+        if key == 'price_inr':
+            prices[DEFAULT_REGION] = value
+        elif key.startswith('price_'):
+            prices[key[len('price_'):]] = value
+    prices = {region: _number(price) for region, price in prices.items() if _number(price)}
+    return Ingredient(
+        name=normalize(row['name']),
+        synonyms=[normalize(s) for s in synonyms],
+        category=(row.get('category') or '').strip().lower(),
+        unit=(row.get('unit') or 'pcs').strip().lower(),
+        pack_size=_number(row.get('pack_size')) or 1,
+        priority=(row.get('priority') or '').strip().lower(),
+        piece_weight_g=_number(row.get('piece_weight_g')),
+        staple=_flag(row.get('staple')),
+        prices=prices,
+    )
+
+
+class Catalog:
+    """Immutable indexed snapshot of the ingredient list"""
+
+    def __init__(self, ingredients, version=None):
+        self.ingredients = list(ingredients)
+        self.version = version
+        self._by_key = {}
+        for ingredient in self.ingredients:
+            for key in [ingredient.name] + ingredient.synonyms:
+                # The first entry to claim a name keeps it
+                self._by_key.setdefault(key, ingredient)
+        self._keys = sorted(self._by_key)
+        self._trigram_index = {}
+        for position, key in enumerate(self._keys):
+            for gram in _trigrams(key):
+                self._trigram_index.setdefault(gram, []).append(position)
+
+    def __len__(self):
+        return len(self.ingredients)
+
+    def get(self, name):
+        """Exact match on a name or synonym (also trying singular forms)"""
+        key = normalize(name)
+        ingredient = self._by_key.get(key)
+        if ingredient is None:
+            for candidate in _singular(key):
+                ingredient = self._by_key.get(candidate)
+                if ingredient is not None:
+                    break
+        return ingredient
+
+    def prefix(self, text, limit=10):
+        """Distinct ingredients with a name or synonym starting with ``text``, in key order"""
+        key = normalize(text)
+        if not key:
+            return []
+        results = []
+        start = bisect.bisect_left(self._keys, key)
+        for candidate in self._keys[start:]:
+            if not candidate.startswith(key) or len(results) >= limit:
+                break
+            ingredient = self._by_key[candidate]
+            if ingredient not in results:
+                results.append(ingredient)
+        return results
+
+    def fuzzy(self, text, cutoff=0.8):
+        """Closest ingredient by spelling, or None; only keys sharing trigrams are scored"""
+        key = normalize(text)
+        if not key:
+            return None
+        counts = {}
+        for gram in _trigrams(key):
+            for position in self._trigram_index.get(gram, ()):
+                counts[position] = counts.get(position, 0) + 1
+        candidates = [self._keys[p] for p, _ in sorted(counts.items(), key=lambda kv: -kv[1])[:20]]
+        best = difflib.get_close_matches(key, candidates, n=1, cutoff=cutoff)
+        return self._by_key[best[0]] if best else None
+
+    def match(self, name):
+        """Best effort: exact/synonym, then the longest known phrase inside the name, then fuzzy"""
+        ingredient = self.get(name)
+        if ingredient is not None:
+            return ingredient
+        words = normalize(name).split()
+        for size in range(min(len(words), 4), 0, -1):
+            for i in range(len(words) - size + 1):
+                ingredient = self.get(' '.join(words[i:i + size]))
+                if ingredient is not None:
+                    return ingredient
+        return self.fuzzy(name)
+
+    def staples(self):
+        return [ingredient for ingredient in self.ingredients if ingredient.staple]
+
+
+class FileSource:
+    def __init__(self, path):
+        self.path = path
+
+    def version(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        with open(self.path, newline='', encoding='utf-8') as fh:
+            if self.path.endswith('.json'):
+                rows = json.load(fh)
+            else:
+                rows = list(csv.DictReader(fh))
+        return [_from_row(row) for row in rows]
+
+
+class MongoSource:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def version(self):
+        latest = list(self.collection.find({}, {'updated_at': 1}).sort('updated_at', -1).limit(1))
+        return self.collection.estimated_document_count(), latest[0].get('updated_at') if latest else None
+
+    def load(self):
+        return [_from_row(doc) for doc in self.collection.find({}, {'_id': 0})]
+
+
+class CatalogLoader:
+    """Holds the current Catalog and swaps in a new one when the source changes"""
+
+    def __init__(self, source, reload_seconds=30):
+        self.source = source
+        self.reload_seconds = reload_seconds
+        self._catalog = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.last_error = None
+
+    def get(self):
+        """Current snapshot; loads on first use and reloads if the source changed"""
+        catalog = self._catalog
+        if catalog is not None and time.monotonic() - self._checked_at < self.reload_seconds:
+            return catalog
+        if not self._lock.acquire(blocking=catalog is None):
+            # Another thread is already checking; serve the current snapshot meanwhile
+            return catalog
+        try:
+            self._checked_at = time.monotonic()
+            version = self.source.version()
+            if self._catalog is None or version != self._catalog.version:
+                self._catalog = Catalog(self.source.load(), version)
+                self.reloads += 1
+                self.last_error = None
+                logger.info(f"✅ Ingredient catalog loaded ({len(self._catalog)} ingredients)")
+        except Exception as e:
+            self.last_error = str(e)[:200]
+            logger.error(f"❌ Ingredient catalog load failed: {e}")
+            if self._catalog is None:
+                self._catalog = Catalog([], None)
+        finally:
+            self._lock.release()
+        return self._catalog
+
+    def stats(self):
+        catalog = self._catalog
+        return {
+            'ingredients': len(catalog) if catalog is not None else 0,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+        }
+
+
+def build_catalog_loader(db=None):
+    """Loader configured from the environment"""
+    source = os.getenv('INGREDIENT_CATALOG', DEFAULT_PATH)
+    reload_seconds = float(os.getenv('INGREDIENT_CATALOG_RELOAD_SECONDS', 30))
+    if source.lower() == 'mongodb':
+        return CatalogLoader(MongoSource(db.ingredient_catalog), reload_seconds)
+    return CatalogLoader(FileSource(source), reload_seconds)
+
+
+REGION = os.getenv('INGREDIENT_REGION', '').strip().lower() or None
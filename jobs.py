@@ -0,0 +1,105 @@
+"""Background job queue for slow AI work.
+
+Jobs run on a bounded per-worker thread pool; their status lives in MongoDB
+so that any gunicorn worker can answer a poll, not just the one that ran it.
+A failed job stores a client-safe message (from ``describe_error``), never
+the exception text, which can carry upstream or database details; those go
+to the log.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+GENERIC_ERROR = 'Job failed'
+
+
+class JobQueueFull(Exception):
+    """Raised when the per-worker backlog limit has been reached"""
+
+
+class JobQueue:
+    def __init__(self, collection, max_workers=4, max_pending=32, timeout_seconds=600, describe_error=None):
+        self.collection = collection
+        self.describe_error = describe_error or (lambda error: GENERIC_ERROR)
+        self.max_pending = max_pending
+        self.timeout = timedelta(seconds=timeout_seconds)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-job')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, job_type, user_id, fn, *args):
+        """Queue ``fn(*args)``; its return value (a dict) becomes the job result"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f'{self._pending} jobs already pending')
+            self._pending += 1
+
+        try:
+            job_id = self.collection.insert_one({
+                'type': job_type,
+                'user_id': ObjectId(user_id),
+                'status': QUEUED,
+                'created_at': datetime.now(timezone.utc),
+            }).inserted_id
+            self._executor.submit(self._run, job_id, fn, args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return str(job_id)
+
+    def _run(self, job_id, fn, args):
+        try:
+            self.collection.update_one(
+                {'_id': job_id},
+                {'$set': {'status': RUNNING, 'started_at': datetime.now(timezone.utc)}}
+            )
+            result = fn(*args)
+            self.collection.update_one(
+                {'_id': job_id},
+                {'$set': {'status': SUCCEEDED, 'result': result, 'finished_at': datetime.now(timezone.utc)}}
+            )
+        except Exception as e:
+            logger.error(f"❌ Job {job_id} failed: {e}")
+            try:
+                self.collection.update_one(
+                    {'_id': job_id},
+                    {'$set': {'status': FAILED, 'error': self._public_error(e),
+                              'finished_at': datetime.now(timezone.utc)}}
+                )
+            except Exception as db_error:
+                logger.error(f"❌ Could not record failure of job {job_id}: {db_error}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _public_error(self, error):
+        try:
+            return self.describe_error(error)
+        except Exception:
+            return GENERIC_ERROR
+
+    def get(self, job_id, user_id):
+        """Fetch a job owned by ``user_id``; unfinished jobs past the timeout report as failed"""
+        job = self.collection.find_one({'_id': ObjectId(job_id), 'user_id': ObjectId(user_id)})
+        if job and job['status'] in (QUEUED, RUNNING):
+            created_at = job['created_at']
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            if datetime.now(timezone.utc) - created_at > self.timeout:
+                job['status'] = FAILED
+                job['error'] = 'Job timed out'
+        return job
+
+    def stats(self):
+        return {'pending': self._pending, 'max_pending': self.max_pending}
@@ -0,0 +1,135 @@
+"""JSON encoding for API responses that may contain raw MongoDB documents.
+
+Produces the same output as ``json.dumps(serialize_doc(...))`` (``_id``
+renamed to ``id``, ObjectIds as strings, datetimes in ISO format) in a
+single Python pass:
+
+- with orjson installed, ObjectId/datetime are handled by orjson while it
+  writes, and the Python pass only renames ``_id`` keys, copying just the
+  dicts that contain one;
+- otherwise a type-dispatched converter (no per-value ``isinstance``
+  chains) feeds the stdlib C encoder.
+"""
+import json
+from datetime import date, datetime
+
+from bson import ObjectId
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_CONTAINERS = (dict, list, tuple)
+_SCALARS = frozenset((str, int, float, bool, type(None)))
+
+
+def _convert_dict(doc):
+    out = {}
+    for key, value in doc.items():
+        t = type(value)
+        if t not in _SCALARS:
+            value = _convert(value, t)
+        if key == '_id':
+            out['id'] = str(value)
+        else:
+            out[key] = value
+    return out
+
+
+def _convert_list(items):
+    out = []
+    append = out.append
+    for value in items:
+        t = type(value)
+        append(value if t in _SCALARS else _convert(value, t))
+    return out
+
+
+_DISPATCH = {
+    dict: _convert_dict,
+    list: _convert_list,
+    tuple: _convert_list,
+    ObjectId: str,
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+}
+
+
+def _convert(value, t):
+    convert = _DISPATCH.get(t)
+    if convert is not None:
+        return convert(value)
+    # Subclasses (SON, OrderedDict, ...) are rare enough to pay for isinstance
+    if isinstance(value, dict):
+        return _convert_dict(value)
+    if isinstance(value, (list, tuple)):
+        return _convert_list(value)
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def to_jsonable(obj):
+    """Convert Mongo documents (or lists of them) into plain JSON-compatible values"""
+    t = type(obj)
+    return obj if t in _SCALARS else _convert(obj, t)
+
+
+def rename_ids(obj):
+    """Return ``obj`` with every ``_id`` key renamed to ``id``; untouched containers are shared"""
+    t = type(obj)
+    if t is dict:
+        if '_id' in obj:
+            out = {'id': str(obj['_id'])}
+            out.update(obj)
+            del out['_id']
+            for key, value in out.items():
+                if type(value) in _CONTAINERS:
+                    new_value = rename_ids(value)
+                    if new_value is not value:
+                        out[key] = new_value
+            return out
+        changed = None
+        for key, value in obj.items():
+            if type(value) in _CONTAINERS:
+                new_value = rename_ids(value)
+                if new_value is not value:
+                    if changed is None:
+                        changed = dict(obj)
+                    changed[key] = new_value
+        return obj if changed is None else changed
+    if t is list or t is tuple:
+        changed = None
+        for index, value in enumerate(obj):
+            if type(value) in _CONTAINERS:
+                new_value = rename_ids(value)
+                if new_value is not value:
+                    if changed is None:
+                        changed = list(obj)
+                    changed[index] = new_value
+        return obj if changed is None else changed
+    return obj
+
+
+def _orjson_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    BACKEND = 'orjson'
+
+    def dumps(obj) -> bytes:
+        """Encode a response payload (raw Mongo documents allowed) to JSON bytes"""
+        return orjson.dumps(rename_ids(obj), default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    BACKEND = 'json'
+    _encoder = json.JSONEncoder(separators=(',', ':'))
+
+    def dumps(obj) -> bytes:
+        """Encode a response payload (raw Mongo documents allowed) to JSON bytes"""
+        return _encoder.encode(to_jsonable(obj)).encode('utf-8')
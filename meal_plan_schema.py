@@ -0,0 +1,425 @@
+"""Structured meal plans: days -> meals -> ingredients and nutrients.
+
+Gemini is asked for JSON in the shape below. The reply is validated and
+normalized once, when the plan is saved, and stored as ``plan`` on the
+meal plan document, so shopping lists, analytics and search read fields
+instead of parsing text again:
+
+    {
+      "schema_version": 1,
+      "period": "week",
+      "focus": "balanced",
+      "days": [
+        {
+          "day": 1,
+          "date": datetime | None,
+          "meals": [
+            {
+              "slot": "breakfast",
+              "name": "Fruit Bowl",
+              "description": "...",
+              "recipe_id": ObjectId | None,
+              "ingredients": [{"name": "banana", "quantity": 2.0, "unit": "pcs"}],
+              "nutrients": {"calories": 320.0, "protein_g": 6.0}
+            }
+          ],
+          "totals": {"calories": 1850.0, ...}
+        }
+      ],
+      "totals": {"calories": 12950.0, ...}
+    }
+
+The validator is hand-written rather than a generic JSON Schema engine: one
+pass over the document, no extra dependency, and it coerces the small
+inconsistencies LLM output always has ("2 cups" quantities, "Breakfast"
+slots, numbers as strings) instead of rejecting the plan.
+
+A week of meals with ingredients and nutrients is about as much as fits in
+one reply (gemini-1.5-flash stops at 8192 output tokens), so longer periods
+are requested as a weekly rotation and repeated to the full period with
+``repeat_days``.
+"""
+import copy
+import html
+import json
+import re
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+SCHEMA_VERSION = 1
+
+SLOTS = ('breakfast', 'lunch', 'dinner', 'snack')
+SLOT_ALIASES = {'snacks': 'snack', 'morning snack': 'snack', 'evening snack': 'snack', 'supper': 'dinner'}
+NUTRIENTS = ('calories', 'protein_g', 'carbs_g', 'fat_g', 'fiber_g')
+
+# Spelling variants only; conversions between units belong to the shopping list
+UNIT_ALIASES = {
+    'gram': 'g', 'grams': 'g', 'gm': 'g', 'gms': 'g', 'gr': 'g',
+    'kilogram': 'kg', 'kilograms': 'kg', 'kgs': 'kg',
+    'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml',
+    'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l', 'ltr': 'l',
+    'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'tbs': 'tbsp',
+    'teaspoon': 'tsp', 'teaspoons': 'tsp',
+    'cups': 'cup',
+    'piece': 'pcs', 'pieces': 'pcs', 'pc': 'pcs', 'nos': 'pcs', 'no': 'pcs', 'whole': 'pcs',
+    'bunches': 'bunch', 'pinches': 'pinch',
+}
+
+PERIOD_DAYS = {'day': 1, 'daily': 1, 'week': 7, 'weekly': 7, 'month': 28, 'monthly': 28}
+
+MAX_DAYS = 31
+MAX_GENERATED_DAYS = 7
+MAX_MEALS_PER_DAY = 8
+MAX_INGREDIENTS_PER_MEAL = 40
+MAX_NAME_LENGTH = 200
+MAX_TEXT_LENGTH = 1000
+
+_QUANTITY = re.compile(r'^\s*(\d+(?:\.\d+)?)(?:\s*/\s*(\d+(?:\.\d+)?))?\s*([a-zA-Z ]*)\s*$')
+
+
+class PlanValidationError(ValueError):
+    """The plan can't be normalized; ``path`` points at the offending value"""
+
+    def __init__(self, path, message):
+        super().__init__(f'{path}: {message}' if path else message)
+        self.path = path
+
+
+def period_days(period):
+    return PERIOD_DAYS.get(str(period).lower(), 7)
+
+
+def generated_days(period):
+    """Days to ask Gemini for: the whole period, or a weekly rotation for longer ones"""
+    return min(period_days(period), MAX_GENERATED_DAYS)
+
+
+def prompt_schema(period):
+    """JSON instructions appended to the meal plan prompt"""
+    days = generated_days(period)
+    rotation = ''
+    if days < period_days(period):
+        rotation = (f"These {days} days are a rotation that will be repeated to cover the whole {period}, "
+                    "so vary the meals across them. ")
+    return (
+        "Return ONLY valid JSON (no markdown) using this exact schema:\n"
+        "{\n"
+        f'  "period": "{period}",\n'
+        '  "days": [\n'
+        '    {"day": 1, "meals": [\n'
+        '      {"slot": "breakfast|lunch|dinner|snack", "name": "...", "description": "one short sentence",\n'
+        '       "ingredients": [{"name": "...", "quantity": 100, "unit": "g|kg|ml|l|pcs|tbsp|tsp|cup"}],\n'
+        '       "nutrients": {"calories": 0, "protein_g": 0, "carbs_g": 0, "fat_g": 0, "fiber_g": 0}}\n'
+        '    ]}\n'
+        '  ]\n'
+        "}\n"
+        f"Include {days} day(s), each with breakfast, lunch, dinner and 2 snacks. "
+        + rotation +
+        "Quantities are numbers for one serving."
+    )
+
+
+def parse_json(text):
+    """json.loads that tolerates markdown code fences around the object"""
+    text = (text or '').strip()
+    if text.startswith('```'):
+        text = re.sub(r'^```[a-zA-Z0-9]*\s*', '', text)
+        text = re.sub(r'\s*```$', '', text)
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise PlanValidationError('', f'not valid JSON ({e})')
+
+
+def _text(value, path, limit, required=False):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise PlanValidationError(path, 'required')
+        return ''
+    if not isinstance(value, (str, int, float)):
+        raise PlanValidationError(path, 'must be a string')
+    return str(value).strip()[:limit]
+
+
+def _number(value):
+    """Non-negative float from a number or numeric string, else None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        match = re.match(r'^\s*(\d+(?:\.\d+)?)', value)
+        if not match:
+            return None
+        number = float(match.group(1))
+    else:
+        return None
+    return number if number >= 0 and number == number and number != float('inf') else None
+
+
+def normalize_unit(unit):
+    if not isinstance(unit, str) or not unit.strip():
+        return None
+    unit = unit.strip().lower().rstrip('.')
+    return UNIT_ALIASES.get(unit, unit)
+
+
+def _quantity(quantity, unit):
+    """(quantity, unit) allowing a combined string such as "1/2 cup" or "200g" """
+    if isinstance(quantity, str):
+        match = _QUANTITY.match(quantity)
+        if match:
+            number = float(match.group(1))
+            if match.group(2):
+                number /= float(match.group(2)) or 1.0
+            return number, normalize_unit(unit) or normalize_unit(match.group(3))
+        return None, normalize_unit(unit)
+    return _number(quantity), normalize_unit(unit)
+
+
+def _ingredient(raw, path):
+    if isinstance(raw, str) and raw.strip():
+        return ingredient_from_text(raw)
+    if not isinstance(raw, dict):
+        raise PlanValidationError(path, 'must be an object')
+    quantity, unit = _quantity(raw.get('quantity'), raw.get('unit'))
+    return {
+        'name': _text(raw.get('name'), f'{path}.name', MAX_NAME_LENGTH, required=True).lower(),
+        'quantity': quantity,
+        'unit': unit,
+    }
+
+
+def _nutrients(raw):
+    if not isinstance(raw, dict):
+        return {}
+    nutrients = {}
+    for key in NUTRIENTS:
+        value = _number(raw.get(key, raw.get(key[:-2]) if key.endswith('_g') else None))
+        if value is not None:
+            nutrients[key] = round(value, 1)
+    return nutrients
+
+
+def _slot(value, path):
+    slot = _text(value, path, 40, required=True).lower()
+    slot = SLOT_ALIASES.get(slot, slot)
+    if slot not in SLOTS:
+        raise PlanValidationError(path, f"must be one of {', '.join(SLOTS)}")
+    return slot
+
+
+def _recipe_id(value):
+    if isinstance(value, ObjectId):
+        return value
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return None
+
+
+def _meal(raw, path):
+    if not isinstance(raw, dict):
+        raise PlanValidationError(path, 'must be an object')
+    ingredients = raw.get('ingredients') or []
+    if not isinstance(ingredients, list):
+        raise PlanValidationError(f'{path}.ingredients', 'must be an array')
+    return {
+        'slot': _slot(raw.get('slot') or raw.get('meal'), f'{path}.slot'),
+        'name': _text(raw.get('name'), f'{path}.name', MAX_NAME_LENGTH, required=True),
+        'description': _text(raw.get('description'), f'{path}.description', MAX_TEXT_LENGTH),
+        'recipe_id': _recipe_id(raw.get('recipe_id')),
+        'ingredients': [
+            _ingredient(item, f'{path}.ingredients[{i}]')
+            for i, item in enumerate(ingredients[:MAX_INGREDIENTS_PER_MEAL])
+            if not (isinstance(item, str) and not item.strip())
+        ],
+        'nutrients': _nutrients(raw.get('nutrients')),
+    }
+
+
+def _legacy_meals(raw):
+    """Meals from the {"breakfast": {...}, "lunch": {...}} day shape"""
+    meals = []
+    for key in ('breakfast', 'lunch', 'dinner', 'snack', 'snacks'):
+        value = raw.get(key)
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, dict):
+                meals.append(dict(item, slot=key))
+            elif isinstance(item, str) and item.strip():
+                meals.append({'slot': key, 'name': item})
+    return meals
+
+
+def saved_day_meals(doc):
+    """Normalized meals of a manually saved day ({"breakfast": ..., ...}); unusable meals are skipped"""
+    meals = []
+    for i, raw in enumerate(_legacy_meals(doc)):
+        try:
+            meals.append(_meal(raw, f'meals[{i}]'))
+        except PlanValidationError:
+            continue
+    return meals
+
+
+KNOWN_UNITS = frozenset(UNIT_ALIASES) | frozenset(UNIT_ALIASES.values())
+_INGREDIENT_TEXT = re.compile(r'^\s*(\d+(?:\.\d+)?(?:\s*/\s*\d+(?:\.\d+)?)?)\s*([a-zA-Z]+\.?)?\s+(.+)$')
+
+
+def ingredient_from_text(text):
+    """Ingredient from free text such as "200 g paneer" or "2 bananas"; quantity is None when absent"""
+    text = (text or '').strip()
+    match = _INGREDIENT_TEXT.match(text)
+    if match:
+        quantity, _ = _quantity(match.group(1), None)
+        unit, name = match.group(2), match.group(3)
+        if unit and normalize_unit(unit) not in KNOWN_UNITS:
+            name, unit = f'{unit} {name}', None
+        return {'name': name.strip().lower()[:MAX_NAME_LENGTH], 'quantity': quantity,
+                'unit': normalize_unit(unit) or ('pcs' if quantity is not None else None)}
+    return {'name': text.lower()[:MAX_NAME_LENGTH], 'quantity': None, 'unit': None}
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return None
+
+
+def _add(totals, nutrients):
+    for key, value in nutrients.items():
+        totals[key] = round(totals.get(key, 0.0) + value, 1)
+
+
+def _day(raw, index, path):
+    if not isinstance(raw, dict):
+        raise PlanValidationError(path, 'must be an object')
+    meals = raw.get('meals')
+    if meals is None:
+        meals = _legacy_meals(raw)
+    if not isinstance(meals, list) or not meals:
+        raise PlanValidationError(f'{path}.meals', 'must be a non-empty array')
+    meals = [_meal(meal, f'{path}.meals[{i}]') for i, meal in enumerate(meals[:MAX_MEALS_PER_DAY])]
+    totals = {}
+    for meal in meals:
+        _add(totals, meal['nutrients'])
+    day = raw.get('day')
+    return {
+        'day': int(day) if isinstance(day, (int, float)) and not isinstance(day, bool) and day > 0 else index + 1,
+        'date': _date(raw.get('date')),
+        'meals': meals,
+        'totals': totals,
+    }
+
+
+def validate_plan(data, period=None, focus=None):
+    """Normalize a parsed plan (dict) into the stored shape; raises PlanValidationError"""
+    if not isinstance(data, dict):
+        raise PlanValidationError('', 'plan must be a JSON object')
+    days = data.get('days')
+    if not isinstance(days, list) or not days:
+        raise PlanValidationError('days', 'must be a non-empty array')
+    if len(days) > MAX_DAYS:
+        raise PlanValidationError('days', f'at most {MAX_DAYS} days')
+    days = [_day(day, i, f'days[{i}]') for i, day in enumerate(days)]
+    totals = {}
+    for day in days:
+        _add(totals, day['totals'])
+    return {
+        'schema_version': SCHEMA_VERSION,
+        'period': _text(period or data.get('period'), 'period', 40) or 'week',
+        'focus': _text(focus or data.get('focus'), 'focus', 100) or 'balanced',
+        'days': days,
+        'totals': totals,
+    }
+
+
+def parse_plan(text, period=None, focus=None):
+    """Parse Gemini's JSON reply and normalize it; raises PlanValidationError"""
+    return validate_plan(parse_json(text), period, focus)
+
+
+def repeat_days(plan, days):
+    """Extend a validated plan to ``days`` days by cycling through the days it has"""
+    template = plan['days']
+    if len(template) >= days:
+        return plan
+    extended = list(template)
+    for number in range(len(template) + 1, days + 1):
+        day = copy.deepcopy(template[(number - 1) % len(template)])
+        day['day'] = number
+        # Dated from day 1 by assign_dates
+        day['date'] = None
+        extended.append(day)
+    totals = {}
+    for day in extended:
+        _add(totals, day['totals'])
+    plan['days'] = extended
+    plan['totals'] = totals
+    return plan
+
+
+def assign_dates(plan, start):
+    """Date days that came back without one consecutively from ``start`` (day 1)"""
+    for day in plan['days']:
+        if day['date'] is None:
+            day['date'] = start + timedelta(days=day['day'] - 1)
+    return plan
+
+
+def link_recipes(plan, collection):
+    """Fill in recipe_id for meals whose name matches a stored recipe (one query)"""
+    names = {meal['name'] for day in plan['days'] for meal in day['meals'] if meal['recipe_id'] is None}
+    if not names:
+        return plan
+    ids = {doc['name']: doc['_id'] for doc in collection.find({'name': {'$in': list(names)}}, {'name': 1})}
+    for day in plan['days']:
+        for meal in day['meals']:
+            if meal['recipe_id'] is None:
+                meal['recipe_id'] = ids.get(meal['name'])
+    return plan
+
+
+def ingredient_names(plan):
+    """Distinct ingredient names in a plan, sorted (stored for querying)"""
+    return sorted({item['name'] for day in plan['days'] for meal in day['meals'] for item in meal['ingredients']})
+
+
+def render_html(plan):
+    """Readable HTML for clients that still display the plan as ``content``"""
+    parts = []
+    for day in plan['days']:
+        title = f"Day {day['day']}"
+        if day['date']:
+            title += f" ({day['date'].date().isoformat()})"
+        parts.append(f'<h3>{html.escape(title)}</h3><ul>')
+        for meal in day['meals']:
+            line = f"<strong>{meal['slot'].title()}:</strong> {html.escape(meal['name'])}"
+            if meal['description']:
+                line += f" - {html.escape(meal['description'])}"
+            calories = meal['nutrients'].get('calories')
+            if calories is not None:
+                line += f' <em>({calories:g} kcal)</em>'
+            parts.append(f'<li>{line}</li>')
+        parts.append('</ul>')
+    return ''.join(parts)
+
+
+def to_legacy(plan):
+    """The {"period", "days": [{"date", "breakfast": {...}, ...}]} shape the frontend expects"""
+    days = []
+    for day in plan['days']:
+        legacy = {'date': day['date'].date().isoformat() if day['date'] else None}
+        for meal in day['meals']:
+            entry = {'name': meal['name'], 'description': meal['description']}
+            if meal['slot'] == 'snack':
+                legacy.setdefault('snacks', []).append(entry)
+            else:
+                legacy.setdefault(meal['slot'], entry)
+        days.append(legacy)
+    return {'period': plan['period'], 'days': days}
@@ -0,0 +1,310 @@
+"""In-process metrics rendered in the Prometheus text format at /metrics.
+
+Three sources feed it:
+
+- Flask before/after hooks: request duration per method, route rule and
+  status (``http_request_duration_seconds``)
+- a pymongo CommandListener: command latency per command and collection
+  (``mongodb_command_duration_seconds``), plus connection checkout waits
+  reported by mongo_client.PoolMetrics
+- the Gemini client: latency per endpoint and outcome, and prompt/response
+  size in characters (and tokens when the SDK reports usage)
+
+Gunicorn runs several workers and a scrape reaches only one of them. With
+``METRICS_DIR`` set (gunicorn.conf.py does this), every worker writes a
+snapshot of its metrics there every ``METRICS_FLUSH_SECONDS`` and the
+worker answering the scrape sums the counters and histograms of all of
+them. Gauges stay per worker with a ``worker`` label. A worker's snapshot
+is removed when it exits (gunicorn.conf.py's ``child_exit``). Without
+``METRICS_DIR``, /metrics shows the answering process only.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+GEMINI_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=HTTP_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            return [[list(labels), list(state)] for labels, state in self._values.items()]
+
+
+class Gauge:
+    """Sampled when metrics are collected: ``fn()`` returns {label values tuple: value}"""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def samples(self):
+        try:
+            values = self.fn() if self.fn else {}
+        except Exception as e:
+            logger.warning(f"Gauge {self.name} failed: {e}")
+            values = {}
+        return [[list(labels), value] for labels, value in values.items() if value is not None]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._flusher_pid = None
+        self._flusher_lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        return {
+            metric.name: {
+                'type': metric.type,
+                'help': metric.documentation,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'samples': metric.samples(),
+            }
+            for metric in self._metrics
+        }
+
+    # Cross-worker aggregation
+    def _snapshot_path(self, pid=None):
+        return os.path.join(METRICS_DIR, f'{pid or os.getpid()}.json')
+
+    def write_snapshot(self):
+        path = self._snapshot_path()
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self.snapshot(), fh, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    def start_flusher(self):
+        """Write this worker's snapshot every FLUSH_SECONDS (once per process; no-op without METRICS_DIR)"""
+        if not METRICS_DIR or self._flusher_pid == os.getpid():
+            return
+        with self._flusher_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                logger.warning(f"Metrics snapshot not written: {e}")
+
+    def collect(self):
+        """[(pid, snapshot)] for every worker (just this process without METRICS_DIR)"""
+        if not METRICS_DIR:
+            return [(os.getpid(), self.snapshot())]
+        self.write_snapshot()
+        snapshots = []
+        for name in os.listdir(METRICS_DIR):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(METRICS_DIR, name)) as fh:
+                    snapshots.append((int(name[:-5]), json.load(fh)))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Prometheus text exposition of all workers' metrics"""
+        merged = {}
+        for pid, snapshot in self.collect():
+            for name, metric in snapshot.items():
+                entry = merged.setdefault(name, dict(metric, samples={}))
+                for labels, value in metric['samples']:
+                    key = tuple(labels)
+                    if metric['type'] == 'gauge':
+                        entry['samples'][key + (str(pid),)] = value
+                    elif metric['type'] == 'histogram':
+                        total = entry['samples'].get(key)
+                        entry['samples'][key] = [a + b for a, b in zip(total, value)] if total else list(value)
+                    else:
+                        entry['samples'][key] = entry['samples'].get(key, 0) + value
+
+        lines = []
+        for name, metric in merged.items():
+            lines.append(f'# HELP {name} {metric["help"]}')
+            lines.append(f'# TYPE {name} {metric["type"]}')
+            names = metric['labelnames']
+            for key, value in sorted(metric['samples'].items()):
+                if metric['type'] == 'gauge':
+                    lines.append(f'{name}{_labels(names + ["worker"], key)} {_number(value)}')
+                elif metric['type'] == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(metric['buckets'], value[:-2]):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_labels(names, key, [("le", _number(bound))])} {cumulative}')
+                    lines.append(f'{name}_bucket{_labels(names, key, [("le", "+Inf")])} {value[-1]}')
+                    lines.append(f'{name}_sum{_labels(names, key)} {_number(value[-2])}')
+                    lines.append(f'{name}_count{_labels(names, key)} {value[-1]}')
+                else:
+                    lines.append(f'{name}{_labels(names, key)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'Flask request duration until the response is returned',
+    ('method', 'route', 'status'), HTTP_BUCKETS))
+mongo_command_duration = registry.register(Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command round-trip time',
+    ('command', 'collection'), MONGO_BUCKETS))
+mongo_command_failures = registry.register(Counter(
+    'mongodb_command_failures_total', 'MongoDB commands that returned an error', ('command', 'collection')))
+mongo_pool_wait = registry.register(Histogram(
+    'mongodb_pool_checkout_wait_seconds', 'Time a thread waited for a pooled MongoDB connection',
+    ('outcome',), MONGO_BUCKETS))
+gemini_duration = registry.register(Histogram(
+    'gemini_request_duration_seconds', 'Gemini generate_content latency (time to first chunk when streaming)',
+    ('endpoint', 'outcome'), GEMINI_BUCKETS))
+gemini_prompt_chars = registry.register(Counter(
+    'gemini_prompt_chars_total', 'Characters sent to Gemini', ('endpoint',)))
+gemini_response_chars = registry.register(Counter(
+    'gemini_response_chars_total', 'Characters received from Gemini', ('endpoint',)))
+gemini_prompt_tokens = registry.register(Counter(
+    'gemini_prompt_tokens_total', 'Prompt tokens reported by Gemini', ('endpoint',)))
+gemini_response_tokens = registry.register(Counter(
+    'gemini_response_tokens_total', 'Response tokens reported by Gemini', ('endpoint',)))
+
+
+def observe_request(method, route, status, seconds):
+    http_request_duration.observe((method, route, str(status)), seconds)
+
+
+def observe_pool_wait(seconds, failed=False):
+    """mongo_client.PoolMetrics observer"""
+    mongo_pool_wait.observe(('failed' if failed else 'ok',), seconds)
+
+
+def observe_gemini(endpoint, prompt, response, seconds, error=None, stream=False):
+    """GeminiClient observer: one call's latency and sizes"""
+    endpoint = endpoint or 'default'
+    gemini_duration.observe((endpoint, 'error' if error is not None else 'ok'), seconds)
+    gemini_prompt_chars.inc((endpoint,), len(prompt) if isinstance(prompt, str) else 0)
+    if response is None:
+        return
+    if not stream:
+        try:
+            gemini_response_chars.inc((endpoint,), len(response.text or ''))
+        except Exception:
+            # Blocked/empty candidates raise on .text
+            pass
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        gemini_prompt_tokens.inc((endpoint,), getattr(usage, 'prompt_token_count', 0) or 0)
+        gemini_response_tokens.inc((endpoint,), getattr(usage, 'candidates_token_count', 0) or 0)
+
+
+def observe_stream_text(endpoint, text):
+    """Characters of a streamed Gemini reply, counted once it has finished"""
+    gemini_response_chars.inc((endpoint or 'default',), len(text))
+
+
+def add_gauge(name, documentation, labelnames, fn):
+    return registry.register(Gauge(name, documentation, labelnames, fn))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command per collection"""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            target = event.command.get('collection')
+        self._pending[(event.connection_id, event.request_id)] = target if isinstance(target, str) else '-'
+
+    def _finish(self, event):
+        return self._pending.pop((event.connection_id, event.request_id), '-')
+
+    def succeeded(self, event):
+        collection = self._finish(event)
+        mongo_command_duration.observe((event.command_name, collection), event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        mongo_command_duration.observe((event.command_name, collection), event.duration_micros / 1e6)
+        mongo_command_failures.inc((event.command_name, collection))
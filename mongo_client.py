@@ -0,0 +1,269 @@
+"""MongoDB client lifecycle: one lazily created, tuned MongoClient per process.
+
+A MongoClient must not be shared across fork, so nothing connects at
+import: ``db`` is a proxy and the client is created by the first query
+in each gunicorn worker (re-created if the process has forked since).
+Collections accessed at import time, like ``db.ai_jobs`` handed to the
+job queue, are proxies too and resolve to the current process's client.
+
+The pool is sized to the threads that can query at once (gthread threads
+plus background job workers) rather than pymongo's default of 100, with
+explicit timeouts so a slow or unreachable server surfaces as an error
+instead of a hung request thread. Wire compression uses zstd or snappy
+when their packages are installed. A pool listener records how long
+threads wait to check out a connection, which shows when the pool, not
+the database, is the bottleneck.
+
+Configuration:
+
+- ``MONGODB_URI`` / ``MONGODB_DB`` (default ``satvic_diet_planner``)
+- ``MONGO_MAX_POOL_SIZE``: default ``GUNICORN_THREADS + AI_JOB_WORKERS + 2``
+- ``MONGO_MIN_POOL_SIZE`` (default 0), ``MONGO_MAX_IDLE_SECONDS`` (default 300)
+- ``MONGO_SERVER_SELECTION_TIMEOUT_MS`` (5000), ``MONGO_CONNECT_TIMEOUT_MS``
+  (5000), ``MONGO_SOCKET_TIMEOUT_MS`` (30000), ``MONGO_WAIT_QUEUE_TIMEOUT_MS``
+  (5000: how long a thread waits for a pooled connection)
+- ``MONGO_COMPRESSORS``: e.g. ``zstd,snappy,zlib``, or ``none``; default is
+  whichever of zstd/snappy is importable
+"""
+import importlib.util
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from pymongo import MongoClient, monitoring
+from pymongo.database import Database
+
+logger = logging.getLogger(__name__)
+
+# compressor name -> module pymongo needs for it
+COMPRESSOR_MODULES = {'zstd': 'zstandard', 'snappy': 'snappy'}
+
+
+def available_compressors():
+    """zstd/snappy, in preference order, for whichever packages are installed"""
+    return [name for name, module in COMPRESSOR_MODULES.items() if importlib.util.find_spec(module)]
+
+
+def default_pool_size():
+    """Threads that may query concurrently: request threads, AI job workers and a couple of helpers"""
+    return int(os.getenv('GUNICORN_THREADS', 4)) + int(os.getenv('AI_JOB_WORKERS', 4)) + 2
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection checkout wait times and pool usage for one process"""
+
+    def __init__(self, window=2048, observer=None):
+        self.observer = observer
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.in_use = 0
+        self.open_connections = 0
+        self.pools_cleared = 0
+
+    # Checkout events fire on the thread doing the checkout
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def _waited(self):
+        started = getattr(self._local, 'started', None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_checked_out(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            self._recent.append(waited)
+        if self.observer is not None:
+            self.observer(waited)
+
+    def connection_check_out_failed(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checkout_failures += 1
+            self.wait_seconds_total += waited
+            self._recent.append(waited)
+        if self.observer is not None:
+            self.observer(waited, True)
+        logger.warning(f"MongoDB connection checkout failed after {waited * 1000:.0f} ms ({event.reason})")
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            recent = sorted(self._recent)
+
+        def percentile(q):
+            return round(recent[min(int(q * len(recent)), len(recent) - 1)] * 1000, 2) if recent else None
+
+        return {
+            'checkouts': self.checkouts,
+            'checkout_failures': self.checkout_failures,
+            'in_use': self.in_use,
+            'open_connections': self.open_connections,
+            'pools_cleared': self.pools_cleared,
+            'wait_ms_avg': round(self.wait_seconds_total / self.checkouts * 1000, 2) if self.checkouts else None,
+            'wait_ms_p50': percentile(0.5),
+            'wait_ms_p95': percentile(0.95),
+            'wait_ms_max': round(self.wait_seconds_max * 1000, 2),
+        }
+
+
+class MongoManager:
+    """Creates the MongoClient on first use in each process"""
+
+    def __init__(self, uri, db_name, event_listeners=(), wait_observer=None, **options):
+        self.uri = uri
+        self.db_name = db_name
+        self.event_listeners = list(event_listeners)
+        self.wait_observer = wait_observer
+        self.options = options
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # The parent's client, collections and lock (possibly held) are unusable in a child
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._database = None
+        self._pid = None
+        self._collections = {}
+        self.metrics = PoolMetrics(observer=self.wait_observer)
+
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    if self._pid not in (None, os.getpid()):
+                        self._reset()
+                    self._client = MongoClient(self.uri, event_listeners=[self.metrics] + self.event_listeners,
+                                               **self.options)
+                    self._database = self._client[self.db_name]
+                    self._pid = os.getpid()
+                    logger.info(f"✅ MongoDB client created for worker {self._pid} "
+                                f"(pool {self.options.get('maxPoolSize')}, "
+                                f"compressors {self.options.get('compressors') or 'none'})")
+        return self._client
+
+    def get_database(self):
+        self.client()
+        return self._database
+
+    def collection(self, name):
+        """This process's Collection object for ``name`` (cached)"""
+        database = self.get_database()
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = database[name]
+        return collection
+
+    def database(self):
+        """Lazy stand-in for the Database, safe to create before fork"""
+        return LazyDatabase(self)
+
+    def stats(self):
+        stats = self.metrics.stats()
+        stats['max_pool_size'] = self.options.get('maxPoolSize')
+        stats['compressors'] = self.options.get('compressors') or []
+        stats['connected'] = self._client is not None and self._pid == os.getpid()
+        return stats
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Manager configured by the environment; kwargs (listeners, observer) pass through"""
+        compressors = os.getenv('MONGO_COMPRESSORS')
+        if compressors is None:
+            compressors = available_compressors()
+        elif compressors.strip().lower() == 'none':
+            compressors = []
+        else:
+            compressors = [name.strip() for name in compressors.split(',') if name.strip()]
+        options = {
+            'maxPoolSize': int(os.getenv('MONGO_MAX_POOL_SIZE', 0)) or default_pool_size(),
+            'minPoolSize': int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+            'maxIdleTimeMS': int(float(os.getenv('MONGO_MAX_IDLE_SECONDS', 300)) * 1000),
+            'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+            'connectTimeoutMS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+            'socketTimeoutMS': int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 30000)),
+            'waitQueueTimeoutMS': int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+            'retryWrites': True,
+        }
+        if compressors:
+            options['compressors'] = compressors
+        return cls(os.getenv('MONGODB_URI', 'mongodb_url'), os.getenv('MONGODB_DB', 'satvic_diet_planner'),
+                   **kwargs, **options)
+
+
+class LazyCollection:
+    """Forwards to the current process's Collection"""
+
+    __slots__ = ('_manager', '_name')
+
+    def __init__(self, manager, name):
+        self._manager = manager
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._manager.collection(self._name), attr)
+
+    def __getitem__(self, name):
+        # Sub-collections (db.recipes['drafts']) resolve lazily as well
+        return LazyCollection(self._manager, f'{self._name}.{name}')
+
+    def __repr__(self):
+        return f'LazyCollection({self._name!r})'
+
+
+class LazyDatabase:
+    """``db.users`` / ``db['users']`` give LazyCollections; Database methods go to the real database"""
+
+    def __init__(self, manager):
+        self._manager = manager
+
+    def __getattr__(self, name):
+        if name.startswith('_') or hasattr(Database, name):
+            return getattr(self._manager.get_database(), name)
+        return LazyCollection(self._manager, name)
+
+    def __getitem__(self, name):
+        return LazyCollection(self._manager, name)
+
+    def __repr__(self):
+        return f'LazyDatabase({self._manager.db_name!r})'
@@ -0,0 +1,143 @@
+"""Keyset (cursor) pagination and field selection for list endpoints.
+
+A page is fetched with a range condition on the sort keys of the last
+document the client saw, instead of skipping over everything before it, so
+every page costs the same however deep the client walks. The sort always
+ends in ``_id`` to make the order total.
+
+Cursors are opaque to clients: URL-safe base64 of the last document's sort
+key values, with dates and ObjectIds tagged so they decode to the right
+BSON types.
+
+``?fields=a,b`` turns into a server-side projection, so list views only
+transfer the fields they render.
+"""
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+ASC = 1
+DESC = -1
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def _tag(value):
+    if isinstance(value, datetime):
+        return {'$d': value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {'$o': str(value)}
+    return value
+
+
+def _untag(value):
+    if isinstance(value, dict):
+        if '$d' in value:
+            return datetime.fromisoformat(value['$d'])
+        if '$o' in value:
+            return ObjectId(value['$o'])
+        raise InvalidCursor('Invalid cursor')
+    return value
+
+
+def encode_cursor(values):
+    """Opaque token for a list of sort key values"""
+    raw = json.dumps([_tag(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Sort key values from a token produced by encode_cursor; raises InvalidCursor"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = [_untag(value) for value in json.loads(raw)]
+    except (ValueError, TypeError, InvalidId):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def _after(field, direction, value):
+    """Condition for values strictly after ``value`` in sort order (nulls sort first)"""
+    if value is None:
+        return {field: {'$ne': None}} if direction == ASC else None
+    if direction == ASC:
+        return {field: {'$gt': value}}
+    return {'$or': [{field: {'$lt': value}}, {field: None}]}
+
+
+def keyset_filter(sort, values):
+    """Match documents after the position ``values`` in ``sort`` order.
+
+    For sort keys (a, b, _id) this is a > va OR (a == va AND b > vb) OR ...
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        after = _after(field, direction, values[i])
+        if after is None:
+            continue
+        equal = {prefix: values[j] for j, (prefix, _) in enumerate(sort[:i])}
+        clauses.append({'$and': [equal, after]} if equal else after)
+    return {'$or': clauses} if clauses else {'_id': {'$exists': False}}
+
+
+def sort_values(doc, sort):
+    return [doc.get(field) for field, _ in sort]
+
+
+def paginate(collection, query, sort, limit, cursor=None, projection=None):
+    """One page of ``collection.find(query)`` in ``sort`` order.
+
+    ``sort`` must end with ``_id``. Returns ``(docs, next_cursor)``;
+    ``next_cursor`` is None on the last page.
+    """
+    if cursor:
+        query = {'$and': [query, keyset_filter(sort, decode_cursor(cursor, len(sort)))]}
+    docs = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+    return page_result(docs, sort, limit)
+
+
+def page_result(docs, sort, limit):
+    """Trim a ``limit + 1`` fetch to one page and build the cursor for the next one"""
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(sort_values(docs[-1], sort))
+
+
+def parse_limit(args, default, maximum):
+    """``limit`` query parameter clamped to [1, maximum]; raises ValueError if not an integer"""
+    return max(min(int(args.get('limit', default)), maximum), 1)
+
+
+def parse_fields(args, allowed, default=None, sort=()):
+    """Projection for the ``fields`` query parameter (comma-separated subset of ``allowed``).
+
+    Without ``fields`` the ``default`` list is used; None means whole
+    documents. ``id`` is always returned, and the sort keys are always
+    included so the next cursor can be built. Raises InvalidFields.
+    """
+    raw = args.get('fields')
+    if raw is None:
+        names = default
+    else:
+        names = [name.strip() for name in raw.split(',') if name.strip() and name.strip() != 'id']
+        unknown = sorted(set(names) - set(allowed))
+        if unknown:
+            raise InvalidFields(f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(allowed)})")
+    if names is None:
+        return None
+    projection = {name: 1 for name in names}
+    for field, _ in sort:
+        projection[field] = 1
+    return projection
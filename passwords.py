@@ -0,0 +1,119 @@
+"""Password hashing off the request threads.
+
+bcrypt (the ``password_hash`` field, shared with the Node API) is the one
+canonical scheme. Accounts that still carry the legacy werkzeug ``password``
+hash, or a bcrypt hash with a different cost factor, are flagged for rehash
+so the login handler can migrate them and later logins verify exactly once.
+
+Hashing runs in a small process pool so a burst of logins can't occupy every
+gthread slot of a worker. Configuration:
+
+- ``PASSWORD_BCRYPT_ROUNDS``: bcrypt cost factor (default 12)
+- ``PASSWORD_HASH_POOL``: ``process`` (default), ``thread`` or ``inline``
+- ``PASSWORD_HASH_WORKERS``: pool size (default 2)
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+from werkzeug.security import check_password_hash
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = int(os.getenv('PASSWORD_BCRYPT_ROUNDS', 12))
+POOL_KIND = os.getenv('PASSWORD_HASH_POOL', 'process').lower()
+POOL_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+TIMEOUT_SECONDS = 10
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+# Worker functions (module level so the process pool can pickle them)
+
+def _bcrypt_hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _bcrypt_check(password, stored):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), stored.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+def _werkzeug_check(password, stored):
+    try:
+        return check_password_hash(stored, password)
+    except Exception:
+        return False
+
+
+def _get_pool():
+    """Pool for the current process; created lazily so each gunicorn worker gets its own after fork"""
+    global _pool, _pool_pid
+    if POOL_KIND == 'inline':
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            if POOL_KIND == 'thread':
+                _pool = ThreadPoolExecutor(max_workers=POOL_WORKERS, thread_name_prefix='password')
+            else:
+                # spawn: forking a multi-threaded gunicorn worker is not safe
+                _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _run(fn, *args):
+    global _pool
+    pool = _get_pool()
+    if pool is None:
+        return fn(*args)
+    try:
+        return pool.submit(fn, *args).result(timeout=TIMEOUT_SECONDS)
+    except BrokenProcessPool:
+        logger.error("❌ Password hashing pool died; recreating it and hashing inline")
+        with _pool_lock:
+            _pool = None
+        return fn(*args)
+
+
+def bcrypt_rounds(stored):
+    """Cost factor encoded in a bcrypt hash ($2b$12$...), or None if unparseable"""
+    try:
+        return int(stored.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def hash_password(password):
+    """bcrypt hash with the configured cost factor"""
+    return _run(_bcrypt_hash, password, BCRYPT_ROUNDS)
+
+
+def verify_password(user, password):
+    """Check ``password`` against a user document.
+
+    Returns ``(valid, needs_rehash, drop_legacy)``: ``needs_rehash`` is True
+    when the account needs a fresh bcrypt hash at the configured cost, and
+    ``drop_legacy`` when a leftover werkzeug ``password`` field should be
+    removed (which alone costs no hashing).
+    """
+    stored = user.get('password_hash')
+    drop_legacy = 'password' in user
+    if isinstance(stored, str) and stored.startswith('$2'):
+        if not _run(_bcrypt_check, password, stored):
+            return False, False, False
+        return True, bcrypt_rounds(stored) != BCRYPT_ROUNDS, drop_legacy
+
+    legacy = user.get('password')
+    if isinstance(legacy, str) and legacy:
+        return _run(_werkzeug_check, password, legacy), True, drop_legacy
+    return False, False, False
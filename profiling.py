@@ -0,0 +1,173 @@
+"""Opt-in per-request profiling.
+
+A request is profiled when it carries ``X-Profile: <PROFILE_TOKEN>`` or is
+picked by ``PROFILE_SAMPLE_RATE``. Two profilers are available:
+
+- ``cprofile`` (default): deterministic, written as a ``.prof`` pstats file
+  (``python -m pstats file.prof``, snakeviz)
+- ``sample``: a background thread records the request thread's stack every
+  ``PROFILE_INTERVAL_MS`` and writes folded stacks (``.collapsed``) for
+  flamegraph.pl or speedscope; much lower overhead on slow requests
+
+``X-Profile-Mode: cprofile|sample`` overrides the mode for one request.
+Files go to ``PROFILE_DIR`` named ``<route>-<UTC timestamp>-<pid>``, the
+file name is returned in ``X-Profile-Output``, and only the newest
+``PROFILE_MAX_FILES`` are kept. One request per worker is profiled at a
+time.
+
+With neither PROFILE_TOKEN nor PROFILE_SAMPLE_RATE set, no hooks are
+installed at all, so there is no per-request cost.
+"""
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Profile'
+MODE_HEADER = 'X-Profile-Mode'
+MODES = ('cprofile', 'sample')
+
+
+def route_slug(rule):
+    """'/api/recipes/<recipe_id>' -> 'api_recipes_recipe_id'"""
+    return re.sub(r'[^A-Za-z0-9]+', '_', rule or 'unmatched').strip('_') or 'root'
+
+
+class StackSampler:
+    """Samples one thread's stack on a timer and counts folded stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as fh:
+            for stack, count in self.stacks.most_common():
+                fh.write(f'{stack} {count}\n')
+
+
+class RequestProfiler:
+    def __init__(self, directory, token=None, sample_rate=0.0, mode='cprofile', interval=0.005, max_files=200):
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.mode = mode if mode in MODES else 'cprofile'
+        self.interval = interval
+        self.max_files = max_files
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.token) or self.sample_rate > 0
+
+    def _wanted(self):
+        supplied = request.headers.get(HEADER)
+        if supplied and self.token and hmac.compare_digest(supplied, self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self):
+        if not self._wanted() or not self._busy.acquire(blocking=False):
+            return
+        mode = request.headers.get(MODE_HEADER, self.mode)
+        mode = mode if mode in MODES else self.mode
+        if mode == 'sample':
+            profiler = StackSampler(threading.get_ident(), self.interval)
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        g.profiler = (mode, profiler, time.perf_counter())
+
+    def finish(self, response=None):
+        """Stop the request's profiler (if any), write its output and tag the response"""
+        state = g.pop('profiler', None)
+        if state is None:
+            return response
+        mode, profiler, started = state
+        try:
+            if mode == 'sample':
+                profiler.stop()
+            else:
+                profiler.disable()
+            route = request.url_rule.rule if request.url_rule else None
+            stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%fZ')
+            name = f"{route_slug(route)}-{stamp}-{os.getpid()}.{'collapsed' if mode == 'sample' else 'prof'}"
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, name)
+            if mode == 'sample':
+                profiler.write(path)
+            else:
+                profiler.dump_stats(path)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            logger.info(f"✅ Profiled {request.method} {route} ({elapsed_ms:.0f} ms, {mode}) -> {path}")
+            if response is not None:
+                response.headers['X-Profile-Output'] = name
+            self._prune()
+        except Exception as e:
+            logger.error(f"❌ Profile not written: {e}")
+        finally:
+            self._busy.release()
+        return response
+
+    def _prune(self):
+        files = sorted((entry for entry in os.scandir(self.directory) if entry.is_file()),
+                       key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:max(len(files) - self.max_files, 0)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def install(app):
+    """Register the profiling hooks on ``app`` if profiling is configured; returns the profiler or None"""
+    profiler = RequestProfiler(
+        directory=os.getenv('PROFILE_DIR', '/tmp/satvic-profiles'),
+        token=os.getenv('PROFILE_TOKEN') or None,
+        sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+        mode=os.getenv('PROFILE_MODE', 'cprofile'),
+        interval=float(os.getenv('PROFILE_INTERVAL_MS', 5)) / 1000,
+        max_files=int(os.getenv('PROFILE_MAX_FILES', 200)),
+    )
+    if not profiler.enabled:
+        return None
+    app.before_request(profiler.start)
+    app.after_request(profiler.finish)
+    # after_request is skipped when a view raises; still stop the profiler
+    app.teardown_request(lambda error: profiler.finish())
+    logger.info(f"✅ Request profiling enabled ({profiler.mode}, sample rate {profiler.sample_rate})")
+    return profiler
@@ -0,0 +1,321 @@
+"""Vectorized time-series analytics over ``db.progress``.
+
+Entries are loaded straight from a cursor into columnar NumPy arrays sorted
+by (user, date). Every statistic is computed for all users at once with
+segmented cumulative sums and ``np.add.reduceat``, so the per-user endpoint
+and the nightly batch share one code path and neither loops per entry in
+Python:
+
+- rolling mean over the last ``window`` entries
+- EWMA (adjusted, like pandas ``ewm(adjust=True)``)
+- weight-change slope per day (least squares)
+- Pearson correlations between sleep, water, exercise, mood and energy
+
+``python progress_analytics.py`` runs the batch and stores one report per
+user in ``db.progress_reports``.
+"""
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from itertools import combinations
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('weight', 'energy_level', 'mood', 'sleep_quality', 'water_intake', 'exercise_minutes')
+CORRELATED = ('sleep_quality', 'water_intake', 'exercise_minutes', 'mood', 'energy_level')
+PAIRS = tuple(combinations(CORRELATED, 2))
+
+MAX_DAYS = 365
+EWMA_BLOCK = 64
+
+
+class ProgressFrame:
+    """Columnar progress entries for one or many users, sorted by (user, date)"""
+
+    def __init__(self, user_ids, users, days, dates, values):
+        self.user_ids = user_ids   # distinct user ids, in segment order
+        self.users = users         # int segment index per row
+        self.days = days           # float days since epoch per row
+        self.dates = dates         # datetime per row (for series output)
+        self.values = values       # field -> float array, NaN where missing
+        self.starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]]) if len(users) else np.array([], int)
+        self.lengths = np.diff(np.r_[self.starts, len(users)])
+
+    def __len__(self):
+        return len(self.users)
+
+
+def _as_naive_utc(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+def load_frame(collection, days=90, user_id=None, now=None):
+    """Load progress entries of the last ``days`` days (one user or everyone) into a frame"""
+    days = min(max(int(days), 1), MAX_DAYS)
+    since = (now or datetime.now(timezone.utc)) - timedelta(days=days)
+    match = {'date': {'$gte': since}}
+    if user_id is not None:
+        match['user_id'] = user_id
+    projection = {'_id': 0, 'user_id': 1, 'date': 1}
+    projection.update({field: 1 for field in FIELDS})
+    # (user_id asc, date desc) is the direction progress_user_date_id is stored in, so
+    # the index serves the sort (no blocking in-memory sort over the whole window);
+    # each user's rows are reversed into date order below
+    cursor = collection.find(match, projection).sort([('user_id', 1), ('date', -1)])
+
+    user_ids, users, dates = [], [], []
+    columns = {field: [] for field in FIELDS}
+    segment = []
+
+    def flush():
+        segment.reverse()
+        for date, doc in segment:
+            users.append(len(user_ids) - 1)
+            dates.append(date)
+            for field in FIELDS:
+                columns[field].append(_number(doc.get(field)))
+        segment.clear()
+
+    for doc in cursor:
+        date = doc.get('date')
+        if not isinstance(date, datetime):
+            continue
+        if not user_ids or doc['user_id'] != user_ids[-1]:
+            flush()
+            user_ids.append(doc['user_id'])
+        segment.append((_as_naive_utc(date), doc))
+    flush()
+
+    day_numbers = np.array(dates, dtype='datetime64[ms]').astype(np.int64) / 86400000.0
+    return ProgressFrame(
+        user_ids,
+        np.array(users, dtype=np.int64),
+        day_numbers,
+        dates,
+        {field: np.array(col, dtype=float) for field, col in columns.items()},
+    )
+
+
+def _segment_cumsum(frame, values, starts=None, lengths=None):
+    """Cumulative sum that restarts at every user boundary (or at the given segment starts)"""
+    if starts is None:
+        starts, lengths = frame.starts, frame.lengths
+    cs = np.cumsum(values)
+    base = np.repeat(cs[starts] - values[starts], lengths)
+    return cs - base
+
+
+def _positions(frame):
+    """Index of each row within its user's segment"""
+    return np.arange(len(frame)) - np.repeat(frame.starts, frame.lengths)
+
+
+def rolling_mean(frame, field, window=7):
+    """Per row, mean of the non-missing values among the user's last ``window`` entries"""
+    x = frame.values[field]
+    present = ~np.isnan(x)
+    sums = _segment_cumsum(frame, np.where(present, x, 0.0))
+    counts = _segment_cumsum(frame, present.astype(float))
+    pos = _positions(frame)
+    prev = np.arange(len(frame)) - window
+    has_prev = pos >= window
+    prev = np.where(has_prev, prev, 0)
+    sums = sums - np.where(has_prev, sums[prev], 0.0)
+    counts = counts - np.where(has_prev, counts[prev], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def ewma(frame, field, alpha=0.3):
+    """Adjusted exponentially weighted mean per row; missing values carry no weight"""
+    x = frame.values[field]
+    present = ~np.isnan(x)
+    decay = 1.0 - alpha
+
+    # Each user's rows are laid out in blocks of at most EWMA_BLOCK columns. Within
+    # a block y_t = cumsum(x_k w^-k) / cumsum(w^-k) (scaled so nothing overflows),
+    # and the weighted sums at the end of one block are carried into the next,
+    # one vectorized step per block rather than per row.
+    width = max(min(EWMA_BLOCK, int(600 / -np.log(decay))), 1)
+    pos = _positions(frame)
+    local = pos % width
+    sub = np.cumsum(local == 0) - 1
+    rows = int(sub[-1]) + 1 if len(sub) else 0
+
+    grid_x = np.zeros((rows, width))
+    grid_m = np.zeros((rows, width))
+    grid_x[sub, local] = np.where(present, x, 0.0)
+    grid_m[sub, local] = present
+    scale = decay ** -np.arange(width, dtype=float)
+    num = np.cumsum(grid_x * scale, axis=1)
+    den = np.cumsum(grid_m * scale, axis=1)
+
+    # Only full blocks are ever carried forward, so their end is the last column
+    tail = decay ** (width - 1.0)
+    block_index = pos[local == 0] // width
+    carry_num = np.zeros(rows)
+    carry_den = np.zeros(rows)
+    for b in range(1, int(block_index.max()) + 1 if rows else 1):
+        cur = np.flatnonzero(block_index == b)
+        prev = cur - 1
+        carry_num[cur] = carry_num[prev] * decay ** width + num[prev, -1] * tail
+        carry_den[cur] = carry_den[prev] * decay ** width + den[prev, -1] * tail
+
+    num = num + decay * carry_num[:, None]
+    den = den + decay * carry_den[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        y = np.where(den > 0, num / den, np.nan)
+    return y[sub, local]
+
+
+def _segment_sums(frame, values):
+    if not len(frame):
+        return np.zeros(0)
+    return np.add.reduceat(values, frame.starts)
+
+
+def weight_slopes(frame):
+    """Least-squares weight change per day for every user (NaN with <2 points or one day)"""
+    y = frame.values['weight']
+    present = ~np.isnan(y)
+    # Centre days per user so the sums stay well conditioned
+    x = frame.days - np.repeat(frame.days[frame.starts], frame.lengths) if len(frame) else frame.days
+    m = present.astype(float)
+    x0 = np.where(present, x, 0.0)
+    y0 = np.where(present, y, 0.0)
+    n = _segment_sums(frame, m)
+    sx = _segment_sums(frame, x0)
+    sy = _segment_sums(frame, y0)
+    sxy = _segment_sums(frame, x0 * y0)
+    sxx = _segment_sums(frame, x0 * x0)
+    denom = n * sxx - sx * sx
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where((n >= 2) & (denom > 0), (n * sxy - sx * sy) / denom, np.nan)
+
+
+def correlations(frame, min_points=3):
+    """Pearson r for every CORRELATED pair, per user: {(a, b): array}"""
+    result = {}
+    for a, b in PAIRS:
+        xa, xb = frame.values[a], frame.values[b]
+        both = ~np.isnan(xa) & ~np.isnan(xb)
+        xa0 = np.where(both, xa, 0.0)
+        xb0 = np.where(both, xb, 0.0)
+        n = _segment_sums(frame, both.astype(float))
+        sa, sb = _segment_sums(frame, xa0), _segment_sums(frame, xb0)
+        saa, sbb = _segment_sums(frame, xa0 * xa0), _segment_sums(frame, xb0 * xb0)
+        sab = _segment_sums(frame, xa0 * xb0)
+        cov = n * sab - sa * sb
+        var = (n * saa - sa * sa) * (n * sbb - sb * sb)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[(a, b)] = np.where((n >= min_points) & (var > 0), cov / np.sqrt(var), np.nan)
+    return result
+
+
+def _clean(value, digits=4):
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def analyze(frame, window=7, alpha=0.3, include_series=False):
+    """Compute every statistic for all users in one pass; returns {user_id: report}"""
+    if not len(frame):
+        return {}
+    rolling = {field: rolling_mean(frame, field, window) for field in FIELDS}
+    smoothed = {field: ewma(frame, field, alpha) for field in FIELDS}
+    slopes = weight_slopes(frame)
+    corr = correlations(frame)
+
+    reports = {}
+    for index, user_id in enumerate(frame.user_ids):
+        start, length = int(frame.starts[index]), int(frame.lengths[index])
+        last = start + length - 1
+        report = {
+            'entries': length,
+            'from': frame.dates[start].date().isoformat(),
+            'to': frame.dates[last].date().isoformat(),
+            'latest': {
+                field: {'rolling_mean': _clean(rolling[field][last]), 'ewma': _clean(smoothed[field][last])}
+                for field in FIELDS
+            },
+            'weight_slope_per_day': _clean(slopes[index], 5),
+            'correlations': {f'{a}~{b}': _clean(corr[(a, b)][index], 3) for a, b in PAIRS},
+        }
+        if include_series:
+            rows = range(start, last + 1)
+            report['series'] = {
+                field: [
+                    {
+                        'date': frame.dates[i].isoformat(),
+                        'value': _clean(frame.values[field][i]),
+                        'rolling_mean': _clean(rolling[field][i]),
+                        'ewma': _clean(smoothed[field][i]),
+                    }
+                    for i in rows
+                ]
+                for field in FIELDS
+            }
+        reports[user_id] = report
+    return reports
+
+
+def user_report(collection, user_id, days=90, window=7, alpha=0.3, include_series=True):
+    """Analytics for a single user (None when there are no entries in the window)"""
+    frame = load_frame(collection, days=days, user_id=user_id)
+    return analyze(frame, window=window, alpha=alpha, include_series=include_series).get(user_id)
+
+
+def run_batch(db, days=90, window=7, alpha=0.3):
+    """Analyze every user in one pass and upsert reports into db.progress_reports"""
+    from pymongo import UpdateOne
+
+    frame = load_frame(db.progress, days=days)
+    reports = analyze(frame, window=window, alpha=alpha)
+    generated_at = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne({'user_id': user_id},
+                  {'$set': {'report': report, 'period_days': days, 'generated_at': generated_at}},
+                  upsert=True)
+        for user_id, report in reports.items()
+    ]
+    for i in range(0, len(operations), 1000):
+        db.progress_reports.bulk_write(operations[i:i + 1000], ordered=False)
+    return len(reports), len(frame)
+
+
+def main(argv):
+    import argparse
+    import os
+    import time
+
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description='Nightly progress analytics for all users')
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--window', type=int, default=7)
+    parser.add_argument('--alpha', type=float, default=0.3)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    db = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017')).satvic_diet_planner
+    started = time.perf_counter()
+    users, entries = run_batch(db, days=args.days, window=args.window, alpha=args.alpha)
+    logger.info(f"✅ Progress reports for {users} users ({entries} entries) in "
+                f"{time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
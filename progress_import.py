@@ -0,0 +1,260 @@
+"""Bulk ingestion of progress entries (wearable syncs, history imports).
+
+The request body is read incrementally, either as a JSON array or as NDJSON
+(one object per line), so a large import never has to be held in memory as
+one parsed document. Each entry is validated as it arrives, entries are
+deduplicated on (user_id, date) both within the request and against what is
+already stored, and the rest are written with unordered ``insert_many`` in
+chunks. The unique ``progress_user_date_unique`` index catches entries a
+concurrent request stored in between, which are reported as duplicates.
+Errors are reported per row with the row's index in the body.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+
+from pymongo.errors import BulkWriteError
+
+import progress_rollups
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ('date', 'weight', 'energy_level', 'mood', 'sleep_quality')
+MAX_ENTRIES = 5000
+CHUNK_SIZE = 500
+READ_SIZE = 64 * 1024
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+class MalformedBody(ValueError):
+    """The body stopped being parseable; rows after ``index`` cannot be recovered"""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+
+def parse_date(value):
+    """ISO 8601 string (with optional trailing Z) to a datetime"""
+    if not isinstance(value, str) or not value:
+        raise ValueError('date is required (ISO string)')
+    try:
+        date = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('Invalid date format')
+    # MongoDB keeps milliseconds; truncate so duplicate checks compare what is stored
+    return date.replace(microsecond=date.microsecond // 1000 * 1000)
+
+
+def build_entry(user_id, data, now=None):
+    """Validate one raw entry and return the document to insert; raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('each entry must be an object')
+    missing = [field for field in REQUIRED_FIELDS if field not in data]
+    if missing:
+        raise ValueError(f"Missing required progress fields: {', '.join(missing)}")
+    return {
+        'user_id': user_id,
+        'date': parse_date(data['date']),
+        'weight': data['weight'],
+        'energy_level': data['energy_level'],
+        'mood': data['mood'],
+        'sleep_quality': data['sleep_quality'],
+        'water_intake': data.get('water_intake', 0),
+        'exercise_minutes': data.get('exercise_minutes', 0),
+        'notes': data.get('notes', ''),
+        'created_at': now or datetime.now(timezone.utc),
+    }
+
+
+def _chunks(stream):
+    while True:
+        chunk = stream.read(READ_SIZE)
+        if not chunk:
+            return
+        yield chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+
+
+def iter_ndjson(stream):
+    """Yield (index, object_or_ValueError) for each non-blank line"""
+    buffer = ''
+    index = 0
+    for chunk in _chunks(stream):
+        buffer += chunk
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                yield index, _loads(line)
+                index += 1
+    if buffer.strip():
+        yield index, _loads(buffer)
+
+
+def _loads(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f'Invalid JSON: {e}')
+
+
+def iter_json_array(stream):
+    """Yield (index, object) for each element of a top-level JSON array, decoding as bytes arrive"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    index = 0
+    chunks = _chunks(stream)
+    exhausted = False
+
+    def fill():
+        nonlocal buffer, pos, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    # What the next non-blank character must be: '[', a value or ']' (first),
+    # a value (after a comma), ',' or ']' (after a value), nothing (after ']')
+    expect = 'open'
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+            pos += 1
+        if pos >= len(buffer):
+            if exhausted or not fill():
+                if expect == 'end':
+                    return
+                raise MalformedBody(index, 'Unexpected end of body')
+            continue
+
+        char = buffer[pos]
+        if expect == 'open':
+            if char != '[':
+                raise MalformedBody(index, 'Body must be a JSON array or NDJSON')
+            expect = 'first'
+            pos += 1
+            continue
+        if expect == 'end':
+            raise MalformedBody(index, 'Unexpected data after the array')
+        if expect == 'separator':
+            if char not in ',]':
+                raise MalformedBody(index, "Expected ',' or ']' between entries")
+            expect = 'value' if char == ',' else 'end'
+            pos += 1
+            continue
+        if char == ']' and expect == 'first':
+            expect = 'end'
+            pos += 1
+            continue
+        if char in ',]':
+            raise MalformedBody(index, 'Missing entry')
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except ValueError as e:
+            # The element may just be split across reads
+            if not exhausted and fill():
+                continue
+            raise MalformedBody(index, f'Invalid JSON: {e}')
+        if end == len(buffer) and not exhausted and fill():
+            # A number at the end of the buffer could continue in the next read
+            continue
+        yield index, value
+        index += 1
+        pos = end
+        expect = 'separator'
+
+
+def ingest(db, user_id, rows, max_entries=MAX_ENTRIES, chunk_size=CHUNK_SIZE):
+    """Validate, dedupe and insert ``rows`` of (index, raw) pairs for one user.
+
+    Returns ``{'received', 'inserted', 'duplicates', 'errors'}``; errors carry
+    the row index. A body that stops parsing ends the import at that row.
+    """
+    summary = {'received': 0, 'inserted': 0, 'duplicates': 0, 'errors': []}
+    seen = set()
+    pending = []
+
+    def flush():
+        if pending:
+            _insert_chunk(db, user_id, pending, summary)
+            pending.clear()
+
+    now = datetime.now(timezone.utc)
+    try:
+        for index, raw in rows:
+            summary['received'] += 1
+            if summary['received'] > max_entries:
+                summary['errors'].append({'index': index, 'error': f'At most {max_entries} entries per request'})
+                break
+            try:
+                if isinstance(raw, ValueError):
+                    raise raw
+                doc = build_entry(user_id, raw, now)
+            except ValueError as e:
+                summary['errors'].append({'index': index, 'error': str(e)})
+                continue
+            key = _as_naive(doc['date'])
+            if key in seen:
+                summary['duplicates'] += 1
+                summary['errors'].append({'index': index, 'error': 'Duplicate date in request'})
+                continue
+            seen.add(key)
+            pending.append((index, doc))
+            if len(pending) >= chunk_size:
+                flush()
+    except MalformedBody as e:
+        summary['errors'].append({'index': e.index, 'error': str(e)})
+    flush()
+    summary['errors'].sort(key=lambda error: error['index'])
+    return summary
+
+
+def _insert_chunk(db, user_id, pending, summary):
+    """Skip entries already stored for the same dates, insert the rest unordered"""
+    existing = {
+        doc['date'] for doc in db.progress.find(
+            {'user_id': user_id, 'date': {'$in': [doc['date'] for _, doc in pending]}},
+            {'_id': 0, 'date': 1},
+        )
+    }
+    new = []
+    for index, doc in pending:
+        if _as_naive(doc['date']) in existing:
+            summary['duplicates'] += 1
+            summary['errors'].append({'index': index, 'error': 'Entry for this date already exists'})
+        else:
+            new.append((index, doc))
+    if not new:
+        return
+
+    failed = set()
+    try:
+        db.progress.insert_many([doc for _, doc in new], ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get('writeErrors', []):
+            failed.add(err['index'])
+            index = new[err['index']][0]
+            if err.get('code') == 11000:
+                summary['duplicates'] += 1
+                summary['errors'].append({'index': index, 'error': 'Entry for this date already exists'})
+            else:
+                summary['errors'].append({'index': index, 'error': err.get('errmsg', 'Write failed')})
+
+    inserted = [doc for position, (_, doc) in enumerate(new) if position not in failed]
+    summary['inserted'] += len(inserted)
+    try:
+        progress_rollups.record_entries(db.progress_rollups, user_id, inserted)
+    except Exception as e:
+        # The entries are saved and the user is marked stale; the next analytics read rebuilds
+        logger.error(f"❌ Progress rollup update failed for user {user_id}: {e}")
+
+
+def _as_naive(value):
+    # MongoDB returns naive UTC datetimes unless the client is tz_aware
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
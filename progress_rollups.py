@@ -0,0 +1,339 @@
+"""Incrementally maintained daily/weekly rollups of progress entries.
+
+Every progress entry updates one ``day`` and one ``week`` bucket in
+``db.progress_rollups`` (sum, count, min and max per metric), so analytics
+for any window read at most a couple of weeks' worth of day buckets at the
+edges plus one bucket per full week in between, however much history the
+user has.
+
+Each user has a ``meta`` document (``_id: 'meta:<user_id>'``) naming the
+generation of buckets readers use. A rebuild takes a lock on it, folds
+``db.progress`` into a fresh generation and switches to that generation
+only if no entry was recorded meanwhile, so concurrent rebuilds and writes
+never double count. New entries are folded in only while the user's
+rollups are ``ready``; when they are missing (entries that predate the
+rollups), being rebuilt, or a bucket write failed, the user is left
+``stale`` and the next analytics read rebuilds from ``db.progress``.
+``python progress_rollups.py`` rebuilds everything.
+"""
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('weight', 'energy_level', 'mood', 'sleep_quality', 'water_intake', 'exercise_minutes')
+
+# Response keys kept from the original $group-based analytics
+AVERAGE_KEYS = {
+    'weight': 'avg_weight',
+    'energy_level': 'avg_energy',
+    'mood': 'avg_mood',
+    'sleep_quality': 'avg_sleep',
+    'water_intake': 'avg_water',
+    'exercise_minutes': 'avg_exercise',
+}
+
+DAY = 'day'
+WEEK = 'week'
+META = 'meta'
+
+READY = 'ready'
+STALE = 'stale'
+REBUILDING = 'rebuilding'
+LOCK_SECONDS = 120
+REBUILD_ATTEMPTS = 3
+
+
+def _as_utc_naive(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def day_start(value):
+    value = _as_utc_naive(value)
+    return datetime(value.year, value.month, value.day)
+
+
+def week_start(value):
+    day = day_start(value)
+    return day - timedelta(days=day.weekday())
+
+
+def _numeric(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _bucket_updates(user_id, gen, entries):
+    """Pre-aggregate entries in Python so each bucket gets a single update"""
+    buckets = {}
+    for entry in entries:
+        date = entry.get('date')
+        if not isinstance(date, datetime):
+            continue
+        for granularity, start in ((DAY, day_start(date)), (WEEK, week_start(date))):
+            bucket = buckets.setdefault((granularity, start), {'entries': 0, 'metrics': {}})
+            bucket['entries'] += 1
+            for metric in METRICS:
+                value = entry.get(metric)
+                if not _numeric(value):
+                    continue
+                stats = bucket['metrics'].setdefault(metric, {'sum': 0, 'count': 0, 'min': value, 'max': value})
+                stats['sum'] += value
+                stats['count'] += 1
+                stats['min'] = min(stats['min'], value)
+                stats['max'] = max(stats['max'], value)
+
+    operations = []
+    for (granularity, start), bucket in buckets.items():
+        inc = {'entries': bucket['entries']}
+        mins, maxs = {}, {}
+        for metric, stats in bucket['metrics'].items():
+            inc[f'metrics.{metric}.sum'] = stats['sum']
+            inc[f'metrics.{metric}.count'] = stats['count']
+            mins[f'metrics.{metric}.min'] = stats['min']
+            maxs[f'metrics.{metric}.max'] = stats['max']
+        update = {'$inc': inc, '$set': {'updated_at': datetime.now(timezone.utc)}}
+        if mins:
+            update['$min'] = mins
+            update['$max'] = maxs
+        operations.append(UpdateOne(
+            {'user_id': user_id, 'gen': gen, 'granularity': granularity, 'bucket_start': start},
+            update, upsert=True,
+        ))
+    return operations
+
+
+def meta_id(user_id):
+    return f'{META}:{user_id}'
+
+
+def mark_stale(collection, user_id):
+    """Have the next read rebuild this user's rollups from db.progress"""
+    collection.update_one({'_id': meta_id(user_id), 'state': READY}, {'$set': {'state': STALE}})
+
+
+def record_entries(collection, user_id, entries):
+    """Fold newly inserted progress entries into the user's day and week buckets.
+
+    Call after the entries are stored. Skipped unless the user's rollups are
+    ready: a pending rebuild reads the entries from db.progress instead.
+    """
+    if not entries:
+        return
+    # Counting the write lets a concurrent rebuild notice it and not switch generations
+    meta = collection.find_one_and_update(
+        {'_id': meta_id(user_id)}, {'$inc': {'writes': 1}}, return_document=ReturnDocument.AFTER
+    )
+    if meta is None or meta.get('state') != READY:
+        return
+    operations = _bucket_updates(user_id, meta['gen'], entries)
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except Exception:
+        mark_stale(collection, user_id)
+        raise
+
+
+def _lock(collection, user_id, token):
+    now = datetime.now(timezone.utc)
+    try:
+        return collection.find_one_and_update(
+            {'_id': meta_id(user_id), '$or': [{'state': {'$ne': REBUILDING}}, {'locked_until': {'$lt': now}}]},
+            {'$set': {'state': REBUILDING, 'lock': token, 'locked_until': now + timedelta(seconds=LOCK_SECONDS)},
+             '$setOnInsert': {'user_id': user_id, 'granularity': META, 'gen': None, 'writes': 0}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The meta document exists and another rebuild holds the lock
+        return None
+
+
+def rebuild_user(db, user_id):
+    """Recompute a user's rollups from db.progress into a new generation and switch to it.
+
+    Returns the number of entries folded in, or None when another rebuild holds
+    the lock or entries kept arriving (the user then stays stale).
+    """
+    collection = db.progress_rollups
+    token = ObjectId()
+    meta = _lock(collection, user_id, token)
+    if meta is None:
+        return None
+
+    projection = {metric: 1 for metric in METRICS}
+    projection['date'] = 1
+    release = {'$set': {'state': STALE}, '$unset': {'lock': '', 'locked_until': ''}}
+    try:
+        for _ in range(REBUILD_ATTEMPTS):
+            writes = meta.get('writes', 0)
+            gen = ObjectId()
+            entries = list(db.progress.find({'user_id': user_id}, projection))
+            operations = _bucket_updates(user_id, gen, entries)
+            if operations:
+                collection.bulk_write(operations, ordered=False)
+            switched = collection.find_one_and_update(
+                {'_id': meta['_id'], 'lock': token, 'writes': writes},
+                {'$set': {'state': READY, 'gen': gen, 'rebuilt_at': datetime.now(timezone.utc)},
+                 '$unset': {'lock': '', 'locked_until': ''}},
+            )
+            if switched is not None:
+                # Older generations (and buckets written before generations existed) are unreachable now
+                collection.delete_many(
+                    {'user_id': user_id, 'granularity': {'$in': [DAY, WEEK]}, 'gen': {'$ne': gen}}
+                )
+                return len(entries)
+            # An entry was recorded meanwhile and may be missing from this generation
+            collection.delete_many({'user_id': user_id, 'gen': gen})
+            meta = collection.find_one({'_id': meta['_id'], 'lock': token})
+            if meta is None:
+                # Our lock expired and another rebuild took over
+                return None
+    except Exception:
+        collection.update_one({'_id': meta_id(user_id), 'lock': token}, release)
+        raise
+
+    collection.update_one({'_id': meta['_id'], 'lock': token}, release)
+    logger.warning(f"Rollup rebuild for user {user_id} kept racing new entries; retrying on next read")
+    return None
+
+
+def current_generation(db, user_id):
+    """Generation of buckets to read, rebuilding first when the user's rollups are not ready.
+
+    None means there are no buckets yet (a rebuild is running elsewhere).
+    """
+    meta = db.progress_rollups.find_one({'_id': meta_id(user_id)}, {'state': 1, 'gen': 1})
+    if meta is None or meta.get('state') != READY:
+        rebuild_user(db, user_id)
+        meta = db.progress_rollups.find_one({'_id': meta_id(user_id)}, {'gen': 1})
+    return meta.get('gen') if meta else None
+
+
+def _empty_stats():
+    return {'sum': 0, 'count': 0, 'min': None, 'max': None}
+
+
+def _merge(total, stats):
+    total['sum'] += stats.get('sum', 0)
+    total['count'] += stats.get('count', 0)
+    for key, pick in (('min', min), ('max', max)):
+        if stats.get(key) is not None:
+            total[key] = stats[key] if total[key] is None else pick(total[key], stats[key])
+
+
+def window_buckets(collection, user_id, gen, days, now=None):
+    """Day buckets for the partial weeks at the window edges, week buckets in between
+
+    The window starts at midnight ``days`` days ago and, like the original
+    ``date >= now - days`` query, has no upper bound: entries dated in the
+    future are counted.
+    """
+    if gen is None:
+        return []
+    today = day_start(now or datetime.now(timezone.utc))
+    start = today - timedelta(days=days)
+    first_full_week = week_start(start + timedelta(days=6))
+    last_full_week_end = week_start(today)
+
+    if first_full_week >= last_full_week_end:
+        query = {'user_id': user_id, 'gen': gen, 'granularity': DAY, 'bucket_start': {'$gte': start}}
+    else:
+        query = {'user_id': user_id, 'gen': gen, '$or': [
+            {'granularity': DAY, 'bucket_start': {'$gte': start, '$lt': first_full_week}},
+            {'granularity': WEEK, 'bucket_start': {'$gte': first_full_week, '$lt': last_full_week_end}},
+            {'granularity': DAY, 'bucket_start': {'$gte': last_full_week_end}},
+        ]}
+    return list(collection.find(query))
+
+
+def summarize(buckets):
+    """Combine buckets into per-metric avg/min/max plus the legacy avg_* keys"""
+    totals = {metric: _empty_stats() for metric in METRICS}
+    entries = 0
+    for bucket in buckets:
+        entries += bucket.get('entries', 0)
+        for metric, stats in (bucket.get('metrics') or {}).items():
+            if metric in totals:
+                _merge(totals[metric], stats)
+
+    analytics = {'total_entries': entries, 'metrics': {}}
+    for metric, total in totals.items():
+        avg = total['sum'] / total['count'] if total['count'] else None
+        analytics[AVERAGE_KEYS[metric]] = avg
+        analytics['metrics'][metric] = {
+            'avg': avg, 'min': total['min'], 'max': total['max'], 'count': total['count'],
+        }
+    return analytics
+
+
+def daily_trends(collection, user_id, gen, days, window=7, now=None):
+    """Per-metric daily means, trailing rolling average and least-squares slope per day
+
+    Covers the same open-ended window as ``window_buckets``.
+    """
+    if gen is None:
+        return {metric: {'series': [], 'slope_per_day': None} for metric in METRICS}
+    today = day_start(now or datetime.now(timezone.utc))
+    start = today - timedelta(days=days)
+    buckets = list(collection.find(
+        {'user_id': user_id, 'gen': gen, 'granularity': DAY, 'bucket_start': {'$gte': start}}
+    ).sort('bucket_start', 1))
+
+    trends = {}
+    for metric in METRICS:
+        points = []
+        for bucket in buckets:
+            stats = (bucket.get('metrics') or {}).get(metric)
+            if stats and stats.get('count'):
+                points.append(((bucket['bucket_start'] - start).days, bucket['bucket_start'],
+                               stats['sum'] / stats['count']))
+        series = []
+        for i, (offset, date, mean) in enumerate(points):
+            recent = [p[2] for p in points[:i + 1] if offset - p[0] < window]
+            series.append({
+                'date': date.date().isoformat(),
+                'value': round(mean, 3),
+                'rolling_avg': round(sum(recent) / len(recent), 3),
+            })
+        trends[metric] = {'series': series, 'slope_per_day': _slope([(p[0], p[2]) for p in points])}
+    return trends
+
+
+def _slope(points):
+    n = len(points)
+    if n < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if not var_x:
+        return None
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    return round(cov / var_x, 5)
+
+
+def main():
+    import os
+
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    db = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017')).satvic_diet_planner
+    user_ids = db.progress.distinct('user_id')
+    skipped = [user_id for user_id in user_ids if rebuild_user(db, user_id) is None]
+    for user_id in skipped:
+        logger.warning(f"Rollups for user {user_id} not rebuilt (locked or busy); the next read rebuilds them")
+    logger.info(f"✅ Rebuilt progress rollups for {len(user_ids) - len(skipped)}/{len(user_ids)} users")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
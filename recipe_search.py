@@ -0,0 +1,110 @@
+"""Ranked recipe search backed by a MongoDB text index.
+
+``$regex`` clauses with the ``i`` option can't use an index, so every search
+used to scan the whole collection. Searches now go through a weighted text
+index and are sorted by relevance. If the index is missing (a fresh database
+the provisioning hasn't reached yet), it is created on demand, and only
+if that fails do we fall back to an escaped, case-insensitive regex.
+
+Pages are keyset-paginated: ranked results on (text score, _id), everything
+else on _id.
+"""
+import logging
+import re
+
+from pymongo.errors import OperationFailure
+
+from pagination import ASC, DESC, decode_cursor, keyset_filter, page_result, paginate
+
+logger = logging.getLogger(__name__)
+
+TEXT_INDEX_NAME = 'recipes_text'
+TEXT_INDEX_KEYS = [('name', 'text'), ('description', 'text'), ('ingredients', 'text')]
+TEXT_INDEX_WEIGHTS = {'name': 10, 'ingredients': 5, 'description': 2}
+
+# Mongo error code for "text index required for $text query"
+INDEX_NOT_FOUND = 27
+
+MAX_SEARCH_LENGTH = 100
+
+ID_SORT = [('_id', ASC)]
+SCORE_SORT = [('_score', DESC), ('_id', ASC)]
+
+
+def ensure_text_index(collection):
+    """Create the weighted recipe text index (idempotent)"""
+    try:
+        collection.create_index(
+            TEXT_INDEX_KEYS,
+            name=TEXT_INDEX_NAME,
+            weights=TEXT_INDEX_WEIGHTS,
+            default_language='english',
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Recipe text index unavailable: {e}")
+        return False
+
+
+def sanitize_search(search):
+    """Strip $text operators (quoted phrases, negation) so input is matched as plain terms"""
+    search = (search or '')[:MAX_SEARCH_LENGTH]
+    terms = [t.lstrip('-') for t in search.replace('"', ' ').split()]
+    return ' '.join(t for t in terms if t)
+
+
+def _text_pipeline(filters, search, after, limit, projection=None):
+    match = dict(filters)
+    match['$text'] = {'$search': search}
+    pipeline = [
+        {'$match': match},
+        {'$addFields': {'_score': {'$meta': 'textScore'}}},
+    ]
+    if after is not None:
+        pipeline.append({'$match': keyset_filter(SCORE_SORT, after)})
+    pipeline += [
+        {'$sort': {'_score': -1, '_id': 1}},
+        {'$limit': limit},
+    ]
+    if projection:
+        pipeline.append({'$project': dict(projection, _score=1)})
+    return pipeline
+
+
+def _regex_query(filters, search):
+    pattern = re.escape(search)
+    query = dict(filters)
+    query['$or'] = [
+        {'name': {'$regex': pattern, '$options': 'i'}},
+        {'description': {'$regex': pattern, '$options': 'i'}},
+        {'ingredients': {'$regex': pattern, '$options': 'i'}},
+    ]
+    return query
+
+
+def search_recipes(collection, search, filters, limit=20, cursor=None, projection=None):
+    """Return one page of recipes matching ``search``, best matches first.
+
+    ``projection`` limits the returned fields (None for whole documents).
+    Returns ``(recipes, next_cursor)``; raises InvalidCursor for a bad cursor.
+    """
+    terms = sanitize_search(search)
+    if not terms:
+        return paginate(collection, filters, ID_SORT, limit, cursor, projection)
+
+    after = decode_cursor(cursor, len(SCORE_SORT)) if cursor else None
+    for attempt in range(2):
+        try:
+            docs = list(collection.aggregate(_text_pipeline(filters, terms, after, limit + 1, projection)))
+            docs, next_cursor = page_result(docs, SCORE_SORT, limit)
+            for doc in docs:
+                doc.pop('_score', None)
+            return docs, next_cursor
+        except OperationFailure as e:
+            if e.code != INDEX_NOT_FOUND or attempt or not ensure_text_index(collection):
+                logger.warning(f"Text search unavailable, falling back to regex: {e}")
+                break
+
+    # Unranked: a score cursor from an earlier page restarts from the top
+    return paginate(collection, _regex_query(filters, search.strip()[:MAX_SEARCH_LENGTH]), ID_SORT, limit,
+                    cursor if after is None else None, projection)
@@ -0,0 +1,75 @@
+"""Measure worker cold-start time: how long `import app` takes in a fresh interpreter.
+
+Usage:
+    python scripts/bench_cold_start.py [--runs 10] [--output cold_start.json]
+
+Each run spawns a new Python process (as a gunicorn worker would) and times
+the import of the Flask app, including the Gemini client setup. The startup
+probe is disabled so the number reflects what blocks a worker before it can
+accept traffic.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = (
+    "import time; t = time.perf_counter(); import app; "
+    "print(round((time.perf_counter() - t) * 1000, 2))"
+)
+
+
+def run_once(env):
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, '-c', SNIPPET],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    process_ms = (time.perf_counter() - started) * 1000
+    import_ms = float(out.stdout.strip().splitlines()[-1])
+    return import_ms, process_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('GEMINI_API_KEY', 'bench-placeholder-key')
+    env.setdefault('MONGODB_URI', 'mongodb://127.0.0.1:27017/satvic')
+    env['AI_STARTUP_PROBE'] = '0'
+
+    import_times, process_times = [], []
+    for _ in range(args.runs):
+        import_ms, process_ms = run_once(env)
+        import_times.append(import_ms)
+        process_times.append(process_ms)
+
+    result = {
+        'runs': args.runs,
+        'import_ms': {
+            'median': round(statistics.median(import_times), 2),
+            'min': round(min(import_times), 2),
+            'max': round(max(import_times), 2),
+        },
+        'process_ms': {
+            'median': round(statistics.median(process_times), 2),
+            'min': round(min(process_times), 2),
+            'max': round(max(process_times), 2),
+        },
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
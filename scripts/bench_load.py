@@ -0,0 +1,389 @@
+"""Load test: drive a realistic request mix at a target rate and report latency percentiles.
+
+Usage:
+    python scripts/bench_load.py [--rps 40] [--duration 30] [--warmup 5]
+        [--mix login=5,recipes=35,meal_plan_save=15,progress_add=20,progress_list=15,ai_chat=10]
+        [--mongo memory|mongodb://localhost:27017/satvic_bench]
+        [--gemini-latency 0.8] [--gemini-error-rate 0.02]
+        [--output load.json] [--baseline previous.json]
+    python scripts/bench_load.py --url http://localhost:3000 ...
+
+By default the app is booted in this process on a threaded WSGI server with
+Gemini replaced by scripts/fake_gemini.py and MongoDB replaced by mongomock
+(``pip install mongomock``), or pointed at a real mongod with --mongo <uri>.
+With --url the harness only generates load against a running server, which
+brings its own MongoDB and Gemini. mongomock has no text search, so with the
+in-memory stand-in the recipe scenario browses by meal type instead.
+
+Arrivals are open-loop (Poisson at --rps), and latency is measured from each
+request's scheduled start, so queueing under overload shows up in the
+percentiles instead of slowing the generator down. The seed fixes arrivals,
+the mix and the fake Gemini's latency/errors, so two runs differ only by the
+code under test. The JSON (sorted keys) is meant to be diffed between
+versions; --baseline adds p50/p95/p99 deltas against an earlier run.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = 'login=5,recipes=35,meal_plan_save=15,progress_add=20,progress_list=15,ai_chat=10'
+PASSWORD = 'bench-password'
+
+SEARCH_TERMS = ['dal', 'khichdi', 'soup', 'salad', 'poha', 'upma', 'smoothie', 'sprouts', 'millet', 'curry',
+                'porridge', 'chutney']
+RECIPE_WORDS = ['Moong', 'Masoor', 'Lauki', 'Palak', 'Millet', 'Coconut', 'Ragi', 'Jowar', 'Beetroot', 'Pumpkin']
+RECIPE_KINDS = ['Dal', 'Khichdi', 'Soup', 'Salad', 'Poha', 'Upma', 'Smoothie', 'Curry', 'Porridge', 'Chutney']
+CHAT_MESSAGES = [f'What should I eat {when} if I want {goal}?'
+                 for when in ('for breakfast', 'after a workout', 'for dinner', 'when travelling', 'in summer')
+                 for goal in ('more energy', 'better sleep', 'to lose weight', 'better digestion', 'more protein',
+                              'clearer skin')]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))} (known: {', '.join(SCENARIOS)})")
+    return mix
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0), len(sorted_values) - 1)
+    return round(sorted_values[index] * 1000, 2)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Client:
+    """Minimal JSON-over-HTTP client (one connection per request, like browsers behind nginx)"""
+
+    def __init__(self, base_url, timeout=60):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Accept': 'application/json'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(method, path, payload, headers)
+            response = connection.getresponse()
+            data = response.read()
+            return response.status, data
+        finally:
+            connection.close()
+
+
+class Workload:
+    """Users, seeded recipes and per-scenario request builders"""
+
+    def __init__(self, client, seed, text_search=True):
+        self.client = client
+        self.text_search = text_search
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.users = []
+        self._progress_days = {}
+
+    def pick(self, values):
+        with self._lock:
+            return self.random.choice(values)
+
+    def setup(self, users, recipes):
+        run = f'{int(time.time())}-{os.getpid()}'
+        for i in range(users):
+            email = f'bench-{run}-{i}@example.com'
+            status, data = self.client.request('POST', '/api/auth/register',
+                                               {'name': f'Bench User {i}', 'email': email, 'password': PASSWORD})
+            if status != 201:
+                raise SystemExit(f'Registering {email} failed: {status} {data[:200]!r}')
+            self.users.append({'email': email, 'token': json.loads(data)['data']['token']})
+            self._progress_days[email] = itertools.count()
+        token = self.users[0]['token']
+        for i in range(recipes):
+            name = f'{RECIPE_WORDS[i % len(RECIPE_WORDS)]} {RECIPE_KINDS[(i // len(RECIPE_WORDS)) % len(RECIPE_KINDS)]} {i}'
+            status, data = self.client.request('POST', '/api/recipes', {
+                'name': name,
+                'description': f'A light satvic {name.lower()} with seasonal vegetables.',
+                'ingredients': ['moong dal', 'rice', 'ghee', 'cumin', 'spinach'],
+                'instructions': ['Rinse', 'Cook', 'Temper', 'Serve'],
+                'meal_type': ('breakfast', 'lunch', 'dinner', 'snack')[i % 4],
+                'cooking_time': 10 + (i % 5) * 10,
+            }, token)
+            if status != 201:
+                raise SystemExit(f'Seeding recipes failed: {status} {data[:200]!r}')
+
+    # Scenarios: each returns (method, path, body, token)
+    def login(self):
+        user = self.pick(self.users)
+        return 'POST', '/api/auth/login', {'email': user['email'], 'password': PASSWORD}, None
+
+    def recipes(self):
+        if not self.text_search:
+            meal_type = self.pick(('breakfast', 'lunch', 'dinner', 'snack'))
+            return 'GET', f'/api/recipes?meal_type={meal_type}&limit=20', None, self.pick(self.users)['token']
+        term = self.pick(SEARCH_TERMS)
+        return 'GET', f'/api/recipes?search={quote(term)}&limit=20', None, self.pick(self.users)['token']
+
+    def meal_plan_save(self):
+        user = self.pick(self.users)
+        day = datetime.now(timezone.utc).date() + timedelta(days=self.pick(range(30)))
+        return 'POST', '/api/meal-plans', {
+            'date': day.isoformat(),
+            'breakfast': {'name': 'Fruit Bowl', 'description': 'Seasonal fruits with seeds'},
+            'lunch': {'name': 'Vegetable Khichdi', 'description': 'Comforting one-pot meal'},
+            'dinner': {'name': 'Moong Dal Soup', 'description': 'Light dal soup'},
+            'snacks': [{'name': 'Soaked Almonds'}],
+            'focus_area': 'balanced',
+        }, user['token']
+
+    def progress_add(self):
+        user = self.pick(self.users)
+        # A fresh day per entry: the API rejects a second entry for the same day
+        with self._lock:
+            offset = next(self._progress_days[user['email']])
+        day = datetime(2020, 1, 1) + timedelta(days=offset)
+        return 'POST', '/api/progress', {
+            'date': day.date().isoformat(),
+            'weight': round(self.random.uniform(55, 80), 1),
+            'energy_level': self.random.randint(1, 10),
+            'mood': self.random.randint(1, 10),
+            'sleep_quality': self.random.randint(1, 10),
+        }, user['token']
+
+    def progress_list(self):
+        return 'GET', '/api/progress?limit=20', None, self.pick(self.users)['token']
+
+    def ai_chat(self):
+        return 'POST', '/api/ai/chat', {'message': self.pick(CHAT_MESSAGES)}, self.pick(self.users)['token']
+
+
+SCENARIOS = ('login', 'recipes', 'meal_plan_save', 'progress_add', 'progress_list', 'ai_chat')
+
+
+def boot_app(args):
+    """Import app.py with the fake Gemini (and mongomock unless --mongo is a URI); serve it on a local port"""
+    os.environ['GEMINI_API_KEY'] = 'bench-fake-key'
+    os.environ['AI_STARTUP_PROBE'] = '0'
+    if args.mongo == 'memory':
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit('--mongo memory needs mongomock (pip install mongomock), or pass --mongo <uri>')
+        import pymongo
+
+        pymongo.MongoClient = mongomock.MongoClient
+        # mongomock ignores partial index filters, which would reject valid meal plan documents
+        os.environ['DB_ENSURE_INDEXES'] = '0'
+    else:
+        os.environ['MONGODB_URI'] = args.mongo
+
+    import logging
+
+    from werkzeug.serving import make_server
+
+    from fake_gemini import FakeGenerativeModel
+
+    import app as appmod
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    fake = FakeGenerativeModel(latency=args.gemini_latency, error_rate=args.gemini_error_rate, seed=args.seed)
+    appmod.ai_client._model = fake
+    appmod.ai_client._json_mode = False
+
+    server = make_server('127.0.0.1', 0, appmod.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-server', daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', fake, server
+
+
+def run_load(workload, client, mix, rps, duration, warmup, concurrency, seed):
+    """Open-loop Poisson arrivals; returns {scenario: [(latency, service_time, status)]} after warmup"""
+    arrivals = random.Random(seed + 1)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = {name: [] for name in names}
+    lock = threading.Lock()
+
+    def fire(name, scheduled, method, path, body, token):
+        started = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, body, token)
+        except Exception:
+            status = 0
+        finished = time.perf_counter()
+        if scheduled - begin >= warmup:
+            with lock:
+                results[name].append((finished - scheduled, finished - started, status))
+
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bench-client')
+    begin = time.perf_counter()
+    at = begin
+    end = begin + warmup + duration
+    while True:
+        at += arrivals.expovariate(rps)
+        if at >= end:
+            break
+        delay = at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        name = arrivals.choices(names, weights)[0]
+        method, path, body, token = getattr(workload, name)()
+        pool.submit(fire, name, at, method, path, body, token)
+    pool.shutdown(wait=True)
+    return results
+
+
+def summarize(samples, duration):
+    latencies = sorted(sample[0] for sample in samples)
+    service = sorted(sample[1] for sample in samples)
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / duration, 2),
+        'ok': sum(1 for sample in samples if 200 <= sample[2] < 400),
+        'client_errors': sum(1 for sample in samples if 400 <= sample[2] < 500),
+        'server_errors': sum(1 for sample in samples if sample[2] >= 500 or sample[2] == 0),
+        'status_counts': statuses,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': round(latencies[-1] * 1000, 2) if latencies else None,
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        },
+        'service_ms': {
+            'p50': percentile(service, 50),
+            'p95': percentile(service, 95),
+            'p99': percentile(service, 99),
+        },
+    }
+
+
+def compare(result, baseline):
+    """Percentile deltas (ms and %) against an earlier result, per endpoint"""
+    deltas = {}
+    for name, current in dict(result['endpoints'], overall=result['overall']).items():
+        previous = baseline.get('overall') if name == 'overall' else baseline.get('endpoints', {}).get(name)
+        if not previous:
+            continue
+        deltas[name] = {}
+        for q in ('p50', 'p95', 'p99'):
+            now, before = current['latency_ms'][q], previous['latency_ms'].get(q)
+            if now is None or not before:
+                continue
+            deltas[name][q] = {'ms': round(now - before, 2), 'pct': round((now - before) / before * 100, 1)}
+    return {'commit': baseline.get('environment', {}).get('commit'), 'latency_delta': deltas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='target a running server instead of booting app.py in-process')
+    parser.add_argument('--mongo', default='memory', help='"memory" (mongomock) or a MongoDB URI')
+    parser.add_argument('--rps', type=float, default=40)
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of load before measuring')
+    parser.add_argument('--concurrency', type=int, default=64, help='client threads')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='scenario=weight list')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--recipes', type=int, default=200, help='recipes seeded before the run')
+    parser.add_argument('--gemini-latency', type=float, default=0.8, help='median fake Gemini latency (s)')
+    parser.add_argument('--gemini-error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    fake = server = None
+    base_url = args.url
+    if not base_url:
+        base_url, fake, server = boot_app(args)
+    client = Client(base_url)
+    # mongomock has no $text, so the in-memory run browses recipes by meal type instead of searching
+    text_search = bool(args.url) or args.mongo != 'memory'
+    workload = Workload(client, args.seed, text_search)
+    workload.setup(args.users, args.recipes)
+
+    started_at = datetime.now(timezone.utc)
+    results = run_load(workload, client, mix, args.rps, args.duration, args.warmup, args.concurrency, args.seed)
+    if server is not None:
+        server.shutdown()
+
+    result = {
+        'config': {
+            'target': 'in-process' if not args.url else args.url,
+            'mongo': args.mongo if not args.url else 'server',
+            'rps': args.rps,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'concurrency': args.concurrency,
+            'mix': mix,
+            'users': args.users,
+            'recipes': args.recipes,
+            'recipe_text_search': text_search,
+            'gemini_latency_s': args.gemini_latency if fake else None,
+            'gemini_error_rate': args.gemini_error_rate if fake else None,
+            'seed': args.seed,
+        },
+        'environment': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'started_at': started_at.isoformat(),
+        },
+        'endpoints': {name: summarize(samples, args.duration) for name, samples in results.items()},
+        'overall': summarize([sample for samples in results.values() for sample in samples], args.duration),
+    }
+    if fake is not None:
+        result['fake_gemini'] = {'calls': fake.calls, 'errors': fake.errors}
+    if args.baseline:
+        with open(args.baseline) as fh:
+            result['baseline'] = compare(result, json.load(fh))
+
+    text = json.dumps(result, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
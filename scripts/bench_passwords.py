@@ -0,0 +1,87 @@
+"""Benchmark password hashing: registrations and logins per second per core.
+
+Usage:
+    python scripts/bench_passwords.py [--iterations 10] [--output passwords.json]
+
+"before" mirrors the original handlers: register computed both a werkzeug
+hash and a bcrypt hash (rounds=12); login verified the werkzeug hash first
+and, when that failed, the bcrypt hash as well. "after" is passwords.py:
+one bcrypt hash at PASSWORD_BCRYPT_ROUNDS, and a single bcrypt check per
+login once the account has been migrated. Timings are single-threaded CPU time, so the rates are per core.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import bcrypt
+from werkzeug.security import check_password_hash, generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('PASSWORD_HASH_POOL', 'inline')
+
+import passwords  # noqa: E402
+
+PASSWORD = 'correct horse battery'
+
+
+def per_second(fn, iterations):
+    fn()
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.process_time() - started
+    return round(iterations / elapsed, 2) if elapsed else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    werkzeug_hash = generate_password_hash(PASSWORD)
+    bcrypt_hash = passwords.hash_password(PASSWORD)
+    migrated_user = {'password_hash': bcrypt_hash}
+
+    def register_before():
+        generate_password_hash(PASSWORD)
+        bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=12))
+
+    def login_before():
+        check_password_hash(werkzeug_hash, PASSWORD)
+
+    def failed_login_before():
+        check_password_hash(werkzeug_hash, 'wrong password')
+        bcrypt.checkpw(b'wrong password', bcrypt_hash.encode('utf-8'))
+
+    def failed_login_after():
+        passwords.verify_password(migrated_user, 'wrong password')
+
+    def register_after():
+        passwords.hash_password(PASSWORD)
+
+    def login_after():
+        passwords.verify_password(migrated_user, PASSWORD)
+
+    result = {
+        'bcrypt_rounds': passwords.BCRYPT_ROUNDS,
+        'werkzeug_method': werkzeug_hash.split('$', 1)[0],
+        'per_core_per_second': {
+            'register_before': per_second(register_before, args.iterations),
+            'register_after': per_second(register_after, args.iterations),
+            'login_before': per_second(login_before, args.iterations),
+            'login_after': per_second(login_after, args.iterations),
+            'failed_login_before': per_second(failed_login_before, args.iterations),
+            'failed_login_after': per_second(failed_login_after, args.iterations),
+        },
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Microbenchmark: the original recursive serialize_doc + json.dumps versus json_encoder.dumps.
+
+Usage:
+    python scripts/bench_serialize.py [--iterations 500] [--output serialize.json]
+
+Payloads mirror the list endpoints: 10 generated meal plans, 90 progress
+entries and 50 recipes with ingredient/instruction lists.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_encoder  # noqa: E402
+
+
+def serialize_doc(doc):
+    """The recursive isinstance-based converter app.py used before json_encoder"""
+    if doc is None:
+        return None
+    if isinstance(doc, list):
+        return [serialize_doc(item) for item in doc]
+    if isinstance(doc, dict):
+        result = {}
+        for key, value in doc.items():
+            if key == '_id':
+                result['id'] = str(value)
+            elif isinstance(value, ObjectId):
+                result[key] = str(value)
+            elif isinstance(value, datetime):
+                result[key] = value.isoformat()
+            elif isinstance(value, dict):
+                result[key] = serialize_doc(value)
+            elif isinstance(value, list):
+                result[key] = serialize_doc(value)
+            else:
+                result[key] = value
+        return result
+    return doc
+
+
+def sample_payloads():
+    user_id = ObjectId()
+    now = datetime.now(timezone.utc)
+    meal_plans = [{
+        '_id': ObjectId(), 'user_id': user_id, 'period': 'week', 'focus': 'balanced',
+        'content': 'Day 1\nBreakfast: Oats porridge with fruit...\n' * 60,
+        'generated_at': now - timedelta(days=i), 'status': 'active',
+    } for i in range(10)]
+    progress = [{
+        '_id': ObjectId(), 'user_id': user_id, 'date': now - timedelta(days=i),
+        'weight': 70.5 - i * 0.05, 'energy_level': 7, 'mood': 8, 'sleep_quality': 6,
+        'water_intake': 2.5, 'exercise_minutes': 30, 'notes': 'Felt light after khichdi',
+        'created_at': now,
+    } for i in range(90)]
+    recipes = [{
+        '_id': ObjectId(), 'name': f'Satvic Recipe {i}', 'description': 'A light, warming dish.',
+        'ingredients': [f'{j + 1} tsp ingredient {j}' for j in range(12)],
+        'instructions': [f'Step {j + 1}: stir gently and simmer.' for j in range(8)],
+        'dosha_benefits': {'vata': 'balancing', 'pitta': 'cooling', 'kapha': 'light'},
+        'meal_type': 'lunch', 'cooking_time': 25, 'difficulty_level': 'easy',
+        'nutritional_info': {'calories': 320, 'protein': 12, 'carbs': 48, 'fat': 8},
+        'seasonal_tags': ['summer', 'monsoon'], 'created_at': now,
+    } for i in range(50)]
+    return {
+        'meal_plans': {'data': {'meal_plans': meal_plans, 'count': 10}},
+        'progress': {'data': {'progress': progress, 'count': 90}},
+        'recipes': {'data': {'recipes': recipes, 'count': 50}},
+    }
+
+
+def legacy(payload):
+    data = {k: serialize_doc(v) if isinstance(v, list) else v for k, v in payload['data'].items()}
+    return json.dumps({'data': data}).encode('utf-8')
+
+
+def bench(fn, payload, iterations):
+    fn(payload)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(payload)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output', help='write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = {'backend': json_encoder.BACKEND, 'iterations': args.iterations, 'payloads': {}}
+    for name, payload in sample_payloads().items():
+        assert json.loads(legacy(payload)) == json.loads(json_encoder.dumps(payload)), name
+        before = bench(legacy, payload, args.iterations)
+        after = bench(json_encoder.dumps, payload, args.iterations)
+        results['payloads'][name] = {
+            'serialize_doc_us': round(before, 1),
+            'json_encoder_us': round(after, 1),
+            'speedup': round(before / after, 2),
+        }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Stand-in for ``google.generativeai.GenerativeModel`` used by the benchmarks.
+
+Latency is drawn from a lognormal around ``latency`` seconds, a fraction
+``error_rate`` of calls raise ServiceUnavailable (named like the
+google.api_core error, so ai_gateway retries it), and replies are canned by
+what the prompt asks for: a structured meal plan, a JSON list of recipes,
+a shopping list, or an HTML answer. Seeded, so runs are repeatable.
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+
+
+class ServiceUnavailable(Exception):
+    """503 from the fake upstream"""
+
+
+class FakeResponse:
+    def __init__(self, text, prompt):
+        self.text = text
+        self.usage_metadata = _Usage(len(prompt) // 4, len(text) // 4)
+
+
+class _Usage:
+    def __init__(self, prompt_tokens, response_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = response_tokens
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+def _meal(slot, name):
+    return {
+        'slot': slot,
+        'name': name,
+        'description': f'{name} made with seasonal vegetables.',
+        'ingredients': [
+            {'name': 'moong dal', 'quantity': 60, 'unit': 'g'},
+            {'name': 'rice', 'quantity': 80, 'unit': 'g'},
+            {'name': 'spinach', 'quantity': 1, 'unit': 'cup'},
+            {'name': 'ghee', 'quantity': 1, 'unit': 'tsp'},
+        ],
+        'nutrients': {'calories': 420, 'protein_g': 16, 'carbs_g': 68, 'fat_g': 8, 'fiber_g': 9},
+    }
+
+
+def meal_plan_reply(prompt):
+    match = re.search(r'Include (\d+) day', prompt)
+    days = int(match.group(1)) if match else 7
+    period = re.search(r'"period": "([^"]+)"', prompt)
+    return json.dumps({
+        'period': period.group(1) if period else 'week',
+        'days': [
+            {'day': day, 'meals': [
+                _meal('breakfast', 'Fruit Bowl'), _meal('lunch', 'Vegetable Khichdi'),
+                _meal('dinner', 'Moong Dal Soup'), _meal('snack', 'Soaked Almonds'), _meal('snack', 'Coconut Water'),
+            ]}
+            for day in range(1, days + 1)
+        ],
+    })
+
+
+def recipes_reply():
+    return json.dumps([
+        {'name': f'Satvic Bowl {i}', 'description': 'Light and quick.', 'meal_type': 'lunch', 'cooking_time': 20,
+         'ingredients': ['rice', 'moong dal', 'ghee'], 'instructions': ['Rinse', 'Cook', 'Serve']}
+        for i in range(1, 7)
+    ])
+
+
+def shopping_reply():
+    return json.dumps({
+        'summary': {'budget_inr': 1000, 'estimated_cost_inr': 640, 'under_budget': True, 'note': 'Staples first.'},
+        'items': [{'name': 'moong dal', 'quantity': 1, 'unit': 'kg', 'approx_price_inr': 140,
+                   'category': 'protein', 'priority': 'high'}],
+    })
+
+
+HTML_REPLY = ('<p>Start your day with warm water and seasonal fruit. Keep lunch as the largest meal.</p>'
+              '<ul><li>Eat before sunset</li><li>Prefer whole grains</li><li>Add raw vegetables daily</li></ul>')
+
+
+def canned_reply(prompt):
+    if '"days"' in prompt:
+        return meal_plan_reply(prompt)
+    if 'recipe suggestions' in prompt:
+        return recipes_reply()
+    if 'shopping planner' in prompt:
+        return shopping_reply()
+    return HTML_REPLY
+
+
+class FakeGenerativeModel:
+    def __init__(self, latency=0.8, jitter=0.35, error_rate=0.0, seed=7, chunk_size=40):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunk_size = chunk_size
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            # lognormal with median `latency`
+            delay = self.latency * math.exp(self._random.gauss(0, self.jitter)) if self.latency > 0 else 0
+        return delay, fail
+
+    def generate_content(self, contents, *, generation_config=None, safety_settings=None, stream=False, **kwargs):
+        prompt = contents if isinstance(contents, str) else str(contents)
+        delay, fail = self._draw()
+        if not stream:
+            time.sleep(delay)
+            if fail:
+                raise ServiceUnavailable('503 The model is overloaded. Please try again later.')
+            return FakeResponse(canned_reply(prompt), prompt)
+
+        # First chunk after a third of the latency, the rest spread over the remainder
+        text = canned_reply(prompt)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        time.sleep(delay / 3)
+        if fail:
+            raise ServiceUnavailable('503 The model is overloaded. Please try again later.')
+
+        def iterate():
+            for i, chunk in enumerate(chunks):
+                if i:
+                    time.sleep(delay * 2 / 3 / max(len(chunks) - 1, 1))
+                yield _Chunk(chunk)
+
+        return iterate()
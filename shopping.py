@@ -0,0 +1,274 @@
+"""Deterministic shopping lists built from stored meal plans.
+
+Ingredients are read from the structured plans (and from linked recipes
+when a meal has none), matched against the ingredient catalog, converted to
+base units (g, ml, pcs), summed and rounded up to whole packs at catalog
+prices. When a budget is given, the list is chosen with a 0/1 knapsack over
+priority and price rather than by trimming in order, and items that don't
+fit are returned as ``skipped``. No Gemini call is involved, so the same
+plans always produce the same list.
+"""
+import math
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import meal_plan_schema
+
+# unit -> (dimension, factor to the base unit of that dimension)
+UNITS = {
+    'g': ('mass', 1.0), 'kg': ('mass', 1000.0),
+    'ml': ('volume', 1.0), 'l': ('volume', 1000.0),
+    'tsp': ('volume', 5.0), 'tbsp': ('volume', 15.0), 'cup': ('volume', 240.0),
+    'pcs': ('count', 1.0), 'bunch': ('count', 1.0), 'pack': ('count', 1.0),
+    'pinch': ('mass', 0.5),
+}
+BASE_UNITS = {'mass': 'g', 'volume': 'ml', 'count': 'pcs'}
+
+CATEGORY_ORDER = ('produce', 'grains', 'protein', 'dairy', 'spices', 'pantry', 'other')
+PRIORITY_WEIGHT = {'high': 10, 'medium': 4, 'low': 1}
+
+# Never worth putting on a list
+SKIP = frozenset({'water', 'hot water', 'warm water', 'ice', 'ice cubes'})
+
+# (dimension, pack size, pack price INR, priority) for ingredients missing from the catalog
+UNKNOWN = ('count', 1, 50, 'low')
+
+
+def to_base(quantity, unit, ingredient=None, dimension=None):
+    """Amount in the base unit of the ingredient's dimension, or None if it can't be converted"""
+    if quantity is None:
+        return None
+    dimension = ingredient.dimension if ingredient is not None else dimension
+    unit_dimension, factor = UNITS.get(unit or 'pcs', (None, None))
+    if unit_dimension == dimension:
+        return quantity * factor
+    # Kitchen measures of solids: close enough at 1 g per ml for shopping
+    if {unit_dimension, dimension} == {'mass', 'volume'}:
+        return quantity * factor
+    # "2 onions" for an ingredient sold by weight
+    if unit_dimension == 'count' and dimension == 'mass' and ingredient is not None and ingredient.piece_weight_g:
+        return quantity * ingredient.piece_weight_g
+    return None
+
+
+def _display(amount, dimension):
+    """(quantity, unit) in the unit a shopper would expect"""
+    if dimension == 'mass' and amount >= 1000:
+        return round(amount / 1000, 2), 'kg'
+    if dimension == 'volume' and amount >= 1000:
+        return round(amount / 1000, 2), 'L'
+    return round(amount, 1), BASE_UNITS[dimension]
+
+
+def _clean_name(name):
+    for phrase in (' to taste', ' as needed', ' (optional)', ', chopped', ', sliced', ', grated'):
+        name = name.replace(phrase, '')
+    return name.strip()
+
+
+def aggregate(ingredients, catalog, servings=1, region=None):
+    """Sum ingredient dicts per catalog item and price them in whole packs"""
+    totals = {}
+    for raw in ingredients:
+        name = _clean_name(raw['name'])
+        if not name or name in SKIP:
+            continue
+        ingredient = catalog.match(name)
+        if ingredient is None:
+            dimension, pack_size, pack_price, priority = UNKNOWN
+            key, category = name, 'other'
+        else:
+            dimension, pack_size, pack_price, priority = (ingredient.dimension, ingredient.pack_size,
+                                                          ingredient.price(region), ingredient.priority)
+            key, category = ingredient.name, ingredient.category
+        item = totals.setdefault(key, {
+            'name': key, 'category': category, 'dimension': dimension, 'pack_size': pack_size,
+            'pack_price': pack_price, 'priority': priority, 'amount': 0.0, 'uses': 0, 'priced': ingredient is not None,
+        })
+        item['uses'] += 1
+        amount = to_base(raw.get('quantity'), raw.get('unit'), ingredient, dimension)
+        if amount:
+            item['amount'] += amount * servings
+
+    items = []
+    for item in totals.values():
+        packs = max(math.ceil(item['amount'] / item['pack_size'] - 1e-9), 1)
+        quantity, unit = _display(max(item['amount'], packs * item['pack_size']), item['dimension'])
+        items.append({
+            'name': item['name'],
+            'quantity': quantity,
+            'unit': unit,
+            'approx_price_inr': int(round(packs * item['pack_price'])),
+            'category': item['category'],
+            'priority': item['priority'],
+            'uses': item['uses'],
+            'price_source': 'catalog' if item['priced'] else 'estimate',
+        })
+    return sort_items(items)
+
+
+def staple_items(catalog, goal='', region=None):
+    """One pack of every staple plus catalog ingredients named in ``goal`` (by name or synonym)"""
+    chosen = {ingredient.name: ingredient for ingredient in catalog.staples()}
+    words = goal.lower().split()
+    for size in (3, 2, 1):
+        for i in range(len(words) - size + 1):
+            ingredient = catalog.get(' '.join(words[i:i + size]))
+            if ingredient is not None:
+                chosen.setdefault(ingredient.name, ingredient)
+    items = []
+    for ingredient in chosen.values():
+        quantity, unit = _display(ingredient.pack_size, ingredient.dimension)
+        items.append({
+            'name': ingredient.name,
+            'quantity': quantity,
+            'unit': unit,
+            'approx_price_inr': int(round(ingredient.price(region))),
+            'category': ingredient.category,
+            'priority': ingredient.priority,
+        })
+    return sort_items(items)
+
+
+def sort_items(items):
+    order = {category: i for i, category in enumerate(CATEGORY_ORDER)}
+    return sorted(items, key=lambda item: (order.get(item.get('category'), len(order)), item['name']))
+
+
+def knapsack(items, budget, resolution=None):
+    """Pick the items with the highest total priority value whose prices fit ``budget``.
+
+    Prices are bucketed to ``resolution`` rupees (rounded up, so the pick never
+    exceeds the budget) to keep the table small. Returns ``(chosen, skipped)``
+    in the original order.
+    """
+    budget = int(budget)
+    resolution = resolution or max(1, budget // 2000)
+    capacity = budget // resolution
+    costs = [math.ceil(float(item.get('approx_price_inr') or 0) / resolution) for item in items]
+    values = [PRIORITY_WEIGHT.get(item.get('priority'), 1) * (1 + item.get('uses', 0)) for item in items]
+
+    best = [0] * (capacity + 1)
+    keep = []
+    for cost, value in zip(costs, values):
+        taken = bytearray(capacity + 1)
+        if cost <= capacity:
+            for c in range(capacity, cost - 1, -1):
+                candidate = best[c - cost] + value
+                if candidate > best[c]:
+                    best[c] = candidate
+                    taken[c] = 1
+        keep.append(taken)
+
+    chosen = set()
+    c = capacity
+    for i in range(len(items) - 1, -1, -1):
+        if keep[i][c]:
+            chosen.add(i)
+            c -= costs[i]
+    return ([item for i, item in enumerate(items) if i in chosen],
+            [item for i, item in enumerate(items) if i not in chosen])
+
+
+def summarize(items, budget=None, skipped=(), note=''):
+    total = sum(float(item.get('approx_price_inr') or 0) for item in items)
+    by_category = {}
+    for item in items:
+        category = item.get('category') or 'other'
+        by_category[category] = by_category.get(category, 0) + float(item.get('approx_price_inr') or 0)
+    return {
+        'budget_inr': int(budget) if budget else None,
+        'estimated_cost_inr': int(round(total)),
+        'under_budget': total <= budget if budget else None,
+        'by_category': {category: int(round(cost)) for category, cost in by_category.items()},
+        'skipped_count': len(skipped),
+        'note': note,
+    }
+
+
+def plan_meals(db, user_id, plan_ids=None, start=None, end=None):
+    """Meals from the user's stored plans, by id or by day in [start, end]; returns (meals, plan_ids)"""
+    query = {'user_id': user_id}
+    if plan_ids:
+        query['_id'] = {'$in': plan_ids}
+    if start or end:
+        window = {}
+        if start:
+            window['$gte'] = start
+        if end:
+            window['$lt'] = end + timedelta(days=1)
+        query['$or'] = [{'date': window}, {'plan.days.date': window}]
+
+    def in_window(date):
+        return not (start or end) or (date is not None and (not start or date >= start)
+                                      and (not end or date < end + timedelta(days=1)))
+
+    meals, found = [], []
+    projection = {'plan.days': 1, 'date': 1, 'breakfast': 1, 'lunch': 1, 'dinner': 1, 'snacks': 1}
+    for doc in db.meal_plans.find(query, projection):
+        found.append(doc['_id'])
+        plan = doc.get('plan')
+        if plan:
+            for day in plan.get('days') or []:
+                if in_window(day.get('date')):
+                    meals.extend(day.get('meals') or [])
+        elif in_window(doc.get('date')):
+            meals.extend(meal_plan_schema.saved_day_meals(doc))
+    return meals, found
+
+
+def meal_ingredients(db, meals):
+    """Ingredients of every meal, reading linked recipes (one query) for meals that list none"""
+    recipe_ids = {meal['recipe_id'] for meal in meals if not meal.get('ingredients') and meal.get('recipe_id')}
+    names = {meal['name'] for meal in meals if not meal.get('ingredients') and not meal.get('recipe_id')}
+    recipes = {}
+    if recipe_ids or names:
+        clauses = []
+        if recipe_ids:
+            clauses.append({'_id': {'$in': list(recipe_ids)}})
+        if names:
+            clauses.append({'name': {'$in': list(names)}})
+        for recipe in db.recipes.find({'$or': clauses}, {'name': 1, 'ingredients': 1}):
+            parsed = [meal_plan_schema.ingredient_from_text(text) for text in recipe.get('ingredients') or []
+                      if isinstance(text, str)]
+            recipes[recipe['_id']] = recipes[recipe.get('name')] = parsed
+
+    ingredients = []
+    for meal in meals:
+        if meal.get('ingredients'):
+            ingredients.extend(meal['ingredients'])
+        else:
+            ingredients.extend(recipes.get(meal.get('recipe_id')) or recipes.get(meal.get('name')) or [])
+    return ingredients
+
+
+def parse_day(value, field):
+    """YYYY-MM-DD (or full ISO) request value to a naive UTC midnight; raises ValueError"""
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.fromisoformat(str(value)[:10])
+    except ValueError:
+        raise ValueError(f'{field} must be a date (YYYY-MM-DD)')
+
+
+def parse_plan_ids(values):
+    if not isinstance(values, list) or not values or not all(isinstance(v, str) and ObjectId.is_valid(v) for v in values):
+        raise ValueError('meal_plan_ids must be a non-empty array of ids')
+    return [ObjectId(v) for v in values]
+
+
+def from_meal_plans(db, catalog, user_id, plan_ids=None, start=None, end=None, servings=1, budget=None,
+                    region=None):
+    """Build a priced, categorized list from stored plans; returns the response payload"""
+    meals, found = plan_meals(db, user_id, plan_ids, start, end)
+    items = aggregate(meal_ingredients(db, meals), catalog, servings, region)
+    skipped = []
+    if budget:
+        items, skipped = knapsack(items, budget)
+    note = f'Built from {len(meals)} meals in {len(found)} saved plan(s).'
+    summary = summarize(items, budget, skipped, note)
+    summary['source'] = 'meal_plans'
+    summary['meal_plan_ids'] = found
+    return {'summary': summary, 'items': items, 'skipped': skipped}
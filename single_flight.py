@@ -0,0 +1,228 @@
+"""Coalesce identical concurrent Gemini calls (single-flight).
+
+The first request for a key runs the call; requests for the same key that
+arrive while it is in flight wait for it and share its result (or its
+error) instead of sending a duplicate upstream. Within a worker this is a
+dict of in-flight calls guarded by a lock, so it covers every gthread
+thread. Optionally, a file-lock backend extends it across the gunicorn
+workers on one host: the worker holding the key's lock publishes the
+result next to it, and workers that had to wait for the lock read it
+instead of calling Gemini again.
+
+Followers wait for as long as the leader's call may take (the endpoint's
+deadline, passed to ``do``) plus a small margin, then make their own call.
+Only pass calls whose result may be shared; app.py coalesces cacheable
+prompts only.
+
+Configuration:
+
+- ``AI_SINGLE_FLIGHT``: ``thread`` (default), ``file`` (also across
+  workers) or ``off``
+- ``AI_SINGLE_FLIGHT_DIR``: lock/result directory for the file backend
+- ``AI_SINGLE_FLIGHT_WAIT_MARGIN_SECONDS``: how much longer than the
+  call's deadline a follower waits before making its own call (default 5)
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: thread-level coalescing only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class FileLockBackend:
+    """Per-key flock files plus short-lived result files, shared by the workers on a host"""
+
+    name = 'file'
+
+    def __init__(self, directory, result_ttl=30):
+        if fcntl is None:
+            raise RuntimeError('fcntl is not available on this platform')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.result_ttl = result_ttl
+        self._publishes = 0
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + suffix)
+
+    def acquire(self, key, timeout):
+        """Take the key's lock; returns (handle, waited). On timeout the handle is None."""
+        handle = open(self._path(key, '.lock'), 'a+')
+        deadline = time.monotonic() + timeout
+        waited = False
+        while True:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return handle, waited
+            except BlockingIOError:
+                waited = True
+                if time.monotonic() >= deadline:
+                    handle.close()
+                    return None, waited
+                time.sleep(0.05)
+
+    @staticmethod
+    def release(handle):
+        if handle is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+
+    def fetch(self, key):
+        """Result another worker published for ``key`` within the last result_ttl seconds"""
+        path = self._path(key, '.result')
+        try:
+            if time.time() - os.path.getmtime(path) > self.result_ttl:
+                return None
+            with open(path, encoding='utf-8') as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def publish(self, key, value):
+        path = self._path(key, '.result')
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            fh.write(value)
+        os.replace(tmp, path)
+        self._publishes += 1
+        if self._publishes % 100 == 0:
+            self._prune()
+
+    def _prune(self):
+        cutoff = time.time() - max(self.result_ttl, 3600)
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class SingleFlight:
+    """Run ``fn`` once per key among concurrent callers"""
+
+    def __init__(self, backend=None, wait_margin=5):
+        self.backend = backend
+        self.wait_margin = wait_margin
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+        self.shared_across_workers = 0
+        self.wait_timeouts = 0
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def do(self, key, fn, deadline):
+        """Result of ``fn()``, shared with every concurrent caller using the same key.
+
+        ``deadline`` is the longest ``fn()`` is expected to run, in seconds.
+        """
+        wait_seconds = deadline + self.wait_margin
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self._count('shared')
+            if not call.event.wait(wait_seconds):
+                # The leader is stuck; don't hold this request hostage to it
+                self._count('wait_timeouts')
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        self._count('leaders')
+        try:
+            call.value = self._lead(key, fn, wait_seconds)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _lead(self, key, fn, wait_seconds):
+        if self.backend is None:
+            return fn()
+        try:
+            handle, waited = self.backend.acquire(key, wait_seconds)
+        except OSError as e:
+            logger.warning(f"Single-flight lock unavailable ({e}); calling directly")
+            return fn()
+        try:
+            if waited:
+                value = self.backend.fetch(key)
+                if value is not None:
+                    self._count('shared_across_workers')
+                    return value
+            value = fn()
+            if isinstance(value, str) and value:
+                try:
+                    self.backend.publish(key, value)
+                except OSError as e:
+                    logger.warning(f"Single-flight result not published: {e}")
+            return value
+        finally:
+            self.backend.release(handle)
+
+    def stats(self):
+        return {
+            'backend': self.backend.name if self.backend else 'thread',
+            'in_flight': len(self._calls),
+            'leaders': self.leaders,
+            'shared': self.shared,
+            'shared_across_workers': self.shared_across_workers,
+            'wait_timeouts': self.wait_timeouts,
+        }
+
+
+class _Passthrough:
+    """AI_SINGLE_FLIGHT=off"""
+
+    @staticmethod
+    def do(key, fn, deadline):
+        return fn()
+
+    @staticmethod
+    def stats():
+        return {'backend': 'off'}
+
+
+def build_single_flight():
+    """Single-flight group configured by the environment"""
+    kind = os.getenv('AI_SINGLE_FLIGHT', 'thread').lower()
+    wait_margin = float(os.getenv('AI_SINGLE_FLIGHT_WAIT_MARGIN_SECONDS', 5))
+    if kind == 'off':
+        return _Passthrough()
+    backend = None
+    if kind == 'file':
+        try:
+            backend = FileLockBackend(os.getenv('AI_SINGLE_FLIGHT_DIR', '/tmp/satvic-ai-flight'))
+        except Exception as e:
+            logger.warning(f"Single-flight file backend unavailable ({e}); coalescing within this worker only")
+    return SingleFlight(backend, wait_margin)
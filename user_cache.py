@@ -0,0 +1,53 @@
+"""Short-lived per-worker cache of user documents.
+
+Auth and AI endpoints read the same user (mostly just ``profile``) on every
+request. Entries hold the projected document without password hashes and
+expire after a few seconds; writes in this worker invalidate explicitly,
+other workers converge within the TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# Fields never loaded for cached reads
+USER_PROJECTION = {'password': 0, 'password_hash': 0}
+
+
+class UserCache:
+    def __init__(self, ttl_seconds=30, max_entries=10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user_id -> (expires_at, user)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Cached user dict (a shallow copy callers may modify), or None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return dict(entry[1])
+
+    def set(self, user_id, user):
+        if self.ttl_seconds <= 0 or user is None:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'ttl_seconds': self.ttl_seconds}